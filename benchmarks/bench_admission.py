@@ -0,0 +1,127 @@
+"""
+Open-loop load test of /query against the OpenAI stub with limited upstream
+capacity (STUB_CONCURRENCY), with and without admission control. Without it
+every request queues behind the stub and latency grows for as long as the
+overload lasts; with it the excess is turned away with 429/503 and the
+latency of accepted requests stays flat.
+
+    python -m benchmarks.bench_admission --rate 20 --duration 10
+
+Each mode runs in its own process, since the limiters are sized at import.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import threading
+
+DIM = 256
+PORT = 8792
+MODES = {
+    # Effectively unlimited: the pre-admission behaviour
+    "off": {"LLM_CONCURRENCY": "100000", "LLM_QUEUE": "100000", "EMBED_CONCURRENCY": "100000", "EMBED_QUEUE": "100000", "REQUEST_DEADLINE": "3600"},
+    "on": {"LLM_CONCURRENCY": "4", "LLM_QUEUE": "8", "EMBED_CONCURRENCY": "8", "EMBED_QUEUE": "16", "REQUEST_DEADLINE": "5"},
+}
+STUB = {"STUB_CONCURRENCY": "6", "STUB_LATENCY": "0.25", "STUB_EMBED_DIM": str(DIM)}
+
+
+def percentile(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))] if xs else float("nan")
+
+
+async def run(rate, duration):
+    import httpx
+    import uvicorn
+    from qdrant_client import AsyncQdrantClient
+    from qdrant_client.models import VectorParams, Distance, PointStruct
+
+    import scripts.retrievers as retrievers
+    import scripts.app as api
+    from scripts import clients
+    from scripts.stub_openai import app as stub_app, fake_embedding
+
+    threading.Thread(
+        target=lambda: uvicorn.run(stub_app, port=PORT, log_level="error"), daemon=True
+    ).start()
+    await asyncio.sleep(1.0)
+
+    aqdrant = AsyncQdrantClient(":memory:")
+    clients.register("async_qdrant", aqdrant)
+    await aqdrant.create_collection(
+        retrievers.COLLECTION_NAME, vectors_config=VectorParams(size=DIM, distance=Distance.COSINE)
+    )
+    await aqdrant.upsert(retrievers.COLLECTION_NAME, [
+        PointStruct(id=i, vector=fake_embedding(f"doc {i}", DIM), payload={"source": f"doc_{i}.pdf", "chunk_index": 0, "text": f"senate minutes {i}"})
+        for i in range(200)
+    ])
+
+    latencies, statuses = [], {}
+
+    async def one(http, i):
+        start = time.perf_counter()
+        r = await http.post("/query", json={"query": f"question {i} {random.random()}"})
+        statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+        if r.status_code == 200:
+            latencies.append(time.perf_counter() - start)
+
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        tasks, start = [], time.perf_counter()
+        for i in range(int(rate * duration)):
+            # Poisson arrivals
+            await asyncio.sleep(random.expovariate(rate))
+            tasks.append(asyncio.create_task(one(http, i)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    return {
+        "sent": len(tasks),
+        "ok": len(latencies),
+        "rejected": sum(n for code, n in statuses.items() if code in (429, 503)),
+        "p50": percentile(latencies, 0.50),
+        "p99": percentile(latencies, 0.99),
+        "elapsed": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rate", type=float, default=20.0, help="requests per second offered")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    parser.add_argument("--mode", choices=list(MODES))
+    args = parser.parse_args()
+
+    if args.mode:
+        random.seed(0)
+        print(json.dumps(asyncio.run(run(args.rate, args.duration))))
+        return
+
+    results = {}
+    for mode, limits in MODES.items():
+        env = {
+            **os.environ, **STUB, **limits,
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{PORT}/v1",
+            "OPENAI_API_KEY": "stub",
+            "EMBED_CACHE_PATH": os.path.join(tempfile.mkdtemp(), "bench.sqlite"),
+        }
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_admission", "--mode", mode,
+             "--rate", str(args.rate), "--duration", str(args.duration)],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+        results[mode] = json.loads(out.strip().splitlines()[-1])
+
+    print(f"offered {args.rate:.0f} req/s for {args.duration:.0f}s, stub capacity {STUB['STUB_CONCURRENCY']} x {STUB['STUB_LATENCY']}s")
+    print(f"{'admission':>9} {'sent':>6} {'ok':>6} {'rejected':>9} {'p50 s':>8} {'p99 s':>8}")
+    for mode, r in results.items():
+        print(f"{mode:>9} {r['sent']:>6} {r['ok']:>6} {r['rejected']:>9} {r['p50']:>8.2f} {r['p99']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Throughput of /query/batch vs. replaying the same questions through /query
+one at a time. Runs against the local OpenAI stub and an in-memory Qdrant
+filled with synthetic chunks, so no real API calls are made.
+
+    python -m benchmarks.bench_batch_query --queries 500
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import threading
+
+DIM = 256
+PORT = 8791
+os.environ.setdefault("STUB_EMBED_DIM", str(DIM))
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{PORT}/v1"
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+os.environ.setdefault("EMBED_CACHE_PATH", "cache/bench_query_embeddings.sqlite")
+
+import httpx
+import uvicorn
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import VectorParams, Distance, PointStruct
+
+import scripts.retrievers as retrievers
+import scripts.app as api
+from scripts import clients
+from scripts.embedding_cache import cache as embedding_cache
+from scripts.stub_openai import app as stub_app, fake_embedding
+
+WORDS = "cab capp senate minutes agenda resolution budget policy fall spring report election motion".split()
+COMMITTEES = ["CAB", "CAPP", "CFS", "SEC", "GEC"]
+
+
+def build_collection(docs, chunks_per_doc):
+    points = []
+    for d in range(docs):
+        committee = random.choice(COMMITTEES)
+        for c in range(chunks_per_doc):
+            text = " ".join(random.choices(WORDS, k=60))
+            points.append(PointStruct(
+                id=len(points),
+                vector=fake_embedding(text, DIM),
+                payload={
+                    "source": f"{committee}_{d}.pdf", "chunk_index": c, "text": text,
+                    "year": random.randint(2015, 2024), "committee_codes": [committee],
+                },
+            ))
+    return points
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--chunks-per-doc", type=int, default=4)
+    args = parser.parse_args()
+
+    threading.Thread(
+        target=lambda: uvicorn.run(stub_app, port=PORT, log_level="error"), daemon=True
+    ).start()
+    await asyncio.sleep(1.0)
+
+    random.seed(0)
+    points = build_collection(args.docs, args.chunks_per_doc)
+    config = VectorParams(size=DIM, distance=Distance.COSINE)
+    qdrant, aqdrant = QdrantClient(":memory:"), AsyncQdrantClient(":memory:")
+    clients.register("qdrant", qdrant)
+    clients.register("async_qdrant", aqdrant)
+    qdrant.create_collection(retrievers.COLLECTION_NAME, vectors_config=config)
+    qdrant.upsert(retrievers.COLLECTION_NAME, points)
+    await aqdrant.create_collection(retrievers.COLLECTION_NAME, vectors_config=config)
+    await aqdrant.upsert(retrievers.COLLECTION_NAME, points)
+
+    # A few hundred distinct questions over a handful of filters
+    queries = [
+        f"{random.choice(COMMITTEES)} {random.choice(WORDS)} {random.choice(WORDS)} {random.randint(2015, 2024)} #{i}"
+        for i in range(args.queries)
+    ]
+
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        start = time.perf_counter()
+        for q in queries:
+            await http.post("/query", json={"query": q})
+        sequential = time.perf_counter() - start
+
+        # Start the batch from a cold embedding cache too
+        embedding_cache._mem.clear()
+        embedding_cache._conn().execute("DELETE FROM embeddings")
+        embedding_cache._conn().commit()
+
+        start = time.perf_counter()
+        await http.post("/query/batch", json={"queries": queries})
+        batched = time.perf_counter() - start
+
+    print(f"{args.queries} queries over {len(points)} chunks")
+    print(f"one-by-one /query : {sequential:8.2f}s  ({args.queries / sequential:7.1f} q/s)")
+    print(f"/query/batch      : {batched:8.2f}s  ({args.queries / batched:7.1f} q/s)")
+    print(f"speedup           : {sequential / batched:8.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
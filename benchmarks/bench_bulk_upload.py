@@ -0,0 +1,104 @@
+"""
+Points/s into mfs_collection from an embedding store: the old upload loop
+(100 PointStructs per upsert, 0.5s sleep between batches) vs. the streaming
+upload_to_qdrant() (numpy batches through upload_collection, wait=False,
+adaptive batch size, parallel workers against a server). BM25 indexing is
+left out; it costs the same either way.
+
+    python -m benchmarks.bench_bulk_upload --points 10000 100000 1000000 --dim 256
+
+Runs against local-path Qdrant in a temp dir unless QDRANT_URL is set.
+Local-path mode takes one writer and commits every point to SQLite, growing
+its arrays point by point, so its rate falls with collection size; a server
+shows what the parallel workers buy. The old loop only runs up to
+--legacy-max points; beyond that it would take hours.
+"""
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+
+
+def fill_store(store, n, rng, batch=10000):
+    for start in range(0, n, batch):
+        count = min(batch, n - start)
+        texts = [f"{i} chunk text about senate minutes and the budget" for i in range(start, start + count)]
+        metas = [{"source": f"doc_{i // 20}.pdf", "chunk_index": i % 20} for i in range(start, start + count)]
+        ids = [f"00000000-0000-0000-0000-{i:012d}" for i in range(start, start + count)]
+        store.append(texts, rng.standard_normal((count, store.dim), dtype=np.float32), metas, ids=ids)
+
+
+def legacy_upload(store, qdrant, collection):
+    """What upload_to_qdrant() did before: PointStructs from lists, one upsert at a time, sleep between."""
+    from qdrant_client.http.models import PointStruct
+    from scripts.vector_ops import unit_rows
+
+    for batch in store.iter_batches(100):
+        vectors = unit_rows([item["embedding"] for item in batch])
+        points = [
+            PointStruct(id=item["id"], vector=vec.tolist(), payload={"text": item["text"], **item["metadata"]})
+            for item, vec in zip(batch, vectors)
+        ]
+        qdrant.upsert(collection_name=collection, points=points)
+        time.sleep(0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=256, help="3072 for the real model; smaller keeps 1M points in RAM")
+    parser.add_argument("--legacy-max", type=int, default=10000)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    if not os.getenv("QDRANT_URL"):
+        os.environ["QDRANT_PATH"] = os.path.join(tmp.name, "qdrant")
+    os.environ["COLLECTION_MANIFEST_PATH"] = os.path.join(tmp.name, "manifest.sqlite")
+
+    import scripts.upload_embeddings as upload
+    import scripts.bm25_index as bm25_index
+    from scripts.embedding_store import EmbeddingStore
+    from scripts.collection_manifest import CollectionManifest
+    from scripts.clients import get_qdrant
+
+    bm25_index.update_index = lambda *args, **kwargs: None
+    upload.write_collection_version = lambda: None
+    qdrant = get_qdrant(bulk=True)
+    mode = "local path" if os.getenv("QDRANT_PATH") else os.getenv("QDRANT_URL")
+
+    rows = []
+    for n in args.points:
+        rng = np.random.default_rng(0)
+        store = EmbeddingStore(os.path.join(tmp.name, f"store_{n}"), dim=args.dim)
+        start = time.perf_counter()
+        fill_store(store, n, rng)
+        print(f"Filled store with {n} points in {time.perf_counter() - start:.1f}s")
+
+        legacy = None
+        if n <= args.legacy_max:
+            qdrant.delete_collection(upload.COLLECTION_NAME)
+            upload.ensure_collection(qdrant, args.dim)
+            start = time.perf_counter()
+            legacy_upload(store, qdrant, upload.COLLECTION_NAME)
+            legacy = n / (time.perf_counter() - start)
+
+        qdrant.delete_collection(upload.COLLECTION_NAME)
+        manifest = CollectionManifest(os.path.join(tmp.name, f"manifest_{n}.sqlite"))
+        start = time.perf_counter()
+        upload.upload_to_qdrant(store, qdrant, manifest=manifest)
+        bulk = n / (time.perf_counter() - start)
+        assert qdrant.count(upload.COLLECTION_NAME, exact=True).count == n
+        rows.append((n, legacy, bulk))
+
+    workers = 1 if upload.qdrant_path() else upload.setting("UPLOAD_WORKERS", upload.UPLOAD_WORKERS)
+    print(f"\n{mode}, dim {args.dim}, {workers} upload workers")
+    print(f"{'points':>9} {'old pts/s':>10} {'bulk pts/s':>11}")
+    for n, legacy, bulk in rows:
+        old = f"{legacy:>10.0f}" if legacy else f"{'-':>10}"
+        print(f"{n:>9} {old} {bulk:>11.0f}")
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Cold start of the serving process: rebuilding the retrieval state from the
+embedding dump (parse embeddings.jsonl, normalize vectors, tokenize every
+chunk for BM25) vs. opening a prebuilt artifact, each followed by the first
+query. PDF extraction and embedding API calls are left out of the rebuild
+side, so its number is a lower bound. Uses synthetic chunks in a temp dir.
+
+    python -m benchmarks.bench_cold_start --chunks 20000 --dim 3072
+"""
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import numpy as np
+
+# Building the artifact stamps a collection version; keep it out of the repo
+os.environ.setdefault("COLLECTION_VERSION_PATH", os.path.join(tempfile.gettempdir(), "bench_collection_version.json"))
+
+from scripts.artifact import build_artifact, Artifact
+from scripts.bm25_index import toks, bm25_text
+from scripts.snapshot import iter_jsonl
+from scripts.vector_ops import unit, unit_rows, top_k
+
+WORDS = "cab capp senate minutes agenda resolution budget policy fall spring report election motion".split()
+
+
+def write_dump(path, chunks, dim):
+    rng = np.random.default_rng(0)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(chunks):
+            f.write(json.dumps({
+                "id": str(i),
+                "text": " ".join(random.choices(WORDS, k=200)),
+                "embedding": rng.standard_normal(dim, dtype=np.float32).round(6).tolist(),
+                "metadata": {"source": f"doc_{i // 8}.pdf", "chunk_index": i % 8, "year": 2015 + i % 10},
+            }) + "\n")
+
+
+def rebuild_start(path, query, query_vec):
+    from rank_bm25 import BM25Okapi
+
+    ids, vectors, payloads = [], [], []
+    for pid, vector, payload in iter_jsonl(path):
+        ids.append(pid)
+        vectors.append(vector)
+        payloads.append(payload)
+    mat = unit_rows(vectors)
+    bm25 = BM25Okapi([toks(bm25_text(p)) for p in payloads])
+    best = top_k(mat @ unit(query_vec), 200)
+    bm25.get_scores(toks(query))
+    return best
+
+
+def artifact_start(path, query, query_vec):
+    artifact = Artifact(path)
+    hits = artifact.store.search(query_vec, limit=200)
+    artifact.bm25.get_scores(query, [str(h.id) for h in hits])
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=3072)
+    args = parser.parse_args()
+
+    random.seed(0)
+    query = "capp budget resolution"
+    query_vec = np.random.default_rng(1).standard_normal(args.dim).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dump = os.path.join(tmp, "embeddings.jsonl")
+        write_dump(dump, args.chunks, args.dim)
+        artifact = build_artifact(iter_jsonl(dump), root=os.path.join(tmp, "artifacts"))
+
+        start = time.perf_counter()
+        rebuild_start(dump, query, query_vec)
+        t_rebuild = time.perf_counter() - start
+
+        start = time.perf_counter()
+        artifact_start(artifact.path, query, query_vec)
+        t_artifact = time.perf_counter() - start
+
+    print(f"{args.chunks} chunks, dim {args.dim}")
+    print(f"rebuild from embeddings.jsonl : {t_rebuild:8.3f}s")
+    print(f"open prebuilt artifact        : {t_artifact:8.3f}s")
+    print(f"speedup                       : {t_rebuild / t_artifact:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
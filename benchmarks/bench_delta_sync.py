@@ -0,0 +1,120 @@
+"""
+Work done per sync now that point ids are deterministic and the collection
+manifest tracks what is in mfs_collection: a first full sync, a re-run with
+nothing changed, one edited PDF and one deleted PDF. Counts embedded chunks,
+upserted and deleted points, against the OpenAI stub and an on-disk local
+Qdrant in a temp dir.
+
+    python -m benchmarks.bench_delta_sync --pdfs 40 --pages 10 [--stream]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+PORT = 8795
+
+
+def edit_pdf(path):
+    import fitz
+
+    doc = fitz.open(path)
+    doc[-1].insert_text((50, 780), "Amended by resolution 42 at the following meeting.", fontsize=9)
+    doc.save(path + ".tmp")
+    doc.close()
+    os.replace(path + ".tmp", path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdfs", type=int, default=40)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--stream", action="store_true", help="sync with StreamPipeline instead of get_embedding()")
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    tmp = tempfile.TemporaryDirectory()
+    state = tmp.name
+    os.environ.update({
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{PORT}/v1",
+        "OPENAI_API_KEY": "stub",
+        "STUB_LATENCY": "0",
+        "QDRANT_PATH": os.path.join(state, "qdrant"),
+        "EXTRACT_CACHE_PATH": os.path.join(state, "extractions.sqlite"),
+        "BM25_INDEX_DIR": os.path.join(state, "bm25"),
+        "COLLECTION_VERSION_PATH": os.path.join(state, "collection_version.json"),
+        "COLLECTION_MANIFEST_PATH": os.path.join(state, "manifest.sqlite"),
+        "EMBED_STORE_DIR": os.path.join(state, "store"),
+    })
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "scripts.stub_openai:app", "--port", str(PORT), "--log-level", "error"],
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")]))}
+    )
+    os.chdir(state) # missing_dates.txt and friends are relative paths
+
+    import scripts.get_embedding as ge
+    import scripts.embed_scheduler as es
+    import scripts.stream_pipeline as sp
+    import scripts.upload_embeddings as upload
+    from scripts.load_pdfs import load_pdfs
+    from scripts.clients import get_qdrant
+    from benchmarks.bench_load_pdfs import write_pdfs
+
+    counts = {}
+
+    def counting(name, fn, size):
+        def wrapper(*a, **kw):
+            result = fn(*a, **kw)
+            counts[name] = counts.get(name, 0) + size(a, result)
+            return result
+        return wrapper
+
+    es.EmbedScheduler._request = counting("embedded", es.EmbedScheduler._request, lambda a, r: len(a[1]))
+    ge.upload_to_qdrant = counting("upserted", upload.upload_to_qdrant, lambda a, r: r)
+    sp.safe_upsert = counting("upserted", upload.safe_upsert, lambda a, r: len(a[2]))
+    ge.delete_points = sp.delete_points = counting("deleted", upload.delete_points, lambda a, r: r)
+
+    def sync(pdf_dir):
+        if args.stream:
+            sp.StreamPipeline(pdf_dir).run(report_every=60)
+        else:
+            ge.get_embedding(load_pdfs(pdf_dir), pdf_dir)
+
+    try:
+        time.sleep(2)
+        random.seed(0)
+        pdf_dir = os.path.join(state, "data")
+        os.mkdir(pdf_dir)
+        paths = write_pdfs(pdf_dir, args.pdfs, args.pages, 0)
+
+        steps = [
+            ("first sync", lambda: None),
+            ("unchanged", lambda: None),
+            ("edit 1 PDF", lambda: edit_pdf(paths[0])),
+            ("remove 1 PDF", lambda: os.remove(paths[1])),
+        ]
+        rows = []
+        for name, change in steps:
+            change()
+            counts.clear()
+            start = time.perf_counter()
+            sync(pdf_dir)
+            seconds = time.perf_counter() - start
+            total = get_qdrant().count(upload.COLLECTION_NAME).count
+            rows.append((name, counts.get("embedded", 0), counts.get("upserted", 0), counts.get("deleted", 0), total, seconds))
+
+        print(f"\n{args.pdfs} PDFs x {args.pages} pages ({'stream' if args.stream else 'batch'})")
+        print(f"{'step':>13} {'embedded':>9} {'upserted':>9} {'deleted':>8} {'points':>7} {'seconds':>8}")
+        for name, embedded, upserted, deleted, total, seconds in rows:
+            print(f"{name:>13} {embedded:>9} {upserted:>9} {deleted:>8} {total:>7} {seconds:>8.1f}")
+    finally:
+        stub.terminate()
+        os.chdir(root)
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
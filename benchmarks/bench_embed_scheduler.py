@@ -0,0 +1,108 @@
+"""
+Embedding a corpus of chunks against the OpenAI stub with rate limits
+switched on: the old loop (fixed 64-chunk batches one after another, tenacity
+backoff on errors) vs. EmbedScheduler (token-packed batches, concurrent
+requests under a token bucket, header-driven pacing, retry queue). Reports
+wall time, requests the stub served, 429s and 500s it returned, and chunks
+that ended up unembedded.
+
+    python -m benchmarks.bench_embed_scheduler --chunks 2000 --tpm 200000 --rpm 300
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import subprocess
+
+PORT = 8796
+WORDS = "cab capp senate minutes agenda resolution budget policy fall spring report election motion".split()
+
+
+def sequential(texts):
+    from tenacity import retry, wait_random_exponential, stop_after_attempt
+    from scripts.clients import get_openai
+
+    @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(8))
+    def embed_batch(batch):
+        response = get_openai().embeddings.create(model="text-embedding-3-large", input=batch)
+        return [d.embedding for d in response.data]
+
+    failed = 0
+    for i in range(0, len(texts), 64):
+        try:
+            embed_batch(texts[i:i + 64])
+        except Exception:
+            failed += len(texts[i:i + 64])
+    return failed
+
+
+def scheduled(texts, workers):
+    from scripts.embed_scheduler import EmbedScheduler, pack_batches
+
+    failed = 0
+    for batch, vectors, error in EmbedScheduler(workers).embed(pack_batches((t, None) for t in texts)):
+        if error is not None:
+            failed += len(batch)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=300, help="words per chunk")
+    parser.add_argument("--tpm", type=int, default=200000)
+    parser.add_argument("--rpm", type=int, default=300)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-tokens", type=int, default=50000, help="EMBED_BATCH_TOKENS")
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    os.environ.update({
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{PORT}/v1",
+        "OPENAI_API_KEY": "stub",
+        # The scheduler starts from defaults it has to correct from the stub's headers
+        "EMBED_TPM": "1000000",
+        "EMBED_RPM": "3000",
+        "EMBED_BATCH_TOKENS": str(args.batch_tokens),
+    })
+    stub_env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])),
+        "STUB_LATENCY": str(args.latency),
+        "STUB_TPM": str(args.tpm),
+        "STUB_RPM": str(args.rpm),
+        "STUB_ERROR_RATE": str(args.error_rate),
+        "STUB_EMBED_DIM": "256",
+    }
+
+    import httpx
+
+    random.seed(0)
+    texts = [f"{i} " + " ".join(random.choices(WORDS, k=random.randint(args.words // 4, args.words))) for i in range(args.chunks)]
+    print(f"{args.chunks} chunks, stub limits {args.tpm} TPM / {args.rpm} RPM, {args.error_rate:.0%} errors")
+    print(f"{'mode':>10} {'seconds':>8} {'served':>7} {'429s':>6} {'500s':>6} {'failed':>7}")
+
+    for mode in ("sequential", "scheduler"):
+        # Fresh stub per mode so both start with full buckets
+        stub = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "scripts.stub_openai:app", "--port", str(PORT), "--log-level", "error"],
+            env=stub_env
+        )
+        try:
+            time.sleep(2)
+            start = time.perf_counter()
+            failed = sequential(texts) if mode == "sequential" else scheduled(texts, args.workers)
+            seconds = time.perf_counter() - start
+            stats = httpx.get(f"http://127.0.0.1:{PORT}/stub/stats").json()
+            print(f"{mode:>10} {seconds:>8.1f} {stats['requests']:>7} {stats['rate_limited']:>6} "
+                  f"{stats['errors']:>6} {failed:>7}")
+        finally:
+            stub.terminate()
+            stub.wait()
+
+
+if __name__ == "__main__":
+    main()
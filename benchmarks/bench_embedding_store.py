@@ -0,0 +1,87 @@
+"""
+embeddings.jsonl vs. the binary embedding store on synthetic chunks: size
+on disk, the "already embedded?" check get_embedding() does before every
+run, and a full read for upload. Also times the one-shot migration.
+
+    python -m benchmarks.bench_embedding_store --chunks 20000 --dim 3072
+"""
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import numpy as np
+
+from scripts.embedding_store import EmbeddingStore, migrate_jsonl
+
+WORDS = "cab capp senate minutes agenda resolution budget policy fall spring report election motion".split()
+
+
+def size_mb(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)) / 2**20
+    return os.path.getsize(path) / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--lookups", type=int, default=1000, help="chunk texts checked for 'already embedded'")
+    args = parser.parse_args()
+
+    random.seed(0)
+    rng = np.random.default_rng(0)
+    texts = [f"{i} " + " ".join(random.choices(WORDS, k=300)) for i in range(args.chunks)]
+    probe = random.sample(texts, min(args.lookups, len(texts)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        jsonl = os.path.join(tmp, "embeddings.jsonl")
+        with open(jsonl, "w", encoding="utf-8") as f:
+            for i, text in enumerate(texts):
+                f.write(json.dumps({
+                    "id": str(i), "text": text,
+                    "embedding": rng.standard_normal(args.dim, dtype=np.float32).tolist(),
+                    "metadata": {"source": f"doc_{i // 8}.pdf", "chunk_index": i % 8},
+                }) + "\n")
+
+        store = EmbeddingStore(os.path.join(tmp, "store"), dim=args.dim)
+        start = time.perf_counter()
+        migrate_jsonl(jsonl, store)
+        t_migrate = time.perf_counter() - start
+
+        # What get_embedding() did: parse everything, build a set of texts, then check
+        start = time.perf_counter()
+        with open(jsonl, "r", encoding="utf-8") as f:
+            saved = [json.loads(line) for line in f]
+        saved_texts = {s["text"] for s in saved}
+        hits = sum(t in saved_texts for t in probe)
+        t_jsonl_check = time.perf_counter() - start
+        del saved, saved_texts
+
+        start = time.perf_counter()
+        fresh = EmbeddingStore(store.path, dim=args.dim)
+        hits_store = sum(fresh.contains(t) for t in probe)
+        t_store_check = time.perf_counter() - start
+        assert hits == hits_store
+
+        start = time.perf_counter()
+        with open(jsonl, "r", encoding="utf-8") as f:
+            total = sum(len(json.loads(line)["embedding"]) for line in f)
+        t_jsonl_read = time.perf_counter() - start
+
+        start = time.perf_counter()
+        total_store = sum(len(batch) * args.dim for batch in fresh.iter_batches())
+        t_store_read = time.perf_counter() - start
+        assert total == total_store
+
+        print(f"{args.chunks} chunks x {args.dim} dims, {len(probe)} lookups")
+        print(f"{'':>8} {'size MB':>9} {'check s':>9} {'read s':>9}")
+        print(f"{'jsonl':>8} {size_mb(jsonl):>9.0f} {t_jsonl_check:>9.2f} {t_jsonl_read:>9.2f}")
+        print(f"{'store':>8} {size_mb(store.path):>9.0f} {t_store_check:>9.3f} {t_store_read:>9.2f}")
+        print(f"migration: {t_migrate:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Import time of the entry-point modules, each in a fresh interpreter via
+`python -X importtime`, with the heaviest third-party packages it pulled in.
+Heavy dependencies (qdrant_client.models, tiktoken, fitz, langchain, httpx)
+should only show up once a code path actually needs them.
+
+    python -m benchmarks.bench_import_time
+    python -m benchmarks.bench_import_time --max-ms 800    # exit 1 if any module is slower (CI guard)
+"""
+import sys
+import argparse
+import statistics
+import subprocess
+
+MODULES = [
+    "scripts.helpers",
+    "scripts.chunk_text",
+    "scripts.load_pdfs",
+    "scripts.upload_embeddings",
+    "scripts.get_embedding",
+    "scripts.retrievers",
+    "scripts.artifact",
+    "scripts.app",
+    "main",
+]
+
+
+def import_profile(module):
+    """(total microseconds, {top-level package: cumulative microseconds}) for one fresh import."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True
+    ).stderr
+
+    total, packages, stack, root = 0, {}, [], None
+    # Children are printed before their parent, indented two spaces per level,
+    # so read bottom-up and only count what sits under the module's own entry
+    for line in reversed(out.splitlines()):
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        if name == module:
+            total, root, stack = int(cumulative), depth, []
+            continue
+        if root is None or depth <= root:
+            root = None
+            continue
+        package = name.split(".")[0]
+        del stack[depth - root - 1:]
+        # Charge a package where it is first entered from outside itself
+        if package not in stack:
+            packages[package] = packages.get(package, 0) + int(cumulative)
+        stack.append(package)
+    return total, packages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--runs", type=int, default=3, help="fresh imports per module (median is reported)")
+    parser.add_argument("--top", type=int, default=3, help="heaviest packages listed per module")
+    parser.add_argument("--max-ms", type=float, default=None, help="fail if any module takes longer")
+    args = parser.parse_args()
+
+    print(f"{'module':<28} {'import ms':>10}  heaviest packages")
+    slow = []
+    for module in args.modules:
+        runs = [import_profile(module) for _ in range(args.runs)]
+        ms = statistics.median(total for total, _ in runs) / 1000
+        packages = runs[-1][1]
+        heaviest = sorted(
+            ((p, us) for p, us in packages.items() if p not in ("scripts", module)),
+            key=lambda item: -item[1]
+        )[:args.top]
+        print(f"{module:<28} {ms:>10.0f}  " + ", ".join(f"{p} {us / 1000:.0f}ms" for p, us in heaviest))
+        if args.max_ms is not None and ms > args.max_ms:
+            slow.append(module)
+
+    if slow:
+        print(f"Over {args.max_ms:.0f}ms: {', '.join(slow)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+PDF extraction throughput (pages/s) of extract_many() at several worker
+counts, over synthetic text PDFs in a temp dir. workers=1 is the old serial
+in-process loop. A share of the pages is nearly empty, which is where
+extract_pdf_pages() used to re-parse the page for each fallback. The last
+two rows load through the extraction cache: first run, then unchanged rerun.
+
+    python -m benchmarks.bench_load_pdfs --pdfs 40 --pages 30 --workers 1 2 4 8
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+
+from scripts.extract_pool import extract_many
+from scripts.extraction_cache import ExtractionCache
+from scripts.load_pdfs import extract_cached
+
+WORDS = "cab capp senate minutes agenda resolution budget policy fall spring report election motion".split()
+
+
+def write_pdfs(folder, count, pages, sparse):
+    import fitz
+
+    paths = []
+    for n in range(count):
+        doc = fitz.open()
+        for _ in range(pages):
+            page = doc.new_page()
+            if random.random() < sparse:
+                page.insert_text((50, 50), str(n), fontsize=9) # e.g. a page number on a scanned page
+                continue
+            for line in range(45):
+                page.insert_text((50, 50 + 15 * line), " ".join(random.choices(WORDS, k=12)), fontsize=9)
+        path = os.path.join(folder, f"doc_{n:04d}.pdf")
+        doc.save(path)
+        doc.close()
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdfs", type=int, default=40)
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--sparse", type=float, default=0.2, help="share of near-empty pages")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_pdfs(tmp, args.pdfs, args.pages, args.sparse)
+        print(f"{args.pdfs} PDFs x {args.pages} pages, {os.cpu_count()} CPUs")
+        print(f"{'workers':>7} {'seconds':>8} {'pages/s':>9}")
+        for workers in dict.fromkeys(args.workers):
+            start = time.perf_counter()
+            pages = sum(len(result[1]) for _, result, error in extract_many(paths, workers) if not error)
+            elapsed = time.perf_counter() - start
+            print(f"{workers:>7} {elapsed:>8.2f} {pages / elapsed:>9.0f}")
+
+        cache = ExtractionCache(os.path.join(tmp, "extractions.sqlite"))
+        for label in ("cold", "warm"):
+            start = time.perf_counter()
+            pages = sum(len(result[1]) for _, result, error in extract_cached(paths, max(args.workers), cache) if not error)
+            elapsed = time.perf_counter() - start
+            print(f"{label:>7} {elapsed:>8.2f} {pages / elapsed:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Peak memory and time of extract_text() on synthetic "scanned" PDFs (pages
+with no embedded text) of growing length. Each size runs in a fresh process
+so ru_maxrss is that run's peak; it should stay flat as pages grow. Without
+Tesseract installed, --render-only swaps OCR for a no-op and measures the
+render side alone.
+
+    python -m benchmarks.bench_ocr_memory --pages 10 50 200
+"""
+import sys
+import json
+import time
+import argparse
+import tempfile
+import resource
+import subprocess
+
+
+def run_one(pages, render_only):
+    import fitz
+    import pytesseract
+    from scripts.env import setting
+    from scripts.pdf_extraction import extract_text, OCR_DPI, OCR_WORKERS
+
+    if render_only:
+        pytesseract.image_to_string = lambda image: "x" * 32
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as f:
+        doc = fitz.open()
+        for n in range(pages):
+            # A vector drawing stands in for the scanned image: something to render, no text layer
+            doc.new_page().draw_rect(fitz.Rect(50, 50 + n % 100, 500, 700), color=(0, 0, 0))
+        doc.save(f.name)
+        doc.close()
+
+        start = time.perf_counter()
+        _, result, used_ocr = extract_text(f.name)
+        elapsed = time.perf_counter() - start
+
+    return {
+        "pages": pages,
+        "ocr_pages": sum(p["ocr"] for p in result),
+        "seconds": elapsed,
+        "peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "dpi": setting("OCR_DPI", OCR_DPI),
+        "workers": setting("OCR_WORKERS", OCR_WORKERS),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--render-only", action="store_true", help="skip Tesseract")
+    parser.add_argument("--one", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.one:
+        print(json.dumps(run_one(args.one, args.render_only)))
+        return
+
+    print(f"{'pages':>6} {'ocr pages':>9} {'seconds':>8} {'pages/s':>8} {'peak MB':>8}")
+    for pages in args.pages:
+        cmd = [sys.executable, "-m", "benchmarks.bench_ocr_memory", "--one", str(pages)]
+        if args.render_only:
+            cmd.append("--render-only")
+        out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"{r['pages']:>6} {r['ocr_pages']:>9} {r['seconds']:>8.2f} {r['pages'] / r['seconds']:>8.1f} {r['peak_mb']:>8.0f}")
+    print(f"dpi {r['dpi']}, {r['workers']} OCR workers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Upsert and search throughput against a running Qdrant over REST vs. gRPC,
+using the pooled client settings from scripts/clients.py. Needs a server,
+e.g. `docker run -p 6333:6333 -p 6334:6334 qdrant/qdrant`.
+
+    python -m benchmarks.bench_qdrant_transport --url http://localhost:6333 --points 20000
+"""
+import time
+import argparse
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import VectorParams, Distance, PointStruct, SearchRequest
+
+from scripts.env import setting
+from scripts.clients import http_limits, QDRANT_GRPC_PORT, QDRANT_TIMEOUT
+
+
+def run(client, name, vectors, queries, batch, k):
+    client.recreate_collection(name, vectors_config=VectorParams(size=vectors.shape[1], distance=Distance.COSINE))
+
+    start = time.perf_counter()
+    for i in range(0, len(vectors), batch):
+        client.upsert(name, [
+            PointStruct(id=i + j, vector=v.tolist(), payload={"source": f"doc_{(i + j) // 8}.pdf", "chunk_index": (i + j) % 8})
+            for j, v in enumerate(vectors[i:i + batch])
+        ])
+    upsert = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for q in queries:
+        client.search(name, query_vector=q.tolist(), limit=k, with_payload=True)
+    search = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(0, len(queries), 32):
+        client.search_batch(name, requests=[
+            SearchRequest(vector=q.tolist(), limit=k, with_payload=True) for q in queries[i:i + 32]
+        ])
+    batched = time.perf_counter() - start
+
+    client.delete_collection(name)
+    return len(vectors) / upsert, len(queries) / search, len(queries) / batched
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:6333")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--k", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.points, args.dim), dtype=np.float32)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+    print(f"{args.points} points x {args.dim} dims, {args.queries} queries, top {args.k}")
+    print(f"{'transport':>9} {'upsert pts/s':>13} {'search q/s':>11} {'batch q/s':>10}")
+    for transport, grpc in (("rest", False), ("grpc", True)):
+        client = QdrantClient(
+            url=args.url, api_key=args.api_key, prefer_grpc=grpc, grpc_port=setting("QDRANT_GRPC_PORT", QDRANT_GRPC_PORT),
+            timeout=setting("QDRANT_TIMEOUT", QDRANT_TIMEOUT), limits=http_limits()
+        )
+        up, search, batched = run(client, f"bench_transport_{transport}", vectors, queries, args.batch, args.k)
+        print(f"{transport:>9} {up:>13.0f} {search:>11.1f} {batched:>10.1f}")
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
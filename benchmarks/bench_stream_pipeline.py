@@ -0,0 +1,110 @@
+"""
+Batch pipeline (load_pdfs -> get_embedding -> upload) vs. the streaming one
+(scripts/stream_pipeline.py) on synthetic PDFs, against the OpenAI stub and
+an on-disk local Qdrant. Reports total time, time until the first points
+are in Qdrant, and peak RSS. Each mode runs in a fresh process with its own
+temp state.
+
+    python -m benchmarks.bench_stream_pipeline --pdfs 60 --pages 10
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import resource
+import subprocess
+
+PORT = 8794
+
+
+def run_mode(mode, pdf_dir):
+    import scripts.upload_embeddings as upload
+
+    start = time.perf_counter()
+    first = {}
+    safe_upsert = upload.safe_upsert
+
+    def timed_upsert(*args, **kwargs):
+        first.setdefault("t", time.perf_counter() - start)
+        return safe_upsert(*args, **kwargs)
+
+    upload.safe_upsert = timed_upsert
+    if mode == "batch":
+        from scripts.load_pdfs import load_pdfs
+        from scripts.get_embedding import get_embedding
+        get_embedding(load_pdfs(pdf_dir), pdf_dir)
+    else:
+        import scripts.stream_pipeline as stream
+        stream.safe_upsert = timed_upsert
+        stream.StreamPipeline(pdf_dir).run()
+
+    from scripts.clients import get_qdrant
+    return {
+        "seconds": time.perf_counter() - start,
+        "first_point": first.get("t"),
+        "points": get_qdrant().count(upload.COLLECTION_NAME).count,
+        "peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdfs", type=int, default=60)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--mode", choices=["batch", "stream"])
+    parser.add_argument("--pdf-dir")
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.pdf_dir)))
+        return
+
+    from benchmarks.bench_load_pdfs import write_pdfs
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])),
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{PORT}/v1",
+        "OPENAI_API_KEY": "stub",
+        "STUB_LATENCY": "0.2",
+    }
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "scripts.stub_openai:app", "--port", str(PORT), "--log-level", "error"], env=env
+    )
+    try:
+        time.sleep(2)
+        with tempfile.TemporaryDirectory() as tmp:
+            random.seed(0)
+            pdf_dir = os.path.join(tmp, "data")
+            os.mkdir(pdf_dir)
+            write_pdfs(pdf_dir, args.pdfs, args.pages, 0)
+
+            print(f"{args.pdfs} PDFs x {args.pages} pages")
+            print(f"{'mode':>6} {'points':>7} {'seconds':>8} {'first point s':>14} {'peak MB':>8}")
+            for mode in ("batch", "stream"):
+                # Own working dir: embeddings.jsonl and friends are relative paths
+                state = os.path.join(tmp, mode)
+                os.mkdir(state)
+                mode_env = {
+                    **env,
+                    "QDRANT_PATH": os.path.join(state, "qdrant"),
+                    "EXTRACT_CACHE_PATH": os.path.join(state, "extractions.sqlite"),
+                    "BM25_INDEX_DIR": os.path.join(state, "bm25"),
+                    "COLLECTION_VERSION_PATH": os.path.join(state, "collection_version.json"),
+                }
+                out = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_stream_pipeline", "--mode", mode, "--pdf-dir", pdf_dir],
+                    env=mode_env, cwd=state, capture_output=True, text=True, check=True
+                ).stdout
+                r = json.loads(out.strip().splitlines()[-1])
+                print(f"{mode:>6} {r['points']:>7} {r['seconds']:>8.1f} {r['first_point']:>14.1f} {r['peak_mb']:>8.0f}")
+    finally:
+        stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Time-per-query of the hybrid retriever's vector scoring:
+the old per-representative loop vs. pack_vectors() + one float32 mat-vec +
+argpartition top-k, both over the same Python-list vectors. The packing is
+timed with the mat-vec, as rank_scroll() pays it on every query.
+
+    python -m benchmarks.bench_vector_scoring --sizes 1000,10000,100000
+"""
+import argparse
+import time
+from types import SimpleNamespace
+import numpy as np
+
+from scripts.vector_ops import minmax, pack_vectors, top_k, unit
+
+
+def loop_scores(vectors, query, bm25, alpha, k):
+    # Mirrors the original retrieve(): np.array per rep, norms recomputed per pair
+    q = np.array(query)
+    vec_scores = []
+    for vec in vectors:
+        v = np.array(vec)
+        sim = np.dot(v, q) / (np.linalg.norm(v) * np.linalg.norm(q) + 1e-9)
+        vec_scores.append(float(sim))
+
+    xs = np.asarray(bm25, dtype=float)
+    bm25_n = (xs - xs.min()) / (xs.max() - xs.min() + 1e-9)
+    ys = np.asarray(vec_scores, dtype=float)
+    vec_n = (ys - ys.min()) / (ys.max() - ys.min() + 1e-9)
+    rel = alpha * bm25_n + (1 - alpha) * vec_n
+    return np.argsort(-rel)[:k]
+
+
+def matrix_scores(points, query, bm25, alpha, k):
+    # Mirrors rank_scroll(): stored vectors are unit length, so the dot product is the cosine
+    q = unit(query)
+    rel = alpha * minmax(bm25) + (1 - alpha) * minmax(pack_vectors(points, dim=len(q)) @ q)
+    return top_k(rel, k)
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--k", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    query = rng.standard_normal(args.dim).tolist()
+
+    # Both paths cycle through a fixed pool of unit-length Python-list vectors
+    # (as they arrive from the Qdrant client) so 100k x 3072 floats need not be resident
+    pool = [SimpleNamespace(vector=unit(rng.standard_normal(args.dim)).tolist()) for _ in range(1000)]
+
+    print(f"dim={args.dim} k={args.k} (best of {args.repeat})")
+    print(f"{'candidates':>10} {'loop ms':>10} {'matrix ms':>10} {'speedup':>8}")
+    for n in (int(x) for x in args.sizes.split(",")):
+        bm25 = rng.random(n)
+        points = [pool[i % len(pool)] for i in range(n)]
+        vectors = [p.vector for p in points]
+
+        t_loop = timed(lambda: loop_scores(vectors, query, bm25, 0.3, args.k), max(1, args.repeat // 2))
+        t_mat = timed(lambda: matrix_scores(points, query, bm25, 0.3, args.k), args.repeat)
+        print(f"{n:>10} {t_loop * 1e3:>10.2f} {t_mat * 1e3:>10.2f} {t_loop / t_mat:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,65 +1,123 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, JSONResponse
 from pydantic import BaseModel
-from dotenv import load_dotenv
+from scripts.env import load_env
 import os
+import time
+import asyncio
 import threading
 
-load_dotenv()
+load_env()
 
-from sync_drive import sync_from_drive, ensure_rclone_config
-from load_pdfs import load_pdfs
-from preprocessing import preprocess_documents
-from retrievers import build_retrievers, get_retriever_for_query
-from llm_model import get_llm
-from unified_ask import ask_unified
+from scripts.artifact import latest_artifact, rebuild, data_fingerprint, PDF_DIR
+from scripts.retrievers import aretrieve_within, retrieval_deadline, build_context
+from scripts.qa import aanswer_question
+from scripts.helpers import extract_filters
+from scripts.metrics import REQUEST_SECONDS, CONTENT_TYPE, render as render_metrics
+from scripts.admission import Overloaded, set_deadline
+
+# Retrieval settings
+K = 15
+ALPHA = 0.30
 
 state = {}
 
 class QueryInput(BaseModel):
     query: str
 
-def run_pipeline():
-    """Runs your heavy pipeline setup in background."""
-    print("Pipeline Starting (background)")
-    ensure_rclone_config()
-    sync_from_drive()
+def sync_from_drive():
+    """Pull new PDFs from the shared Drive folder into data/ (scripts/sync_drive.py)."""
+    try:
+        from scripts.sync_drive import sync_drive_folder
+        sync_drive_folder()
+    except Exception as e:
+        # No service account or no network: rebuild from the PDFs already on disk
+        print(f"Drive sync skipped: {e}")
 
-    docs = load_pdfs()
-    db, split_docs = preprocess_documents(docs)
-    bm25, vec, hybrid = build_retrievers(db, split_docs)
-    llm = get_llm()
+def run_pipeline(artifact=None):
+    """
+    Background: sync data/ from Drive, then, if the artifact is missing or
+    stale against data/, extract, embed, upload and export a new one.
+    """
+    print("Pipeline Starting (background)")
+    state["rebuilding"] = True
+    try:
+        sync_from_drive()
+        fingerprint = data_fingerprint(PDF_DIR) if os.path.isdir(PDF_DIR) else None
+        if artifact is not None and not artifact.is_stale(fingerprint):
+            print(f"Artifact {artifact.version} is current")
+            return
+        print("Artifact missing or stale, rebuilding")
+        state["artifact"] = rebuild(PDF_DIR)
+        print(f"Pipeline Ready ({state['artifact'].version})")
+    except Exception as e:
+        print(f"Pipeline failed: {e}")
+    finally:
+        state["rebuilding"] = False
 
-    # Global State
-    state["db"] = db
-    state["bm25"] = bm25
-    state["vec"] = vec
-    state["hybrid"] = hybrid
-    state["llm"] = llm
+def load_or_rebuild():
+    """
+    Map the newest prebuilt artifact if there is one, then sync and check it
+    in the background. The full pipeline only runs when the artifact is
+    missing, or stale against the PDFs in data/; a stale artifact keeps
+    serving until the rebuild swaps in.
+    """
+    start = time.perf_counter()
+    artifact = latest_artifact()
+    if artifact is not None:
+        state["artifact"] = artifact
+        print(f"Loaded artifact {artifact.version} ({len(artifact.store)} chunks) in {time.perf_counter() - start:.3f}s")
 
-    print("Pipeline Ready")
+    threading.Thread(target=run_pipeline, args=(artifact,), daemon=True).start()
 
 def create_app():
     app = FastAPI()
 
     @app.on_event("startup")
     def startup_event():
-        threading.Thread(target=run_pipeline, daemon=True).start()
+        load_or_rebuild()
 
     @app.post("/ask")
     async def ask_question(data: QueryInput):
-        if "db" not in state:
+        artifact = state.get("artifact")
+        if artifact is None:
             return {"answer": "Pipeline still starting.", "sources": []}
 
-        retr = get_retriever_for_query(data.query, state["db"], state["bm25"], state["hybrid"])
-        result = ask_unified(data.query, state["llm"], retr)
+        set_deadline()
+        try:
+            with REQUEST_SECONDS.time(endpoint="/ask"):
+                results, degraded = await aretrieve_within(
+                    data.query,
+                    retrieval_deadline(),
+                    k=K,
+                    alpha=ALPHA,
+                    metadata=extract_filters(data.query),
+                    return_all_chunks=True,
+                    store=artifact.store
+                )
+                context, _ = await asyncio.to_thread(build_context, results)
+                answer = await aanswer_question(context, data.query)
+        except Overloaded as e:
+            return JSONResponse({"error": str(e)}, status_code=e.status, headers={"Retry-After": str(e.retry_after)})
         return {
-            "answer": result.get("answer", ""),
-            "sources": [doc.metadata.get("source", "unknown") for doc in result.get("context", [])]
+            "answer": answer,
+            "sources": list(dict.fromkeys(r.payload.get("source", "unknown") for r in results)),
+            "degraded": degraded
         }
 
+    @app.get("/metrics")
+    async def metrics():
+        return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
+
     @app.get("/")
     async def root():
-        return {"status": "Running", "pipeline_ready": "db" in state}
+        artifact = state.get("artifact")
+        return {
+            "status": "Running",
+            "pipeline_ready": artifact is not None,
+            "artifact_version": artifact.version if artifact else None,
+            "rebuilding": state.get("rebuilding", False),
+        }
 
     return app
 
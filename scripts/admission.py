@@ -0,0 +1,142 @@
+import math
+import time
+import asyncio
+import contextvars
+from contextlib import asynccontextmanager
+from scripts.env import setting
+
+from scripts.metrics import ADMISSION_QUEUE, ADMISSION_IN_FLIGHT, ADMISSION_WAIT, ADMISSION_REJECTED
+
+# Admission config: defaults; each name can be set in the environment
+LLM_CONCURRENCY = 8 # completions in flight
+LLM_QUEUE = 32 # completions waiting for a slot
+EMBED_CONCURRENCY = 16
+EMBED_QUEUE = 64
+REQUEST_DEADLINE = 30.0 # seconds per request
+
+# Absolute time.monotonic() deadline of the current request (None = no deadline)
+deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class Overloaded(Exception):
+    """Rejected without waiting. `status` is the HTTP code to answer with."""
+
+    def __init__(self, message, retry_after, status=429):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status = status
+
+
+def request_deadline() -> float:
+    return setting("REQUEST_DEADLINE", REQUEST_DEADLINE)
+
+
+def set_deadline(seconds=None):
+    return deadline.set(time.monotonic() + (request_deadline() if seconds is None else seconds))
+
+
+def time_left():
+    """Seconds until the current request's deadline, or None without one."""
+    d = deadline.get()
+    return None if d is None else d - time.monotonic()
+
+
+class Limiter:
+    """
+    At most `limit` concurrent holders and `max_queue` waiters. A request that
+    finds the queue full is rejected at once (429); one still waiting when its
+    deadline passes gives up (503). Both carry a Retry-After estimated from
+    the recent hold time and the backlog. A batch can take several slots at
+    once with slot(weight=n), capped at `limit`.
+
+    `limit` and `max_queue` are defaults: <NAME>_CONCURRENCY and <NAME>_QUEUE
+    in the environment override them when the limiter is first used.
+    """
+
+    def __init__(self, name, limit, max_queue):
+        self.name = name
+        self.defaults = (limit, max_queue)
+        self.waiting = 0
+        self.active = 0
+        self.hold_time = 1.0 # EWMA of seconds a slot is held
+        self._sem = None
+        self._gather = asyncio.Lock() # one multi-slot acquire at a time, so two cannot each hold half
+
+    def _configure(self):
+        if self._sem is None:
+            prefix = self.name.upper()
+            self.limit = setting(f"{prefix}_CONCURRENCY", self.defaults[0])
+            self.max_queue = setting(f"{prefix}_QUEUE", self.defaults[1])
+            self._sem = asyncio.Semaphore(self.limit)
+
+    async def _acquire(self, weight):
+        if weight == 1:
+            await self._sem.acquire()
+            return
+        async with self._gather:
+            taken = 0
+            try:
+                while taken < weight:
+                    await self._sem.acquire()
+                    taken += 1
+            except BaseException:
+                # Timed out part way: hand back what was taken
+                for _ in range(taken):
+                    self._sem.release()
+                raise
+
+    def retry_after(self) -> int:
+        self._configure()
+        backlog = (self.waiting + self.active) / self.limit
+        return max(1, math.ceil(self.hold_time * backlog))
+
+    def saturated(self) -> bool:
+        self._configure()
+        return self.active >= self.limit and self.waiting >= self.max_queue
+
+    def _reject(self, reason, message, status):
+        ADMISSION_REJECTED.inc(limiter=self.name, reason=reason)
+        raise Overloaded(message, self.retry_after(), status)
+
+    def check(self):
+        """Raise Overloaded now if a new request would be turned away."""
+        if self.saturated():
+            self._reject("queue_full", f"{self.name} queue is full", 429)
+
+    @asynccontextmanager
+    async def slot(self, weight=1):
+        self._configure()
+        weight = max(1, min(weight, self.limit))
+        self.check()
+
+        timeout = time_left()
+        if timeout is not None and timeout <= 0:
+            self._reject("deadline", "Request deadline passed", 503)
+
+        self.waiting += 1
+        ADMISSION_QUEUE.set(self.waiting, limiter=self.name)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._acquire(weight), timeout)
+        except asyncio.TimeoutError:
+            self._reject("deadline", f"Timed out waiting for {self.name}", 503)
+        finally:
+            self.waiting -= 1
+            ADMISSION_QUEUE.set(self.waiting, limiter=self.name)
+            ADMISSION_WAIT.observe(time.perf_counter() - start, limiter=self.name)
+
+        self.active += weight
+        ADMISSION_IN_FLIGHT.set(self.active, limiter=self.name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.hold_time = 0.8 * self.hold_time + 0.2 * (time.perf_counter() - start)
+            self.active -= weight
+            ADMISSION_IN_FLIGHT.set(self.active, limiter=self.name)
+            for _ in range(weight):
+                self._sem.release()
+
+
+llm_limiter = Limiter("llm", LLM_CONCURRENCY, LLM_QUEUE)
+embed_limiter = Limiter("embed", EMBED_CONCURRENCY, EMBED_QUEUE)
@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import asyncio
+import uuid
+import threading
+import numpy as np
+from collections import OrderedDict
+
+from scripts.env import setting
+from scripts.helpers import filter_key
+from scripts.metrics import CACHE_LOOKUPS
+
+# Cache config: defaults; each name can be set in the environment
+ANSWER_CACHE_THRESHOLD = 0.92 # min cosine to reuse an answer
+ANSWER_CACHE_TTL = 86400.0 # seconds
+ANSWER_CACHE_SIZE = 1000 # entries per process
+COLLECTION_VERSION_PATH = "collection_version.json" # VARIABLE
+
+
+def collection_version_path():
+    return setting("COLLECTION_VERSION_PATH", COLLECTION_VERSION_PATH)
+
+
+def write_collection_version(path=None) -> str:
+    """Stamp the collection as changed; called after every upload/delete."""
+    path = path or collection_version_path()
+    version = uuid.uuid4().hex
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "updated": time.time()}, f)
+    os.replace(tmp, path)
+    return version
+
+
+_version = {"stamp": None, "value": None}
+
+
+def read_collection_version(path=None):
+    """Current stamp, re-read only when the file changes. None if never written."""
+    path = path or collection_version_path()
+    try:
+        stamp = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if stamp != _version["stamp"]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                _version["value"] = json.load(f).get("version")
+        except (OSError, ValueError):
+            return _version["value"]
+        _version["stamp"] = stamp
+    return _version["value"]
+
+
+class AnswerCache:
+    """
+    Semantic answer cache. A stored response is reused when a new query has
+    the same extract_filters() output and its embedding is within
+    `threshold` cosine of the stored one. Entries expire after `ttl`, the
+    oldest are evicted past `max_items`, and everything is dropped when the
+    collection version stamp changes. Settings left as None are read from
+    the environment (ANSWER_CACHE_THRESHOLD & co.) on first use.
+    """
+
+    def __init__(self, threshold=None, ttl=None, max_items=None):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_items = max_items
+        self._entries = OrderedDict() # id -> (filters key, unit vector, response, created)
+        self._lock = threading.Lock()
+        self._version = None
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _check_version(self):
+        if self.threshold is None:
+            self.threshold = setting("ANSWER_CACHE_THRESHOLD", ANSWER_CACHE_THRESHOLD)
+        if self.ttl is None:
+            self.ttl = setting("ANSWER_CACHE_TTL", ANSWER_CACHE_TTL)
+        if self.max_items is None:
+            self.max_items = setting("ANSWER_CACHE_SIZE", ANSWER_CACHE_SIZE)
+        version = read_collection_version()
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def _expire(self, now):
+        # Entries are kept in LRU order, so age has to be checked on each one
+        for entry_id in [i for i, e in self._entries.items() if now - e[3] >= self.ttl]:
+            del self._entries[entry_id]
+            self.evictions += 1
+
+    def lookup(self, query_vec, filters):
+        q = np.asarray(query_vec, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        key = filter_key(filters)
+        now = time.time()
+
+        with self._lock:
+            self._check_version()
+            self._expire(now)
+
+            candidates = [(i, e) for i, e in self._entries.items() if e[0] == key]
+            if candidates:
+                sims = np.stack([e[1] for _, e in candidates]) @ q
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    entry_id, entry = candidates[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    CACHE_LOOKUPS.inc(cache="answer", result="hit")
+                    return entry[2]
+
+            self.misses += 1
+            CACHE_LOOKUPS.inc(cache="answer", result="miss")
+            return None
+
+    def store(self, query_vec, filters, response):
+        q = np.asarray(query_vec, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+
+        with self._lock:
+            self._check_version()
+            self._entries[self._next_id] = (filter_key(filters), q, response, time.time())
+            self._next_id += 1
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def alookup(self, query_vec, filters):
+        """lookup() in a worker thread, off the event loop."""
+        return await asyncio.to_thread(self.lookup, query_vec, filters)
+
+    async def astore(self, query_vec, filters, response):
+        await asyncio.to_thread(self.store, query_vec, filters, response)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "items": len(self._entries),
+        }
+
+
+answer_cache = AnswerCache()
@@ -1,11 +1,29 @@
+import os
+import json
+import math
+import time
+import asyncio
+import traceback
 from fastapi import FastAPI
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
+from typing import List
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
+from scripts.env import load_env
 
-from scripts.retrievers import retrieve, format_context
-from scripts.qa import answer_question
-from scripts.printer import format_answer_with_sources_json
-from scripts.helpers import extract_filters
+load_env()
+
+from scripts.retrievers import (
+    aretrieve_within, aembed_within, retrieval_deadline, embed_many, retrieve_many, build_context
+)
+from scripts.qa import aanswer_question, astream_answer
+from scripts.printer import format_answer_with_sources_json, format_sources
+from scripts.helpers import extract_filters, filter_key
+from scripts.answer_cache import answer_cache
+from scripts.embedding_cache import normalize_query
+from scripts.singleflight import SingleFlight
+from scripts.metrics import REQUEST_SECONDS, CONTENT_TYPE, render as render_metrics
+from scripts.admission import Overloaded, llm_limiter, embed_limiter, set_deadline, time_left, request_deadline
 
 app = FastAPI()
 
@@ -17,34 +35,227 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Retrieval settings
+K = 15
+ALPHA = 0.30
+RETURN_ALL_CHUNKS = True
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "1000"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8")) # answers generated at once per batch
+
 # Model
 class QueryRequest(BaseModel):
     query: str
 
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+
+
+# Identical /query requests that arrive while one is running share its result
+inflight = SingleFlight()
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def overloaded(e: Overloaded):
+    return JSONResponse({"error": str(e)}, status_code=e.status, headers={"Retry-After": str(e.retry_after)})
+
+
+async def run_query(query: str, metadata):
+    # One budget for the embedding and the candidate fetch (RETRIEVE_BUDGET)
+    deadline = retrieval_deadline()
+    query_vec, degraded = await aembed_within(query, deadline)
+
+    # Paraphrases of an answered question under the same filters
+    if degraded is None:
+        cached = await answer_cache.alookup(query_vec, metadata)
+        if cached is not None:
+            return cached
+
+    results, degraded = await aretrieve_within(
+        query,
+        deadline,
+        query_vec,
+        degraded,
+        k=K,
+        alpha=ALPHA,
+        metadata=metadata,
+        return_all_chunks=RETURN_ALL_CHUNKS
+    )
+
+    context, stats = await asyncio.to_thread(build_context, results)
+    print(f"Context: {stats['tokens_out']} tokens from {stats['chunks_used']}/{stats['chunks_in']} chunks (saved {stats['tokens_saved']})")
+    answer = await aanswer_question(context, query)
+
+    response = format_answer_with_sources_json(answer, results)
+    if degraded:
+        # Not cached: the next request may get the full ranking
+        response["degraded"] = degraded
+    else:
+        await answer_cache.astore(query_vec, metadata, response)
+    return response
+
 # API endpoint
 @app.post("/query")
-def query_api(request: QueryRequest):
+async def query_api(request: QueryRequest):
+    set_deadline()
     try:
-        K = 15
-        ALPHA = 0.30
-        RETURN_ALL_CHUNKS = True
-
         metadata = extract_filters(request.query)
+        key = (normalize_query(request.query), filter_key(metadata), K, ALPHA)
+        with REQUEST_SECONDS.time(endpoint="/query"):
+            # Past the deadline the shared task keeps running for other waiters
+            return await asyncio.wait_for(inflight.do(key, lambda: run_query(request.query, metadata)), time_left())
+
+    except Overloaded as e:
+        return overloaded(e)
+
+    except asyncio.TimeoutError:
+        return overloaded(Overloaded("Request deadline passed", llm_limiter.retry_after(), 503))
+
+    except Exception as e:
+        traceback.print_exc()
+        return {"error": str(e)}
+
+
+@app.get("/metrics")
+async def metrics_api():
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
 
-        results = retrieve(
-            query=request.query,
+
+@app.get("/stats")
+async def stats_api():
+    return {
+        "singleflight": inflight.stats(),
+        "answer_cache": answer_cache.stats(),
+    }
+
+
+# Streaming endpoint (Server-Sent Events):
+#   event: sources  as soon as retrieval finishes
+#   event: token    one per answer delta
+#   event: done     full answer + ttfb_ms / first_token_ms / total_ms
+@app.post("/query/stream")
+async def query_stream_api(request: QueryRequest):
+    start = time.perf_counter()
+
+    # Reject before the 200 goes out; later rejections arrive as an error event
+    try:
+        llm_limiter.check()
+    except Overloaded as e:
+        return overloaded(e)
+
+    async def events():
+        set_deadline()
+        try:
+            metadata = extract_filters(request.query)
+
+            deadline = retrieval_deadline()
+            query_vec, degraded = await aembed_within(request.query, deadline)
+            cached = await answer_cache.alookup(query_vec, metadata) if degraded is None else None
+            if cached is not None:
+                yield sse("sources", {"sources": cached["sources"]})
+                yield sse("token", {"text": cached["answer"]})
+                total = round((time.perf_counter() - start) * 1e3, 1)
+                yield sse("done", {"answer": cached["answer"], "ttfb_ms": total, "first_token_ms": total, "total_ms": total, "cached": True})
+                return
+
+            results, degraded = await aretrieve_within(
+                request.query,
+                deadline,
+                query_vec,
+                degraded,
+                k=K,
+                alpha=ALPHA,
+                metadata=metadata,
+                return_all_chunks=RETURN_ALL_CHUNKS
+            )
+
+            yield sse("sources", {"sources": format_sources(results), "degraded": degraded})
+            ttfb = time.perf_counter() - start
+
+            context, stats = await asyncio.to_thread(build_context, results)
+
+            parts, first_token = [], None
+            async for token in astream_answer(context, request.query):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                parts.append(token)
+                yield sse("token", {"text": token})
+
+            total = time.perf_counter() - start
+            REQUEST_SECONDS.observe(total, endpoint="/query/stream")
+            answer = "".join(parts).strip()
+            if not degraded:
+                await answer_cache.astore(query_vec, metadata, {"answer": answer, "sources": format_sources(results)})
+            print(f"Stream: ttfb {ttfb * 1e3:.0f} ms, first token {(first_token or total) * 1e3:.0f} ms, total {total * 1e3:.0f} ms")
+            yield sse("done", {
+                "answer": answer,
+                "ttfb_ms": round(ttfb * 1e3, 1),
+                "first_token_ms": round((first_token or total) * 1e3, 1),
+                "total_ms": round(total * 1e3, 1),
+                "context_tokens": stats["tokens_out"],
+                "degraded": degraded,
+            })
+
+        except Overloaded as e:
+            yield sse("error", {"error": str(e), "retry_after": e.retry_after})
+
+        except Exception as e:
+            traceback.print_exc()
+            yield sse("error", {"error": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Batch endpoint: shared retrieval (see retrieve_many), answers generated
+# BATCH_LLM_CONCURRENCY at a time, results returned in request order
+@app.post("/query/batch")
+async def query_batch_api(request: BatchQueryRequest):
+    queries = request.queries
+    if len(queries) > BATCH_MAX_QUERIES:
+        return {"error": f"At most {BATCH_MAX_QUERIES} queries per batch"}
+
+    start = time.perf_counter()
+    # One request's deadline per wave of BATCH_LLM_CONCURRENCY answers
+    set_deadline(request_deadline() * max(1, math.ceil(len(queries) / BATCH_LLM_CONCURRENCY)))
+    try:
+        metadatas = [extract_filters(q) for q in queries]
+        # The batch's embeddings count against the same limit as single queries, one slot per query
+        async with embed_limiter.slot(weight=len(queries)):
+            query_vecs = await asyncio.to_thread(embed_many, queries)
+        all_results = await asyncio.to_thread(
+            retrieve_many,
+            queries,
             k=K,
             alpha=ALPHA,
-            metadata=metadata,
-            return_all_chunks=RETURN_ALL_CHUNKS
+            metadatas=metadatas,
+            return_all_chunks=RETURN_ALL_CHUNKS,
+            query_vecs=query_vecs
         )
+    except Overloaded as e:
+        return overloaded(e)
+    except Exception as e:
+        traceback.print_exc()
+        return {"error": str(e)}
 
-        context = format_context(results)
-        answer = answer_question(context, request.query)
+    llm_slots = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
 
-        return format_answer_with_sources_json(answer, results)
+    async def answer_one(query, results):
+        try:
+            context, _ = await asyncio.to_thread(build_context, results)
+            async with llm_slots:
+                answer = await aanswer_question(context, query)
+            return {"answer": answer.strip(), "sources": format_sources(results)}
+        except Exception as e:
+            traceback.print_exc()
+            return {"error": str(e)}
 
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return {"error": str(e)}
\ No newline at end of file
+    answers = await asyncio.gather(*(answer_one(q, r) for q, r in zip(queries, all_results)))
+    REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint="/query/batch")
+    print(f"Batch: {len(queries)} queries in {time.perf_counter() - start:.2f}s")
+    return {"results": answers}
@@ -0,0 +1,165 @@
+import json
+import time
+import shutil
+import hashlib
+import argparse
+from pathlib import Path
+from scripts.env import load_env, setting
+from scripts.snapshot import write_snapshot, SnapshotStore, iter_qdrant, iter_jsonl, EMBEDDINGS_PATH
+from scripts.bm25_index import build_index, BM25Index
+
+# Artifact config: ARTIFACT_ROOT and ARTIFACT_KEEP can be set in the environment
+ARTIFACT_ROOT = "artifacts" # VARIABLE
+ARTIFACT_KEEP = 3 # versions kept on disk
+PDF_DIR = "data/" # VARIABLE
+ARTIFACT_FORMAT = 2 # 2: snapshot ids and payload columns are memory-mapped binaries
+
+
+def data_fingerprint(pdf_dir=PDF_DIR) -> str:
+    """Hash of every PDF's path, size and mtime; changes when data/ changes."""
+    h = hashlib.sha1()
+    root = Path(pdf_dir)
+    for path in sorted(root.rglob("*.pdf")):
+        st = path.stat()
+        h.update(f"{path.relative_to(root)}|{st.st_size}|{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+class Artifact:
+    """
+    A self-contained, versioned index: snapshot (vectors, texts, payload
+    columns, metadata postings) + BM25 postings + manifest. Opening one only
+    maps files, so startup cost does not depend on corpus size.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / "manifest.json", "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.version = self.manifest["version"]
+        self.store = SnapshotStore(self.path / "snapshot")
+        self.bm25 = BM25Index(self.path / "bm25")
+        self.store.bm25 = self.bm25
+
+    def is_stale(self, fingerprint) -> bool:
+        return fingerprint is not None and fingerprint != self.manifest.get("fingerprint")
+
+
+def artifact_format(path):
+    try:
+        with open(Path(path) / "manifest.json", "r", encoding="utf-8") as f:
+            return json.load(f).get("format")
+    except (OSError, ValueError):
+        return None
+
+
+def artifact_root():
+    return setting("ARTIFACT_ROOT", ARTIFACT_ROOT)
+
+
+def list_artifacts(root=None):
+    """Complete artifacts this code can open, newest first."""
+    root = Path(root or artifact_root())
+    if not root.exists():
+        return []
+    done = [p for p in root.iterdir() if artifact_format(p) == ARTIFACT_FORMAT]
+    return sorted(done, key=lambda p: p.name, reverse=True)
+
+
+def latest_artifact(root=None):
+    artifacts = list_artifacts(root)
+    return Artifact(artifacts[0]) if artifacts else None
+
+
+def build_artifact(records, fingerprint=None, root=None, dtype="float32", source=""):
+    """Write a new artifact version from (id, vector, payload) records."""
+    root = root or artifact_root()
+    version = time.strftime("index-%Y%m%dT%H%M%S", time.gmtime())
+    tmp = Path(root) / f".{version}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    start = time.perf_counter()
+    write_snapshot(records, tmp / "snapshot", dtype=dtype, source=source)
+    store = SnapshotStore(tmp / "snapshot")
+    build_index(((store.point_id(row), store.payload(row)) for row in range(len(store))), path=tmp / "bm25")
+
+    with open(tmp / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "format": ARTIFACT_FORMAT,
+            "version": version,
+            "created": time.time(),
+            "fingerprint": fingerprint,
+            "count": len(store),
+            "source": source,
+        }, f)
+
+    final = Path(root) / version
+    tmp.rename(final)
+    print(f"Artifact {version}: {len(store)} points in {time.perf_counter() - start:.1f}s")
+
+    for old in list_artifacts(root)[setting("ARTIFACT_KEEP", ARTIFACT_KEEP):]:
+        shutil.rmtree(old, ignore_errors=True)
+    return Artifact(final)
+
+
+def store_records():
+    """
+    (records, source) for every point in the collection, read from the
+    embedding store. Falls back to scrolling Qdrant when the store lacks
+    some of them: a store written before points were keyed by id kept one
+    point per distinct text.
+    """
+    from scripts.embedding_store import EmbeddingStore
+    from scripts.collection_manifest import current_ids
+
+    # The store keeps chunks the sync deleted; export only what the collection holds
+    store = EmbeddingStore()
+    only = current_ids()
+    missing = store.count_missing(only) if only is not None else 0
+    if missing:
+        from scripts.clients import get_qdrant
+        print(f"Embedding store lacks {missing} of {len(only)} collection points; exporting from Qdrant")
+        return iter_qdrant(get_qdrant(bulk=True)), "qdrant"
+    return store.iter_points(only), f"store:{store.path}"
+
+
+def rebuild(pdf_dir=PDF_DIR, root=None):
+    """Full pipeline: extract PDFs, embed and upload new chunks, then export an artifact."""
+    from scripts.load_pdfs import load_pdfs
+    from scripts.get_embedding import get_embedding
+
+    fingerprint = data_fingerprint(pdf_dir)
+    docs = load_pdfs(pdf_dir)
+    if docs:
+        get_embedding(docs, pdf_dir)
+    records, source = store_records()
+    return build_artifact(records, fingerprint, root, source=source)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a versioned index artifact")
+    parser.add_argument("--from", dest="source", choices=["store", "qdrant", "jsonl", "pipeline"], default="store")
+    parser.add_argument("--path", default=EMBEDDINGS_PATH, help="embeddings.jsonl when --from jsonl")
+    parser.add_argument("--root", default=artifact_root())
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    args = parser.parse_args()
+
+    if args.source == "pipeline":
+        rebuild(root=args.root)
+        return
+
+    if args.source == "qdrant":
+        from scripts.clients import get_qdrant
+        records, source = iter_qdrant(get_qdrant(bulk=True)), "qdrant"
+    elif args.source == "store":
+        records, source = store_records()
+    else:
+        records, source = iter_jsonl(args.path), f"jsonl:{args.path}"
+
+    build_artifact(records, data_fingerprint(), args.root, dtype=args.dtype, source=source)
+
+
+if __name__ == "__main__":
+    load_env()
+    main()
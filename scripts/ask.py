@@ -1,3 +1,7 @@
+from scripts.env import load_env
+
+load_env()
+
 from scripts.retrievers import retrieve, format_context
 from scripts.qa import answer_question
 from scripts.printer import format_answer_with_sources_json
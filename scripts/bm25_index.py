@@ -0,0 +1,623 @@
+import os
+import re
+import json
+import time
+import shutil
+import numpy as np
+from pathlib import Path
+from scripts.env import load_env, setting
+
+# Index config
+BM25_INDEX_DIR = "bm25_index" # VARIABLE; BM25_INDEX_DIR in the environment overrides it
+BM25_FLUSH_DOCS = 5000 # VARIABLE; BM25Writer writes a delta segment once this many changes are buffered
+BM25_FLUSH_SECONDS = 30.0 # VARIABLE; ...or when this long has passed since its last flush
+MERGE_FACTOR = 2 # a segment absorbs the next one once it is less than this many times its size
+FORMAT = 2
+K1 = 1.5  # rank_bm25.BM25Okapi defaults
+B = 0.75
+EPSILON = 0.25
+
+_rx_tok = re.compile(r"[A-Za-z0-9_]+")
+
+
+def toks(s: str):
+    return [t.lower() for t in _rx_tok.findall(s or "")]
+
+
+def _joined(value):
+    if isinstance(value, list):
+        return " ".join(str(v) for v in value)
+    return value
+
+
+def payload_doc_key(pid, payload: dict) -> str:
+    """Document a chunk belongs to (retrievers.doc_key() for a point)."""
+    p = payload or {}
+    return p.get("family_id") or p.get("doc_id") or p.get("url") or p.get("source") or str(pid)
+
+
+def bm25_text(p: dict) -> str:
+    """Text BM25 sees for one chunk: metadata fields followed by the chunk text."""
+    p = p or {}
+    return " ".join(filter(None, [
+        p.get("source", ""),
+        str(p.get("year", "")),
+        p.get("month", ""),
+        p.get("full_date", ""),
+        _joined(p.get("committee_codes", [])),
+        p.get("file_type", ""),
+        p.get("body_code", ""),
+        _joined(p.get("stance", [])),
+        _joined(p.get("topic", [])),
+        _joined(p.get("meta", [])),
+        p.get("text", "")
+    ]))
+
+
+def index_dir():
+    return setting("BM25_INDEX_DIR", BM25_INDEX_DIR)
+
+
+def _idf(df, n_docs):
+    return np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+
+
+def _average_idf(df, n_docs):
+    """Mean BM25Okapi idf over the terms present (df > 0); negative idfs are floored to EPSILON times this."""
+    df = df[df > 0]
+    return float(_idf(df, n_docs).mean()) if len(df) else 0.0
+
+
+def _ranges(starts, ends):
+    """Concatenated np.arange(start, end) for each pair."""
+    lens = ends - starts
+    total = int(lens.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64)
+    return np.repeat(starts - np.cumsum(lens) + lens, lens) + np.arange(total)
+
+
+class _Segment:
+    """
+    One immutable batch of rows: term-major postings (CSR) over the global
+    term ids, doc_len as float32, a doc-major forward index (the terms of
+    each row) and the document each row belongs to. Deleted rows are only
+    masked out by `live` until a merge drops them.
+    """
+
+    def __init__(self, path, live=None):
+        self.path = Path(path)
+        with open(self.path / "ids.json", "r", encoding="utf-8") as f:
+            self.ids = json.load(f)
+        self.offsets = np.load(self.path / "offsets.npy", mmap_mode="r")
+        self.postings = np.load(self.path / "postings.npy", mmap_mode="r")
+        self.tfs = np.load(self.path / "tfs.npy", mmap_mode="r")
+        self.doc_len = np.load(self.path / "doc_len.npy", mmap_mode="r")
+        if self.doc_len.dtype != np.float32: # indexes from before segments stored int32
+            self.doc_len = np.asarray(self.doc_len, dtype=np.float32)
+        self.live = np.load(self.path / live) if live else np.ones(len(self.ids), dtype=bool)
+
+        # Indexes written before documents were tracked lack these
+        self.docs = None
+        if (self.path / "docs.json").exists():
+            with open(self.path / "docs.json", "r", encoding="utf-8") as f:
+                self.docs = json.load(f)
+            self.doc_of = np.load(self.path / "doc_of.npy", mmap_mode="r")
+            self.chunk_idx = np.load(self.path / "chunk_idx.npy", mmap_mode="r")
+        self._forward = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def triples(self):
+        """(term, row, tf) of every posting, live rows or not."""
+        terms = np.repeat(np.arange(len(self.offsets) - 1), np.diff(self.offsets))
+        return terms, np.asarray(self.postings, dtype=np.int64), np.asarray(self.tfs)
+
+    def forward(self):
+        """(doc_offsets, doc_terms): doc_terms[doc_offsets[r]:doc_offsets[r + 1]] are row r's terms."""
+        if self._forward is None:
+            if (self.path / "doc_offsets.npy").exists():
+                self._forward = (
+                    np.load(self.path / "doc_offsets.npy", mmap_mode="r"),
+                    np.load(self.path / "doc_terms.npy", mmap_mode="r"),
+                )
+            else: # index from before segments: invert the postings once
+                terms, docs, _ = self.triples()
+                order = np.argsort(docs, kind="stable")
+                doc_offsets = np.zeros(len(self.ids) + 1, dtype=np.int64)
+                np.cumsum(np.bincount(docs, minlength=len(self.ids)), out=doc_offsets[1:])
+                self._forward = (doc_offsets, terms[order])
+        return self._forward
+
+    def terms_of(self, rows):
+        """Term ids of the given rows, concatenated (each row's terms once)."""
+        doc_offsets, doc_terms = self.forward()
+        rows = np.asarray(rows, dtype=np.int64)
+        return np.asarray(doc_terms[_ranges(doc_offsets[rows], doc_offsets[rows + 1])], dtype=np.int64)
+
+
+def _read_meta(path):
+    """
+    (meta, terms, live df per term) of the index at `path`. An index written
+    before segments reads as a single segment "." (the directory itself).
+    """
+    path = Path(path)
+    with open(path / "meta.json", "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    if meta.get("format") == FORMAT:
+        terms = []
+        if meta["vocab_bytes"]:
+            with open(path / "vocab.txt", "rb") as f:
+                terms = f.read(meta["vocab_bytes"]).decode("utf-8").split("\n")[:-1]
+        df = np.load(path / meta["df"]) if meta["df"] else np.zeros(len(terms), dtype=np.int64)
+        return meta, terms, df
+
+    with open(path / "vocab.json", "r", encoding="utf-8") as f:
+        terms = json.load(f)
+    legacy = _Segment(path)
+    df = np.diff(np.asarray(legacy.offsets))
+    n_docs = len(legacy)
+    meta = _empty_meta()
+    meta.update({
+        "n_docs": n_docs,
+        "total_len": float(legacy.doc_len.sum()),
+        "avg_idf": _average_idf(df, n_docs),
+        "segments": [{"name": ".", "rows": n_docs, "n_live": n_docs, "live": None}],
+    })
+    return meta, terms, df
+
+
+def _empty_meta():
+    return {
+        "format": FORMAT, "k1": K1, "b": B, "epsilon": EPSILON,
+        "gen": 0, "next_segment": 1,
+        "n_terms": 0, "vocab_bytes": 0, "df": None,
+        "n_docs": 0, "total_len": 0.0, "avg_idf": 0.0,
+        "segments": [],
+    }
+
+
+class BM25Index:
+    """
+    Memory-mapped BM25 inverted index over chunk payloads, stored as
+    append-only segments (see update_index()). Scores match
+    rank_bm25.BM25Okapi built over the same docs.
+
+    Rows are numbered across segments in order; only live rows have ids in
+    `rows`. A query reads just the postings of its own terms.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path or index_dir())
+        self.meta, self.terms, self.df = _read_meta(self.path)
+        self.vocab = {t: i for i, t in enumerate(self.terms)}
+
+        self.segments = [_Segment(self.path / s["name"], s["live"]) for s in self.meta["segments"]]
+        self.bases = np.cumsum([0] + [len(s) for s in self.segments])
+        self.live_rows = np.concatenate(
+            [base + np.flatnonzero(s.live) for base, s in zip(self.bases, self.segments)]
+        ) if self.segments else np.zeros(0, dtype=np.int64)
+        self.ids = [
+            pid for s in self.segments
+            for pid in (s.ids if s.live.all() else [s.ids[i] for i in np.flatnonzero(s.live)])
+        ]
+        self.rows = dict(zip(self.ids, self.live_rows.tolist()))
+
+        n_docs = self.meta["n_docs"]
+        self.avgdl = self.meta["total_len"] / n_docs if n_docs else 0.0
+        self.avg_idf = self.meta["avg_idf"]
+        self.first, self._first_built = None, False
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _first_chunks(self):
+        """Doc key -> id of its lowest-chunk_index live row; None if a segment lacks document data."""
+        best = {}
+        for s in self.segments:
+            rows = np.flatnonzero(s.live)
+            if not len(rows):
+                continue
+            if s.docs is None:
+                return None
+            doc_of = np.asarray(s.doc_of)[rows]
+            chunk = np.asarray(s.chunk_idx)[rows]
+            order = np.lexsort((chunk, doc_of))
+            starts = np.flatnonzero(np.r_[True, np.diff(doc_of[order]) != 0])
+            for i in order[starts]:
+                key, c = s.docs[doc_of[i]], int(chunk[i])
+                if key not in best or c < best[key][0]:
+                    best[key] = (c, s.ids[rows[i]])
+        return {key: pid for key, (_, pid) in best.items()}
+
+    def first_chunk_ids(self, doc_keys):
+        """Id of each document's first chunk (lowest chunk_index), or None if any is unknown."""
+        if not self._first_built:
+            self.first, self._first_built = self._first_chunks(), True
+        if self.first is None:
+            return None
+        try:
+            return [self.first[key] for key in doc_keys]
+        except KeyError:
+            return None
+
+    def _gather(self, sorted_rows, fn):
+        """fn(segment, local rows) for the rows in each segment, concatenated in row order."""
+        bounds = np.searchsorted(sorted_rows, self.bases)
+        parts = [
+            fn(s, sorted_rows[lo:hi] - base)
+            for s, base, lo, hi in zip(self.segments, self.bases, bounds[:-1], bounds[1:]) if hi > lo
+        ]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+    def _postings(self, t, sorted_rows):
+        """Positions in `sorted_rows` of the rows containing term t, with their tf and doc_len."""
+        at, tfs, dls = [], [], []
+        for s, base in zip(self.segments, self.bases):
+            if t + 1 >= len(s.offsets): # term first seen after this segment was written
+                continue
+            lo, hi = s.offsets[t], s.offsets[t + 1]
+            if lo == hi:
+                continue
+            local = np.asarray(s.postings[lo:hi], dtype=np.int64)
+            k = np.minimum(np.searchsorted(sorted_rows, local + base), len(sorted_rows) - 1)
+            hit = sorted_rows[k] == local + base
+            at.append(k[hit])
+            tfs.append(np.asarray(s.tfs[lo:hi])[hit])
+            dls.append(s.doc_len[local[hit]])
+        if not at:
+            return np.zeros(0, dtype=np.int64), None, None
+        return np.concatenate(at), np.concatenate(tfs), np.concatenate(dls)
+
+    def get_scores(self, query: str, ids=None):
+        """
+        BM25 score of `query` for each id in `ids` (all docs if None), in order.
+        For a subset, N, df and avgdl are taken over the subset, exactly like
+        building BM25Okapi over those docs. Returns None if an id is unknown.
+        """
+        if ids is None:
+            rows = self.live_rows
+        else:
+            try:
+                rows = np.fromiter((self.rows[str(i)] for i in ids), dtype=np.int64, count=len(ids))
+            except KeyError:
+                return None
+
+        n_docs = len(rows)
+        scores = np.zeros(n_docs)
+        if not n_docs:
+            return scores
+
+        full = ids is None or n_docs == len(self.ids)
+        order = np.argsort(rows, kind="stable")
+        sorted_rows = rows[order]
+        avgdl = self.avgdl if full else float(self._gather(sorted_rows, lambda s, r: s.doc_len[r]).mean())
+
+        floor = None
+        for term in toks(query):
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            at, tf, dl = self._postings(t, sorted_rows)
+            if not len(at):
+                continue
+            df = self.df[t] if full else len(at)
+            idf = _idf(df, n_docs)
+            if idf < 0:
+                if floor is None:
+                    if full:
+                        floor = EPSILON * self.avg_idf
+                    else:
+                        present = np.bincount(self._gather(sorted_rows, lambda s, r: s.terms_of(r)))
+                        floor = EPSILON * _average_idf(present, n_docs)
+                idf = floor
+            denom = tf + K1 * (1 - B + B * dl / avgdl)
+            scores[order[at]] += idf * (tf * (K1 + 1) / denom)
+
+        return scores
+
+
+def _write_segment(path, n_terms, ids, doc_len, doc_keys, chunk_idx, term_idx, doc_idx, tf, doc_terms, row_terms):
+    """
+    Write one segment from (term, row, tf) triples whose rows ascend within
+    each term once stably sorted by term, plus the forward index: doc_terms
+    in row order and the number of terms of each row.
+    """
+    path = Path(path)
+    shutil.rmtree(path, ignore_errors=True)
+    path.mkdir(parents=True)
+
+    order = np.argsort(term_idx, kind="stable")
+    offsets = np.zeros(n_terms + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_idx, minlength=n_terms), out=offsets[1:])
+    np.save(path / "offsets.npy", offsets)
+    np.save(path / "postings.npy", doc_idx[order].astype(np.int32))
+    np.save(path / "tfs.npy", tf[order].astype(np.float32))
+    np.save(path / "doc_len.npy", np.asarray(doc_len, dtype=np.float32))
+
+    doc_offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    np.cumsum(row_terms, out=doc_offsets[1:])
+    np.save(path / "doc_offsets.npy", doc_offsets)
+    np.save(path / "doc_terms.npy", np.asarray(doc_terms, dtype=np.int32))
+
+    if doc_keys is not None:
+        docs = list(dict.fromkeys(doc_keys))
+        number = {key: i for i, key in enumerate(docs)}
+        np.save(path / "doc_of.npy", np.fromiter((number[key] for key in doc_keys), dtype=np.int32, count=len(doc_keys)))
+        np.save(path / "chunk_idx.npy", np.asarray(chunk_idx, dtype=np.int32))
+        with open(path / "docs.json", "w", encoding="utf-8") as f:
+            json.dump(docs, f)
+    with open(path / "ids.json", "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+
+
+def _merge(path, entries, name, n_terms):
+    """Rewrite the live rows of the segments in `entries` as one new segment `name`."""
+    term_parts, doc_parts, tf_parts, fwd_parts, count_parts = [], [], [], [], []
+    ids, doc_len, doc_keys, chunk_idx = [], [], [], []
+    for entry in entries:
+        s = _Segment(path / entry["name"], entry["live"])
+        new_row = np.cumsum(s.live) - 1 + len(ids)
+        terms, docs, tfs = s.triples()
+        keep = s.live[docs]
+        term_parts.append(terms[keep])
+        doc_parts.append(new_row[docs[keep]])
+        tf_parts.append(tfs[keep])
+
+        rows = np.flatnonzero(s.live)
+        fwd_parts.append(s.terms_of(rows))
+        count_parts.append(np.diff(s.forward()[0])[rows])
+        ids.extend(s.ids[i] for i in rows)
+        doc_len.append(s.doc_len[rows])
+        if s.docs is None or doc_keys is None:
+            doc_keys = None # older rows: documents untracked until rebuilt
+        else:
+            doc_keys.extend(s.docs[d] for d in np.asarray(s.doc_of)[rows])
+            chunk_idx.append(np.asarray(s.chunk_idx)[rows])
+
+    _write_segment(
+        path / name, n_terms, ids, np.concatenate(doc_len),
+        doc_keys, np.concatenate(chunk_idx) if doc_keys is not None else None,
+        np.concatenate(term_parts), np.concatenate(doc_parts), np.concatenate(tf_parts),
+        np.concatenate(fwd_parts), np.concatenate(count_parts)
+    )
+    return {"name": name, "rows": len(ids), "n_live": len(ids), "live": None}
+
+
+def _commit(path, meta, terms, df):
+    """
+    Append new terms to vocab.txt, write df, then swap in meta.json: the
+    commit point. Files no longer referenced are removed afterwards; open
+    readers keep their mmaps.
+    """
+    with open(path / "vocab.txt", "ab") as f:
+        f.truncate(meta["vocab_bytes"]) # drop anything an interrupted update appended
+        f.seek(0, os.SEEK_END)
+        f.write("".join(t + "\n" for t in terms[meta["n_terms"]:]).encode("utf-8"))
+        meta["vocab_bytes"], meta["n_terms"] = f.tell(), len(terms)
+
+    meta["df"] = f"df-{meta['gen']}.npy"
+    np.save(path / meta["df"], df)
+    meta["avg_idf"] = _average_idf(df, meta["n_docs"])
+
+    tmp = path / "meta.json.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, path / "meta.json")
+
+    keep = {"meta.json", "vocab.txt", meta["df"]} | {s["name"] for s in meta["segments"]}
+    for entry in path.iterdir():
+        if entry.name not in keep:
+            shutil.rmtree(entry, ignore_errors=True) if entry.is_dir() else entry.unlink(missing_ok=True)
+    for s in meta["segments"]:
+        for live in (path / s["name"]).glob("live-*.npy"):
+            if live.name != s["live"]:
+                live.unlink(missing_ok=True)
+
+
+def update_index(added=(), removed=(), path=None):
+    """
+    Add or replace docs (iterable of (id, payload)) and drop `removed` ids.
+
+    Added docs are tokenized into one new delta segment; dropped or replaced
+    ones are tombstoned in the segment holding them, and their terms taken
+    off the live df through its forward index. Segments then merge, dropping
+    tombstoned rows, while the newest is at least 1/MERGE_FACTOR the size of
+    the one before it, so each row is rewritten O(log n) times overall and a
+    call costs about O(docs changed + vocabulary), not O(index). Use
+    BM25Writer to feed a long sync in bounded batches.
+    """
+    path = Path(path or index_dir())
+    path.mkdir(parents=True, exist_ok=True)
+    if (path / "meta.json").exists():
+        meta, terms, df = _read_meta(path)
+    else:
+        meta, terms, df = _empty_meta(), [], np.zeros(0, dtype=np.int64)
+    df = np.array(df, dtype=np.int64)
+    meta["gen"] += 1
+
+    def segment_name():
+        meta["next_segment"] += 1
+        return f"seg-{meta['next_segment'] - 1:06d}"
+
+    added = list(dict((str(pid), payload) for pid, payload in added).items())
+    drop = {str(pid) for pid in removed} | {pid for pid, _ in added}
+
+    segments = []
+    for entry in meta["segments"]:
+        entry = dict(entry)
+        s = _Segment(path / entry["name"], entry["live"])
+        dead = np.fromiter((row for row, pid in enumerate(s.ids) if pid in drop), dtype=np.int64)
+        dead = dead[s.live[dead]]
+        if len(dead):
+            live = s.live.copy()
+            live[dead] = False
+            entry["live"] = f"live-{meta['gen']}.npy"
+            np.save(s.path / entry["live"], live)
+            entry["n_live"] -= len(dead)
+            df -= np.bincount(s.terms_of(dead), minlength=len(df))
+            meta["n_docs"] -= len(dead)
+            meta["total_len"] -= float(s.doc_len[dead].sum())
+        segments.append(entry)
+
+    if added:
+        vocab = {t: i for i, t in enumerate(terms)}
+        ids, doc_len, doc_keys, chunk_idx = [], [], [], []
+        new_terms, new_docs, new_tfs = [], [], []
+        for pid, payload in added:
+            row = len(ids)
+            counts = {}
+            tokens = toks(bm25_text(payload))
+            for tok in tokens:
+                counts[tok] = counts.get(tok, 0) + 1
+            for tok, c in counts.items():
+                t = vocab.get(tok)
+                if t is None:
+                    t = vocab[tok] = len(terms)
+                    terms.append(tok)
+                new_terms.append(t)
+                new_docs.append(row)
+                new_tfs.append(c)
+            ids.append(pid)
+            doc_len.append(len(tokens))
+            doc_keys.append(payload_doc_key(pid, payload))
+            chunk_idx.append((payload or {}).get("chunk_index", 0))
+
+        term_idx = np.asarray(new_terms, dtype=np.int64)
+        df = np.concatenate([df, np.zeros(len(terms) - len(df), dtype=np.int64)])
+        df += np.bincount(term_idx, minlength=len(terms))
+        name = segment_name()
+        _write_segment(
+            path / name, len(terms), ids, doc_len, doc_keys, chunk_idx,
+            term_idx, np.asarray(new_docs, dtype=np.int64), np.asarray(new_tfs, dtype=np.float32),
+            term_idx, np.bincount(np.asarray(new_docs, dtype=np.int64), minlength=len(ids))
+        )
+        segments.append({"name": name, "rows": len(ids), "n_live": len(ids), "live": None})
+        meta["n_docs"] += len(ids)
+        meta["total_len"] += float(sum(doc_len))
+
+    # Empty segments go; legacy or mostly-deleted ones are rewritten; then tiered merging
+    segments = [s for s in segments if s["n_live"]]
+    for i, s in enumerate(segments):
+        if s["name"] == "." or s["n_live"] * 2 < s["rows"]:
+            segments[i] = _merge(path, [s], segment_name(), len(terms))
+    while len(segments) > 1 and segments[-2]["n_live"] < MERGE_FACTOR * segments[-1]["n_live"]:
+        segments[-2:] = [_merge(path, segments[-2:], segment_name(), len(terms))]
+
+    meta["segments"] = segments
+    _commit(path, meta, terms, df)
+    print(f"BM25 index: {meta['n_docs']} docs, {len(terms)} terms, {len(segments)} segments ({len(added)} added, {len(removed)} removed)")
+
+
+class BM25Writer:
+    """
+    Buffers index changes and applies them with update_index() once
+    BM25_FLUSH_DOCS are pending or BM25_FLUSH_SECONDS have passed, so a long
+    sync holds one bounded batch in memory. Use as a context manager; leaving
+    it flushes whatever is left.
+    """
+
+    def __init__(self, path=None, flush_docs=None, flush_seconds=None):
+        self.path = path
+        self.flush_docs = flush_docs or setting("BM25_FLUSH_DOCS", BM25_FLUSH_DOCS)
+        self.flush_seconds = flush_seconds or setting("BM25_FLUSH_SECONDS", BM25_FLUSH_SECONDS)
+        self.added, self.removed = {}, set()
+        self.since = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def _due(self):
+        return len(self.added) + len(self.removed) >= self.flush_docs
+
+    def add(self, entries):
+        """Queue (id, payload) pairs to add or replace."""
+        for pid, payload in entries:
+            self.added[str(pid)] = payload
+            if self._due():
+                self.flush()
+        if time.monotonic() - self.since >= self.flush_seconds:
+            self.flush()
+
+    def remove(self, ids):
+        """Queue ids to drop, including any still waiting to be added."""
+        for pid in ids:
+            self.added.pop(str(pid), None)
+            self.removed.add(str(pid))
+            if self._due():
+                self.flush()
+
+    def flush(self):
+        if self.added or self.removed:
+            update_index(self.added.items(), self.removed, self.path)
+        self.added, self.removed = {}, set()
+        self.since = time.monotonic()
+
+
+def build_index(entries, path=None):
+    """Rebuild from scratch from an iterable of (id, payload), in bounded batches."""
+    path = path or index_dir()
+    shutil.rmtree(path, ignore_errors=True)
+    with BM25Writer(path) as writer:
+        writer.add(entries)
+    if not (Path(path) / "meta.json").exists(): # no entries: still leave an empty index
+        update_index(path=path)
+
+_cache = {}
+
+
+def load_index(path=None):
+    """Shared read-only index, reopened when the on-disk copy changes. None if missing."""
+    path = path or index_dir()
+    meta = Path(path) / "meta.json"
+    try:
+        stamp = meta.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    cached = _cache.get(str(path))
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    try:
+        try:
+            index = BM25Index(path)
+        except FileNotFoundError:
+            # A writer committed and removed the old segments mid-open; meta.json is already the new one
+            index = BM25Index(path)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"BM25 index unavailable: {e}")
+        return None
+    _cache[str(path)] = (stamp, index)
+    return index
+
+
+if __name__ == "__main__":
+    # Rebuild the index from everything currently in the collection
+    from scripts.clients import get_qdrant
+
+    load_env()
+
+    qdrant = get_qdrant(bulk=True)
+    collection = "mfs_collection" # VARIABLE
+
+    entries, offset = [], None
+    while True:
+        page, offset = qdrant.scroll(
+            collection_name=collection,
+            limit=1000,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False
+        )
+        entries.extend((p.id, p.payload) for p in page)
+        if offset is None:
+            break
+
+    print(f"Indexing {len(entries)} chunks from '{collection}'")
+    build_index(entries)
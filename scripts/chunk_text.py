@@ -1,11 +1,18 @@
 import re
-import tiktoken
+from functools import lru_cache
 
-encoding = tiktoken.encoding_for_model("text-embedding-3-large")
 MAX_EMBEDDING_TOKENS = 8191
+CHUNK_MAX_TOKENS = 400 # ingest chunk size used by get_embedding()
+CHUNK_OVERLAP = 100 # tokens repeated between consecutive chunks
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    """tiktoken encoding, loaded on first use (it may download the BPE file)."""
+    import tiktoken
+    return tiktoken.encoding_for_model("text-embedding-3-large")
 
 def count_tokens(text):
-    return len(encoding.encode(text))
+    return len(get_encoding().encode(text))
 
 def chunk_text(text, max_tokens=2000, overlap=200):
     """
@@ -19,6 +26,7 @@ def chunk_text(text, max_tokens=2000, overlap=200):
     # Normalise spacing a bit
     text = re.sub(r"\s+", " ", text).strip()
 
+    encoding = get_encoding()
     tokens = encoding.encode(text)
     chunks = []
 
@@ -40,6 +48,7 @@ def chunk_text(text, max_tokens=2000, overlap=200):
     return chunks
 
 def truncate_guard(text):
+    encoding = get_encoding()
     tokens = encoding.encode(text)
     if len(tokens) > MAX_EMBEDDING_TOKENS:
         print(f"Truncating long chunk ({len(tokens)} tokens)")
@@ -0,0 +1,129 @@
+"""
+One place to get Qdrant and OpenAI clients. Each client is created on first
+use and shared by every module, so the process holds one keep-alive
+connection pool per service instead of one per module.
+
+    QDRANT_PATH=qdrant_db        on-disk local mode (no server), wins over QDRANT_URL
+    QDRANT_PREFER_GRPC=1         gRPC for every Qdrant call
+    QDRANT_BULK_GRPC=1           gRPC only for bulk transfer (get_qdrant(bulk=True))
+"""
+import asyncio
+import threading
+from typing import TYPE_CHECKING
+from scripts.env import setting
+
+if TYPE_CHECKING:
+    import httpx
+
+# Qdrant config: defaults; each name can be set in the environment
+# (QDRANT_URL, QDRANT_API_KEY and QDRANT_PATH only come from there)
+QDRANT_GRPC_PORT = 6334
+QDRANT_TIMEOUT = 30 # seconds
+
+# HTTP pool config (Qdrant REST and OpenAI)
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE = 20
+HTTP_KEEPALIVE_EXPIRY = 30.0 # seconds an idle connection is kept
+OPENAI_TIMEOUT = 60.0
+
+_clients = {}
+_lock = threading.RLock() # factories may fetch other clients
+
+
+def http_limits() -> "httpx.Limits":
+    import httpx
+
+    return httpx.Limits(
+        max_connections=setting("HTTP_MAX_CONNECTIONS", HTTP_MAX_CONNECTIONS),
+        max_keepalive_connections=setting("HTTP_MAX_KEEPALIVE", HTTP_MAX_KEEPALIVE),
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def _shared(name, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+
+def register(name, client):
+    """Use `client` for `name` ("qdrant", "async_qdrant", "openai", ...), e.g. an in-memory Qdrant."""
+    with _lock:
+        _clients[name] = client
+
+
+def qdrant_path():
+    """QDRANT_PATH (e.g. "qdrant_db") when Qdrant runs in local-path mode, else None."""
+    return setting("QDRANT_PATH")
+
+
+def qdrant_kwargs(prefer_grpc=None) -> dict:
+    if qdrant_path():
+        return {"path": qdrant_path()}
+    return {
+        "url": setting("QDRANT_URL"),
+        "api_key": setting("QDRANT_API_KEY"),
+        "prefer_grpc": setting("QDRANT_PREFER_GRPC", False) if prefer_grpc is None else prefer_grpc,
+        "grpc_port": setting("QDRANT_GRPC_PORT", QDRANT_GRPC_PORT),
+        "timeout": setting("QDRANT_TIMEOUT", QDRANT_TIMEOUT),
+        "limits": http_limits(),
+    }
+
+
+class ThreadedAsync:
+    """
+    Async facade over a sync client: every method call runs in the default
+    executor. Local-path Qdrant locks its directory, so sync and async code
+    have to share one client.
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(attr, *args, **kwargs)
+        return call
+
+
+def get_qdrant(bulk: bool = False):
+    """Shared QdrantClient. bulk=True is for large upserts/scrolls (gRPC if QDRANT_BULK_GRPC)."""
+    from qdrant_client import QdrantClient
+
+    if bulk and setting("QDRANT_BULK_GRPC", False) and not (qdrant_path() or setting("QDRANT_PREFER_GRPC", False)):
+        return _shared("qdrant_bulk", lambda: QdrantClient(**qdrant_kwargs(prefer_grpc=True)))
+    return _shared("qdrant", lambda: QdrantClient(**qdrant_kwargs()))
+
+
+def get_async_qdrant():
+    from qdrant_client import AsyncQdrantClient
+
+    if qdrant_path():
+        return _shared("async_qdrant", lambda: ThreadedAsync(get_qdrant()))
+    return _shared("async_qdrant", lambda: AsyncQdrantClient(**qdrant_kwargs()))
+
+
+def get_openai():
+    from openai import OpenAI, DefaultHttpxClient
+
+    return _shared("openai", lambda: OpenAI(
+        timeout=setting("OPENAI_TIMEOUT", OPENAI_TIMEOUT),
+        http_client=DefaultHttpxClient(limits=http_limits()),
+    ))
+
+
+def get_async_openai():
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    return _shared("async_openai", lambda: AsyncOpenAI(
+        timeout=setting("OPENAI_TIMEOUT", OPENAI_TIMEOUT),
+        http_client=DefaultAsyncHttpxClient(limits=http_limits()),
+    ))
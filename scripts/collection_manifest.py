@@ -0,0 +1,137 @@
+"""
+Which point ids are in mfs_collection. Point ids are uuid5s of (source,
+chunk index, chunk text hash), so the same chunk always gets the same id,
+and a sync only has to upsert ids the manifest lacks and delete the ones
+it no longer produces. upload_to_qdrant() and delete_points() keep the
+manifest current; a missing manifest is rebuilt from the collection.
+
+A sync goes: begin() -> mark(ids) for every current chunk (returns the ids
+to upsert) -> upload_to_qdrant() -> stale(sources) -> delete_points().
+"""
+import time
+import uuid
+import sqlite3
+import threading
+from pathlib import Path
+from scripts.env import setting
+
+# Manifest config
+COLLECTION_MANIFEST_PATH = "cache/collection_manifest.sqlite" # VARIABLE; COLLECTION_MANIFEST_PATH in the environment overrides it
+CHUNK_ID_NAMESPACE = uuid.UUID("5b0f6a57-3f0c-4f1e-9a51-7d0f3a0c2e11")
+SCROLL_PAGE_SIZE = 1024
+
+
+def chunk_id(source, chunk_index, text) -> str:
+    from scripts.embedding_store import text_hash
+
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{source}|{chunk_index}|{text_hash(text)}"))
+
+
+class CollectionManifest:
+    def __init__(self, path=None):
+        self.path = path or setting("COLLECTION_MANIFEST_PATH", COLLECTION_MANIFEST_PATH)
+        self.run = None
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _conn(self):
+        if self._db is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS points (id TEXT PRIMARY KEY, source TEXT, run TEXT)")
+            db.execute("CREATE INDEX IF NOT EXISTS points_source ON points (source)")
+            self._db = db
+        return self._db
+
+    def __len__(self):
+        with self._lock:
+            return self._conn().execute("SELECT COUNT(*) FROM points").fetchone()[0]
+
+    def bootstrap(self, qdrant, collection_name):
+        """Fill an empty manifest from the collection (first run, or after the manifest was lost)."""
+        if len(self) or not qdrant.collection_exists(collection_name):
+            return 0
+        offset, count = None, 0
+        while True:
+            points, offset = qdrant.scroll(
+                collection_name, limit=SCROLL_PAGE_SIZE, offset=offset, with_payload=["source"], with_vectors=False
+            )
+            self.add((p.id, (p.payload or {}).get("source")) for p in points)
+            count += len(points)
+            if offset is None:
+                break
+        print(f"Manifest rebuilt from {collection_name}: {count} points")
+        return count
+
+    def begin(self):
+        """Start a sync; ids not marked or added from here on count as stale."""
+        self.run = f"{time.time():.6f}"
+        return self.run
+
+    def mark(self, ids):
+        """Mark ids as current; return the ones the collection does not have yet."""
+        ids = [str(pid) for pid in ids]
+        with self._lock:
+            db = self._conn()
+            known = set()
+            for i in range(0, len(ids), 500):
+                part = ids[i:i + 500]
+                known.update(pid for (pid,) in db.execute(
+                    f"SELECT id FROM points WHERE id IN ({','.join('?' * len(part))})", part
+                ))
+            db.executemany("UPDATE points SET run = ? WHERE id = ?", [(self.run, pid) for pid in known])
+            db.commit()
+        return [pid for pid in ids if pid not in known]
+
+    def add(self, points):
+        """Record (id, source) pairs as upserted."""
+        with self._lock:
+            db = self._conn()
+            db.executemany(
+                "INSERT OR REPLACE INTO points VALUES (?, ?, ?)",
+                [(str(pid), source, self.run) for pid, source in points]
+            )
+            db.commit()
+
+    def remove(self, ids):
+        with self._lock:
+            db = self._conn()
+            db.executemany("DELETE FROM points WHERE id = ?", [(str(pid),) for pid in ids])
+            db.commit()
+
+    def ids(self):
+        with self._lock:
+            return {pid for (pid,) in self._conn().execute("SELECT id FROM points")}
+
+    def sources(self):
+        with self._lock:
+            return {source for (source,) in self._conn().execute("SELECT DISTINCT source FROM points")}
+
+    def stale(self, sources, pdf_dir=None):
+        """
+        Ids of `sources` not marked during this sync. With pdf_dir, every
+        point of a source that no longer has a PDF there is stale as well;
+        files that merely failed to extract keep their points.
+        """
+        sources = set(sources)
+        if pdf_dir is not None:
+            present = {path.name for path in Path(pdf_dir).rglob("*.pdf")}
+            sources |= {source for source in self.sources() if source not in present}
+        with self._lock:
+            db = self._conn()
+            stale = []
+            for source in sources:
+                rows = db.execute("SELECT id FROM points WHERE source IS ? AND run IS NOT ?", (source, self.run))
+                stale.extend(pid for (pid,) in rows)
+            return stale
+
+
+def current_ids(manifest=None):
+    """
+    Ids in the collection, to filter the append-only EmbeddingStore by; None
+    (no filter) when nothing has been synced yet, e.g. a store just migrated
+    from embeddings.jsonl.
+    """
+    manifest = manifest if manifest is not None else CollectionManifest()
+    return manifest.ids() or None
@@ -0,0 +1,338 @@
+"""
+Ingest-side embedding requests: chunks are packed into batches by token
+count, several batches are in flight at once, and a token bucket keeps the
+requests and tokens sent per minute under the account's limits. Every
+response's x-ratelimit-* headers correct the buckets, a 429 pauses them for
+its Retry-After, and failed batches go to a retry queue with backoff (a
+batch the API rejects as invalid is split to isolate the bad chunk).
+Chunks still failing after EMBED_RETRIES are reported back, not written to
+disk; the next sync picks them up because they never reached the store.
+
+    scheduler = EmbedScheduler()
+    for batch, vectors, error in scheduler.embed(pack_batches(items)):
+        ...
+"""
+import re
+import time
+import heapq
+import queue
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.env import setting
+from scripts.chunk_text import count_tokens
+from scripts.clients import get_openai
+
+# Scheduler config: EMBED_WORKERS, EMBED_TPM, EMBED_RPM, EMBED_BATCH_TOKENS and
+# EMBED_RETRIES can be set in the environment
+EMBED_MODEL = "text-embedding-3-large" # VARIABLE
+EMBED_WORKERS = 4 # embedding requests in flight
+EMBED_TPM = 1000000 # tokens per minute; corrected from response headers
+EMBED_RPM = 3000 # requests per minute; corrected from response headers
+EMBED_REQUEST_TOKENS = 300000 # API limit on tokens per request
+EMBED_REQUEST_INPUTS = 2048 # API limit on inputs per request
+# Tokens per packed batch; below the API limit so requests overlap and a retry redoes little
+EMBED_BATCH_TOKENS = 50000
+EMBED_RETRIES = 6 # attempts per batch after the first
+BACKOFF_MAX = 60 # seconds
+
+
+class Batch:
+    """Chunks for one request: (text, data) items and their token total."""
+
+    def __init__(self):
+        self.items = []
+        self.counts = [] # tokens per item
+        self.tokens = 0
+        self.attempts = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, text, data, tokens):
+        self.items.append((text, data))
+        self.counts.append(tokens)
+        self.tokens += tokens
+
+    @property
+    def texts(self):
+        return [text for text, _ in self.items]
+
+    def split(self):
+        halves = [Batch(), Batch()]
+        middle = len(self.items) // 2
+        for i, ((text, data), tokens) in enumerate(zip(self.items, self.counts)):
+            halves[i >= middle].add(text, data, tokens)
+        for half in halves:
+            half.attempts = self.attempts
+        return halves
+
+
+def pack_batches(items, max_tokens=None, max_inputs=EMBED_REQUEST_INPUTS):
+    """Greedily pack (text, data) items into Batches of at most max_tokens / max_inputs, in order."""
+    if max_tokens is None:
+        max_tokens = min(setting("EMBED_BATCH_TOKENS", EMBED_BATCH_TOKENS), EMBED_REQUEST_TOKENS)
+    batch = Batch()
+    for text, data in items:
+        tokens = count_tokens(text)
+        if batch.items and (batch.tokens + tokens > max_tokens or len(batch) >= max_inputs):
+            yield batch
+            batch = Batch()
+        batch.add(text, data, tokens)
+    if batch.items:
+        yield batch
+
+
+def parse_duration(value):
+    """Seconds in an x-ratelimit-reset-* value such as "20ms", "1.5s" or "6m0s"."""
+    if value is None:
+        return None
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(n) * units[unit] for n, unit in parts)
+
+
+def retry_after(headers):
+    """Seconds the API asks us to wait before retrying, if it says."""
+    if headers is None:
+        return None
+    if headers.get("retry-after-ms"):
+        return float(headers["retry-after-ms"]) / 1000
+    if headers.get("retry-after"):
+        try:
+            return float(headers["retry-after"])
+        except ValueError:
+            pass
+    resets = [parse_duration(headers.get(f"x-ratelimit-reset-{kind}")) for kind in ("requests", "tokens")]
+    resets = [r for r in resets if r]
+    return max(resets) if resets else None
+
+
+class RateLimiter:
+    """
+    Token buckets for requests and tokens per minute, refilled continuously.
+    acquire() blocks until both have room; update() adopts the limits and
+    remaining counts the API reports, so the configured figures only matter
+    until the first response (`synced`).
+    """
+
+    def __init__(self, rpm=None, tpm=None):
+        self.limits = {
+            "requests": rpm or setting("EMBED_RPM", EMBED_RPM),
+            "tokens": tpm or setting("EMBED_TPM", EMBED_TPM),
+        }
+        self.level = dict(self.limits) # start full
+        self.paused_until = 0.0
+        self.synced = False
+        self.updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        self.updated = now
+        for kind, limit in self.limits.items():
+            self.level[kind] = min(limit, self.level[kind] + elapsed * limit / 60)
+
+    def acquire(self, tokens, stop=None):
+        want = {"requests": 1, "tokens": tokens}
+        with self._cond:
+            while stop is None or not stop.is_set():
+                now = time.monotonic()
+                self._refill(now)
+                # A batch bigger than the bucket waits for a full bucket, not forever
+                need = {kind: min(n, self.limits[kind]) for kind, n in want.items()}
+                wait = max(
+                    [self.paused_until - now]
+                    + [(need[k] - self.level[k]) * 60 / self.limits[k] for k in need]
+                )
+                if wait <= 0:
+                    for kind, n in want.items():
+                        self.level[kind] -= n
+                    return True
+                self._cond.wait(min(wait, 1.0))
+        return False
+
+    def update(self, headers):
+        """Sync with the x-ratelimit-* headers of a response."""
+        with self._cond:
+            self._refill(time.monotonic())
+            for kind in self.limits:
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if limit and int(limit) > 0:
+                    self.limits[kind] = int(limit)
+                    self.synced = True
+                if remaining is not None:
+                    self.level[kind] = min(self.level[kind], float(remaining))
+            self._cond.notify_all()
+
+    def charge(self, tokens):
+        """Take tokens the API counted beyond our estimate."""
+        with self._cond:
+            self.level["tokens"] -= tokens
+
+    def pause(self, seconds):
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+
+class EmbedScheduler:
+    def __init__(self, workers=None, limiter=None, retries=None, model=EMBED_MODEL):
+        self.workers = workers or setting("EMBED_WORKERS", EMBED_WORKERS)
+        self.limiter = limiter if limiter is not None else RateLimiter()
+        self.retries = retries if retries is not None else setting("EMBED_RETRIES", EMBED_RETRIES)
+        self.model = model
+        self.requests = 0
+        self.retried = 0
+        self.token_ratio = 1.0 # API-counted / locally counted tokens, learned from usage
+        self._lock = threading.Lock() # the counters above are updated from worker threads
+        # Retries are ours; the SDK's own would hide 429s from the limiter
+        self.client = get_openai().with_options(max_retries=0)
+
+    def _request(self, batch, stop):
+        with self._lock:
+            estimate = int(batch.tokens * self.token_ratio)
+        if not self.limiter.acquire(estimate, stop):
+            raise InterruptedError("scheduler stopped")
+        with self._lock:
+            self.requests += 1
+        try:
+            raw = self.client.embeddings.with_raw_response.create(model=self.model, input=batch.texts)
+        except Exception as e:
+            response = getattr(e, "response", None)
+            if response is not None:
+                self.limiter.update(response.headers)
+                if response.status_code == 429:
+                    self.limiter.pause(retry_after(response.headers) or 1.0)
+            raise
+        self.limiter.update(raw.headers)
+        response = raw.parse()
+        if response.usage and batch.tokens:
+            used = response.usage.total_tokens
+            if "x-ratelimit-remaining-tokens" not in raw.headers:
+                self.limiter.charge(used - estimate) # otherwise update() already has the API's count
+            with self._lock:
+                self.token_ratio = 0.8 * self.token_ratio + 0.2 * used / batch.tokens
+        data = sorted(response.data, key=lambda d: d.index)
+        return [d.embedding for d in data]
+
+    def _on_error(self, batch, error, retry, seq):
+        """Queue a failed batch for another attempt; returns it if it should be given up on instead."""
+        status = getattr(error, "status_code", None)
+        if getattr(error, "code", None) == "insufficient_quota":
+            return batch
+        if status is not None and 400 <= status < 500 and status not in (408, 409, 429):
+            if len(batch) == 1:
+                return batch
+            # Bad input: bisect until the offending chunk is alone
+            for half in batch.split():
+                heapq.heappush(retry, (0.0, next(seq), half))
+            return None
+        batch.attempts += 1
+        if batch.attempts > self.retries:
+            return batch
+        delay = retry_after(getattr(getattr(error, "response", None), "headers", None))
+        if delay is None:
+            delay = min(BACKOFF_MAX, 2 ** batch.attempts) * random.uniform(0.5, 1.0)
+        heapq.heappush(retry, (time.monotonic() + delay, next(seq), batch))
+        with self._lock:
+            self.retried += 1
+        return None
+
+    def embed(self, batches):
+        """
+        Embed an iterable of Batches, read lazily, with up to `workers`
+        requests in flight. Yields (batch, vectors, None) as batches finish,
+        in completion order, and (batch, None, error) for ones given up on.
+        """
+        inbox = queue.Queue(self.workers)
+        done = queue.Queue()
+        wake = threading.Event()
+        stop = threading.Event()
+        feed_error = []
+        DONE = object()
+
+        def feed():
+            try:
+                for batch in batches:
+                    while not stop.is_set():
+                        try:
+                            inbox.put(batch, timeout=0.5)
+                            break
+                        except queue.Full:
+                            pass
+                    wake.set()
+                    if stop.is_set():
+                        return
+            except Exception as e:
+                feed_error.append(e)
+            while not stop.is_set():
+                try:
+                    inbox.put(DONE, timeout=0.5)
+                    break
+                except queue.Full:
+                    pass
+            wake.set()
+
+        def finished(future):
+            done.put(future)
+            wake.set()
+
+        seq = iter(range(1 << 62))
+        retry = [] # (not before, seq, batch)
+        running = {}
+        fed = False
+        answered = False # a request has succeeded
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        pool = ThreadPoolExecutor(self.workers)
+        try:
+            while True:
+                wake.clear()
+                while not done.empty():
+                    future = done.get()
+                    batch = running.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        answered = True
+                        yield batch, future.result(), None
+                    elif self._on_error(batch, error, retry, seq) is not None:
+                        yield batch, None, error
+                if feed_error:
+                    raise feed_error[0]
+
+                # Fill free slots: retries that are due first, then new batches.
+                # One request at a time until the API has told us its limits,
+                # or at least answered once (some endpoints send no headers).
+                now = time.monotonic()
+                slots = self.workers if self.limiter.synced or answered else 1
+                while len(running) < slots:
+                    if retry and retry[0][0] <= now:
+                        batch = heapq.heappop(retry)[2]
+                    elif not fed and not inbox.empty():
+                        batch = inbox.get()
+                        if batch is DONE:
+                            fed = True
+                            continue
+                    else:
+                        break
+                    future = pool.submit(self._request, batch, stop)
+                    running[future] = batch
+                    future.add_done_callback(finished)
+
+                if fed and not running and not retry and done.empty():
+                    if feed_error:
+                        raise feed_error[0]
+                    return
+                timeout = max(0.0, retry[0][0] - now) if retry else None
+                wake.wait(timeout)
+        finally:
+            stop.set()
+            pool.shutdown(wait=True, cancel_futures=True)
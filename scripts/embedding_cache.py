@@ -0,0 +1,213 @@
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from pathlib import Path
+from collections import OrderedDict
+
+from scripts.env import setting
+from scripts.metrics import CACHE_LOOKUPS
+from scripts.admission import embed_limiter
+
+# Cache config: EMBED_CACHE_PATH, EMBED_CACHE_SIZE and NEAREST_MIN_OVERLAP can be set in the environment
+EMBED_CACHE_PATH = "cache/query_embeddings.sqlite" # VARIABLE
+EMBED_CACHE_SIZE = 2048 # entries kept in memory
+EMBED_MODEL = "text-embedding-3-large"
+EMBED_BATCH_LIMIT = 2048 # max inputs per embeddings request
+NEAREST_MIN_OVERLAP = 0.5 # word Jaccard for nearest()
+NEAREST_SCAN = 5000 # most recent cached queries considered by nearest()
+
+
+def normalize_query(text: str) -> str:
+    return " ".join((text or "").split()).lower()
+
+
+class EmbeddingCache:
+    """
+    Query-embedding cache: bounded in-process LRU in front of a SQLite table.
+    Entries are keyed by (model, dimensions, normalized text) so changing the
+    embedding model never returns vectors from the old one. A path or size
+    left as None is read from the environment on first use.
+    """
+
+    def __init__(self, path=None, max_items=None):
+        self.path = path
+        self.max_items = max_items
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+    def _conn(self):
+        if self._db is None:
+            self.path = self.path or setting("EMBED_CACHE_PATH", EMBED_CACHE_PATH)
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, model TEXT, dimensions INTEGER,"
+                " text TEXT, vector BLOB, created REAL)"
+            )
+            self._db = db
+        return self._db
+
+    @staticmethod
+    def key(text: str, model: str, dimensions=None) -> str:
+        raw = f"{model}|{dimensions or ''}|{normalize_query(text)}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vec):
+        # Shared between callers: never let one of them normalize it in place
+        vec.flags.writeable = False
+        self._mem[key] = vec
+        self._mem.move_to_end(key)
+        if self.max_items is None:
+            self.max_items = setting("EMBED_CACHE_SIZE", EMBED_CACHE_SIZE)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+
+    def get(self, text: str, model: str = EMBED_MODEL, dimensions=None):
+        key = self.key(text, model, dimensions)
+        with self._lock:
+            vec = self._mem.get(key)
+            if vec is not None:
+                self._mem.move_to_end(key)
+                self.hits_memory += 1
+                CACHE_LOOKUPS.inc(cache="embedding", result="hit")
+                return vec
+
+            try:
+                row = self._conn().execute(
+                    "SELECT vector FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"Embedding cache read failed: {e}")
+                row = None
+
+            if row is None:
+                self.misses += 1
+                CACHE_LOOKUPS.inc(cache="embedding", result="miss")
+                return None
+
+            vec = np.frombuffer(row[0], dtype=np.float32)
+            self._remember(key, vec)
+            self.hits_disk += 1
+            CACHE_LOOKUPS.inc(cache="embedding", result="hit")
+            return vec
+
+    def put(self, text: str, vec, model: str = EMBED_MODEL, dimensions=None):
+        key = self.key(text, model, dimensions)
+        vec = np.array(vec, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vec)
+            try:
+                db = self._conn()
+                db.execute(
+                    "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model, dimensions, normalize_query(text), vec.tobytes(), time.time())
+                )
+                db.commit()
+            except sqlite3.Error as e:
+                print(f"Embedding cache write failed: {e}")
+        return vec
+
+    def nearest(self, text: str, model: str = EMBED_MODEL, dimensions=None, min_overlap=None):
+        """
+        Cached embedding of the recent query with the highest word overlap
+        (Jaccard) with `text`, if it reaches `min_overlap`. A stand-in vector
+        for when the embeddings API cannot answer in time.
+        """
+        if min_overlap is None:
+            min_overlap = setting("NEAREST_MIN_OVERLAP", NEAREST_MIN_OVERLAP)
+        words = set(normalize_query(text).split())
+        if not words:
+            return None
+
+        with self._lock:
+            try:
+                rows = self._conn().execute(
+                    "SELECT key, text FROM embeddings WHERE model = ? AND dimensions IS ?"
+                    " ORDER BY created DESC LIMIT ?", (model, dimensions, NEAREST_SCAN)
+                ).fetchall()
+            except sqlite3.Error as e:
+                print(f"Embedding cache read failed: {e}")
+                return None
+
+            best_key, best = None, min_overlap
+            for key, other in rows:
+                other = set(other.split())
+                overlap = len(words & other) / len(words | other)
+                if overlap > best or (best_key is None and overlap == best):
+                    best_key, best = key, overlap
+            if best_key is None:
+                return None
+
+            vec = self._mem.get(best_key)
+            if vec is None:
+                row = self._conn().execute("SELECT vector FROM embeddings WHERE key = ?", (best_key,)).fetchone()
+                vec = np.frombuffer(row[0], dtype=np.float32)
+            return vec
+
+    def stats(self) -> dict:
+        hits = self.hits_memory + self.hits_disk
+        total = hits + self.misses
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+            "memory_items": len(self._mem),
+        }
+
+
+cache = EmbeddingCache()
+
+
+def get_query_embedding(text: str, client, model: str = EMBED_MODEL, dimensions=None):
+    """Embedding of `text` as float32, from the cache or a single API call on miss."""
+    vec = cache.get(text, model, dimensions)
+    if vec is not None:
+        return vec
+
+    kwargs = {"dimensions": dimensions} if dimensions else {}
+    response = client.embeddings.create(model=model, input=[text], **kwargs)
+    return cache.put(text, response.data[0].embedding, model, dimensions)
+
+
+def get_query_embeddings(texts, client, model: str = EMBED_MODEL, dimensions=None):
+    """Embeddings for many texts: cache hits first, then one request per 2048 misses."""
+    out = [cache.get(t, model, dimensions) for t in texts]
+
+    missing = {}
+    for t, vec in zip(texts, out):
+        if vec is None:
+            missing.setdefault(cache.key(t, model, dimensions), t)
+
+    kwargs = {"dimensions": dimensions} if dimensions else {}
+    fresh = {}
+    pending = list(missing.items())
+    for i in range(0, len(pending), EMBED_BATCH_LIMIT):
+        batch = pending[i:i + EMBED_BATCH_LIMIT]
+        response = client.embeddings.create(model=model, input=[t for _, t in batch], **kwargs)
+        for (key, text), d in zip(batch, sorted(response.data, key=lambda d: d.index)):
+            fresh[key] = cache.put(text, d.embedding, model, dimensions)
+
+    return [vec if vec is not None else fresh[cache.key(t, model, dimensions)] for t, vec in zip(texts, out)]
+
+
+async def aget_query_embedding(text: str, client, model: str = EMBED_MODEL, dimensions=None):
+    """get_query_embedding() for an AsyncOpenAI client; cache reads and writes run in a worker thread."""
+    vec = await asyncio.to_thread(cache.get, text, model, dimensions)
+    if vec is not None:
+        return vec
+
+    # Only misses take an embedding slot
+    kwargs = {"dimensions": dimensions} if dimensions else {}
+    async with embed_limiter.slot():
+        response = await client.embeddings.create(model=model, input=[text], **kwargs)
+    return await asyncio.to_thread(cache.put, text, response.data[0].embedding, model, dimensions)
@@ -0,0 +1,287 @@
+"""
+Chunk embeddings on disk: one appendable float32 matrix (vectors.f32, read
+through a memory map) and two SQLite tables: `vectors` maps a chunk text's
+hash to its row, `points` maps each point id to a row, text and metadata.
+Chunks with the same text (a page repeated across PDFs, or within one) share
+a vector row but keep their own point. Replaces embeddings.jsonl, which kept
+3072 floats per line as JSON text and had to be parsed in full to answer
+"is this chunk embedded already?".
+
+    python -m scripts.embedding_store --migrate embeddings.jsonl
+"""
+import os
+import json
+import uuid
+import sqlite3
+import hashlib
+import argparse
+import threading
+import numpy as np
+from pathlib import Path
+from scripts.env import load_env, setting
+
+# Store config
+EMBED_STORE_DIR = "embedding_store" # VARIABLE; EMBED_STORE_DIR in the environment overrides it
+EMBEDDING_SIZE = 3072 # text-embedding-3-large
+READ_BATCH = 1024 # records per step of iter_batches()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Vector rows and points are only ever appended (a point's metadata is
+    updated in place). A vector row counts once its SQLite entry is
+    committed, which happens after its vector is written, so a crash
+    mid-append leaves at most unreferenced bytes at the end of vectors.f32;
+    the next append overwrites them.
+
+    Chunks deleted from the collection keep their rows (they double as an
+    embedding cache), so the store is a superset of mfs_collection: export
+    or re-upload it through collection_manifest.current_ids().
+    """
+
+    def __init__(self, path=None, dim=EMBEDDING_SIZE):
+        self.path = Path(path or setting("EMBED_STORE_DIR", EMBED_STORE_DIR))
+        self.dim = dim
+        self.row_bytes = dim * 4
+        self._lock = threading.Lock()
+        self._db = None
+
+    @property
+    def vectors_path(self):
+        return self.path / "vectors.f32"
+
+    def _conn(self):
+        if self._db is None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path / "index.sqlite", check_same_thread=False, timeout=5)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS vectors (hash TEXT PRIMARY KEY, row INTEGER UNIQUE)")
+            db.execute("CREATE TABLE IF NOT EXISTS points (id TEXT PRIMARY KEY, row INTEGER, text TEXT, metadata TEXT)")
+            db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            if db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunks'").fetchone():
+                # Older stores keyed everything by text hash: one point per distinct text
+                db.execute("INSERT OR IGNORE INTO vectors SELECT hash, row FROM chunks")
+                db.execute("INSERT OR IGNORE INTO points SELECT id, row, text, metadata FROM chunks ORDER BY row")
+                db.execute("DROP TABLE chunks")
+                db.commit()
+            row = db.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+            if row is None:
+                db.execute("INSERT INTO meta VALUES ('dim', ?)", (str(self.dim),))
+                db.commit()
+            elif int(row[0]) != self.dim:
+                raise ValueError(f"{self.path} holds {row[0]}-dim vectors, not {self.dim}")
+            self._db = db
+        return self._db
+
+    def __len__(self):
+        """Number of points (not of distinct vectors)."""
+        with self._lock:
+            return self._conn().execute("SELECT COUNT(*) FROM points").fetchone()[0]
+
+    def contains(self, text: str) -> bool:
+        """Whether `text` has a vector, under any point id."""
+        with self._lock:
+            return self._conn().execute(
+                "SELECT 1 FROM vectors WHERE hash = ?", (text_hash(text),)
+            ).fetchone() is not None
+
+    @staticmethod
+    def _put_points(db, ids, rows, texts, metadatas):
+        """Insert or update points; returns the positions of ids that were new."""
+        added = [
+            i for i, pid in enumerate(ids)
+            if db.execute("SELECT 1 FROM points WHERE id = ?", (pid,)).fetchone() is None
+        ]
+        db.executemany(
+            "INSERT INTO points VALUES (?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET"
+            " row = excluded.row, text = excluded.text, metadata = excluded.metadata",
+            [(pid, row, text, json.dumps(meta)) for pid, row, text, meta in zip(ids, rows, texts, metadatas)]
+        )
+        return added
+
+    def append(self, texts, embeddings, metadatas, ids=None):
+        """
+        Store chunks and return the ones with a new point id as records
+        ({"id", "text", "embedding", "metadata"}). A text already in the
+        store reuses its vector row instead of writing another.
+        """
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(texts), self.dim)
+        digests = [text_hash(text) for text in texts]
+
+        with self._lock:
+            db = self._conn()
+            rows = db.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+            row_of, new = {}, []
+            for i, digest in enumerate(digests):
+                if digest in row_of:
+                    continue
+                found = db.execute("SELECT row FROM vectors WHERE hash = ?", (digest,)).fetchone()
+                if found is not None:
+                    row_of[digest] = found[0]
+                else:
+                    row_of[digest] = rows + len(new)
+                    new.append(i)
+
+            if new:
+                mode = "r+b" if self.vectors_path.exists() else "wb"
+                with open(self.vectors_path, mode) as f:
+                    f.truncate(rows * self.row_bytes) # drop bytes left by an interrupted append
+                    f.seek(rows * self.row_bytes)
+                    f.write(vectors[new].tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                db.executemany(
+                    "INSERT INTO vectors VALUES (?, ?)",
+                    [(digests[i], row_of[digests[i]]) for i in new]
+                )
+            added = self._put_points(db, ids, [row_of[d] for d in digests], texts, metadatas)
+            db.commit()
+
+        return [
+            {"id": ids[i], "text": texts[i], "embedding": vectors[i], "metadata": metadatas[i]}
+            for i in added
+        ]
+
+    def add_points(self, ids, texts, metadatas):
+        """
+        Record points whose text is already embedded (see lookup()), sharing
+        its vector row. Texts without a vector are skipped; returns how many
+        points were recorded.
+        """
+        with self._lock:
+            db = self._conn()
+            found = [db.execute("SELECT row FROM vectors WHERE hash = ?", (text_hash(t),)).fetchone() for t in texts]
+            keep = [i for i, row in enumerate(found) if row is not None]
+            if keep:
+                self._put_points(
+                    db, [ids[i] for i in keep], [found[i][0] for i in keep],
+                    [texts[i] for i in keep], [metadatas[i] for i in keep]
+                )
+                db.commit()
+        return len(keep)
+
+    def count_missing(self, ids):
+        """How many of `ids` (a set of point ids) have no point in the store."""
+        with self._lock:
+            cursor = self._conn().execute("SELECT id FROM points")
+            found = sum(1 for (pid,) in cursor if pid in ids)
+        return len(ids) - found
+
+    def lookup(self, texts):
+        """Stored vector for each text (a view into the memory map), or None."""
+        with self._lock:
+            db = self._conn()
+            rows = [db.execute("SELECT row FROM vectors WHERE hash = ?", (text_hash(t),)).fetchone() for t in texts]
+        matrix = self.vectors()
+        return [matrix[row[0]] if row is not None else None for row in rows]
+
+    def vectors(self):
+        """Read-only (n, dim) memory map of every committed vector row."""
+        with self._lock:
+            rows = self._conn().execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+        if rows == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+
+    def iter_batches(self, batch_size=READ_BATCH, only=None):
+        """
+        Lists of point records in insertion order; vectors are views into the
+        memory map. With `only` (a set of point ids), other points are skipped.
+        """
+        matrix = self.vectors()
+        with self._lock:
+            cursor = self._conn().execute(
+                "SELECT row, id, text, metadata FROM points WHERE row < ? ORDER BY rowid", (len(matrix),)
+            )
+            rows = cursor.fetchmany(batch_size)
+        while rows:
+            batch = [
+                {"id": pid, "text": text, "embedding": matrix[row], "metadata": json.loads(meta)}
+                for row, pid, text, meta in rows
+                if only is None or pid in only
+            ]
+            if batch:
+                yield batch
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+
+    def read(self, start, count, only=None):
+        """
+        Points [start, start + count) in insertion order as (ids, vectors,
+        payloads), vectors gathered from the memory map. Points are never
+        deleted, so their rowids run from 1 to len(self).
+        """
+        matrix = self.vectors()
+        with self._lock:
+            rows = self._conn().execute(
+                "SELECT id, row, text, metadata FROM points WHERE rowid > ? AND rowid <= ? AND row < ? ORDER BY rowid",
+                (start, start + count, len(matrix))
+            ).fetchall()
+        if only is not None:
+            rows = [r for r in rows if r[0] in only]
+        ids = [pid for pid, _, _, _ in rows]
+        vectors = matrix[[row for _, row, _, _ in rows]]
+        payloads = [{"text": text, **json.loads(meta)} for _, _, text, meta in rows]
+        return ids, vectors, payloads
+
+    def __iter__(self):
+        for batch in self.iter_batches():
+            yield from batch
+
+    def iter_points(self, only=None):
+        """(id, vector, payload) records, as snapshot.write_snapshot() takes them; see iter_batches() for `only`."""
+        for batch in self.iter_batches(only=only):
+            for item in batch:
+                yield item["id"], item["embedding"], {"text": item["text"], **item["metadata"]}
+
+
+def migrate_jsonl(jsonl_path, store=None, batch_size=READ_BATCH):
+    """Copy an embeddings.jsonl into the store, keeping point ids. Safe to re-run."""
+    store = store if store is not None else EmbeddingStore()
+    added = 0
+    batch = []
+
+    def flush():
+        nonlocal added
+        added += len(store.append(
+            [item["text"] for item in batch],
+            [item["embedding"] for item in batch],
+            [item.get("metadata", {}) for item in batch],
+            ids=[item["id"] for item in batch]
+        ))
+        batch.clear()
+
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            item = json.loads(line)
+            if len(item["embedding"]) != store.dim:
+                continue
+            batch.append(item)
+            if len(batch) == batch_size:
+                flush()
+    if batch:
+        flush()
+    print(f"Migrated {added} embeddings from {jsonl_path} into {store.path} ({len(store)} total)")
+    return added
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Binary chunk-embedding store")
+    parser.add_argument("--migrate", metavar="JSONL", help="import an embeddings.jsonl")
+    parser.add_argument("--path", default=setting("EMBED_STORE_DIR", EMBED_STORE_DIR))
+    args = parser.parse_args()
+
+    store = EmbeddingStore(args.path)
+    if args.migrate:
+        migrate_jsonl(args.migrate, store)
+    print(f"{store.path}: {len(store)} points, {len(store.vectors())} distinct vectors")
+
+
+if __name__ == "__main__":
+    load_env()
+    main()
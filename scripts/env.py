@@ -0,0 +1,32 @@
+import os
+
+_loaded = False
+
+
+def load_env():
+    """
+    Read .env into os.environ once per process. Only entry points call this
+    (main.py, scripts/app.py and the __main__ blocks of the CLI modules);
+    library modules read their config through setting() when it is used, so
+    import order does not matter. Only the first call does any work.
+    """
+    global _loaded
+    if not _loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _loaded = True
+
+
+def setting(name, default=None):
+    """
+    os.environ[name] read now, cast to the type of `default` ("1" is True for
+    a bool default); `default` when unset or empty.
+    """
+    value = os.environ.get(name)
+    if not value:
+        return default
+    if isinstance(default, bool):
+        return value == "1"
+    if isinstance(default, (int, float)):
+        return type(default)(value)
+    return value
@@ -0,0 +1,131 @@
+"""
+Run extract_text() over many PDFs in worker processes. Results come back in
+input order. A PDF that crashes its worker (e.g. a segfault in PyMuPDF) or
+runs past the timeout is reported as failed and the worker is replaced, so
+one bad file can neither sink nor hang the run.
+"""
+import os
+import time
+import multiprocessing as mp
+from multiprocessing.connection import wait
+
+from scripts.env import setting
+from scripts.pdf_extraction import extract_text
+
+# Extraction pool config: LOAD_WORKERS and LOAD_TIMEOUT can be set in the environment
+LOAD_WORKERS = 0 # 0 = one per CPU; 1 = in-process, no isolation
+LOAD_TIMEOUT = 600.0 # seconds one PDF may take, OCR included
+LOAD_AHEAD = 4 # PDFs in flight per worker beyond the next one to be returned
+START_METHOD = "forkserver" # workers never fork the caller, which may be running threads; "spawn" where unsupported
+
+
+def _serve(conn):
+    while True:
+        path = conn.recv()
+        if path is None:
+            return
+        try:
+            conn.send((True, extract_text(path)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child = ctx.Pipe()
+        self.proc = ctx.Process(target=_serve, args=(child,), daemon=True)
+        self.proc.start()
+        child.close()
+        self.task = None # (index, started)
+
+    def submit(self, index, path):
+        self.task = (index, time.monotonic())
+        self.conn.send(path)
+
+    def kill(self):
+        self.proc.kill()
+        self.proc.join()
+        self.conn.close()
+
+    def stop(self):
+        if self.task is not None:
+            return self.kill()
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.proc.join(timeout=5)
+        if self.proc.is_alive():
+            self.proc.kill()
+        self.conn.close()
+
+
+def load_workers():
+    return setting("LOAD_WORKERS", LOAD_WORKERS) or os.cpu_count() or 1
+
+
+def extract_many(paths, workers=None, timeout=None):
+    """
+    Yield (path, (text, pages, used_ocr) or None, error or None) for every
+    path, in the order given, while up to `workers` PDFs are extracted at once.
+    """
+    workers = workers or load_workers()
+    timeout = timeout or setting("LOAD_TIMEOUT", LOAD_TIMEOUT)
+    paths = [str(p) for p in paths]
+    if workers <= 1:
+        for path in paths:
+            try:
+                yield path, extract_text(path), None
+            except Exception as e:
+                yield path, None, f"{type(e).__name__}: {e}"
+        return
+
+    ctx = mp.get_context(START_METHOD if START_METHOD in mp.get_all_start_methods() else "spawn")
+    if ctx.get_start_method() == "forkserver":
+        # Imported once in the server, so each (re)started worker comes up ready
+        ctx.set_forkserver_preload(["scripts.pdf_extraction"])
+    pool = [_Worker(ctx) for _ in range(min(workers, len(paths)))]
+    done = {} # index -> (result, error), waiting for earlier paths to finish
+    submitted = returned = 0
+    try:
+        while returned < len(paths):
+            for worker in pool:
+                if worker.task is None and submitted < min(len(paths), returned + len(pool) * LOAD_AHEAD):
+                    worker.submit(submitted, paths[submitted])
+                    submitted += 1
+
+            busy = [w for w in pool if w.task is not None]
+            next_timeout = min(w.task[1] for w in busy) + timeout - time.monotonic()
+            ready = wait([w.conn for w in busy] + [w.proc.sentinel for w in busy], timeout=max(0, next_timeout))
+
+            for i, worker in enumerate(pool):
+                if worker.task is None:
+                    continue
+                index, started = worker.task
+                if worker.conn in ready:
+                    try:
+                        ok, value = worker.conn.recv()
+                        done[index] = (value, None) if ok else (None, value)
+                        worker.task = None
+                        continue
+                    except (EOFError, OSError):
+                        pass # died before it could answer
+
+                if worker.conn in ready or worker.proc.sentinel in ready:
+                    worker.kill()
+                    error = f"worker crashed (exit code {worker.proc.exitcode})"
+                elif time.monotonic() - started >= timeout:
+                    worker.kill()
+                    error = f"timed out after {timeout:.0f}s"
+                else:
+                    continue
+                done[index] = (None, error)
+                pool[i] = _Worker(ctx)
+
+            while returned in done:
+                result, error = done.pop(returned)
+                yield paths[returned], result, error
+                returned += 1
+    finally:
+        for worker in pool:
+            worker.stop()
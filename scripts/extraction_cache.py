@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from scripts.env import setting
+from scripts.metrics import CACHE_LOOKUPS
+from scripts.pdf_extraction import extractor_key
+
+# Cache config
+EXTRACT_CACHE_PATH = "cache/extractions.sqlite" # VARIABLE; EXTRACT_CACHE_PATH in the environment overrides it
+
+
+def file_hash(path, block_size=1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Extracted PDF pages keyed by file content, so an unchanged PDF is never
+    parsed twice. A (path, size, mtime) row says whether a file is still the
+    one that was hashed without reading it; otherwise it is re-hashed, so a
+    renamed or re-downloaded copy is still a hit. Entries only count under
+    the extractor settings they were made with (extractor_key()).
+    """
+
+    def __init__(self, path=None, settings=None):
+        self.path = path or setting("EXTRACT_CACHE_PATH", EXTRACT_CACHE_PATH)
+        self.settings = settings or extractor_key()
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+
+    def _conn(self):
+        if self._db is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                " path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, hash TEXT)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS extractions ("
+                " hash TEXT, settings TEXT, pages BLOB, used_ocr INTEGER, created REAL,"
+                " PRIMARY KEY (hash, settings))"
+            )
+            self._db = db
+        return self._db
+
+    def content_key(self, path) -> str:
+        """Content hash of `path`; only reads the file if its size or mtime changed."""
+        path = str(Path(path).resolve())
+        stat = os.stat(path)
+        with self._lock:
+            row = self._conn().execute(
+                "SELECT size, mtime_ns, hash FROM files WHERE path = ?", (path,)
+            ).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+
+        digest = file_hash(path)
+        with self._lock:
+            db = self._conn()
+            db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (path, stat.st_size, stat.st_mtime_ns, digest))
+            db.commit()
+        return digest
+
+    def contains(self, digest) -> bool:
+        with self._lock:
+            return self._conn().execute(
+                "SELECT 1 FROM extractions WHERE hash = ? AND settings = ?", (digest, self.settings)
+            ).fetchone() is not None
+
+    def get(self, digest):
+        """(text, pages, used_ocr) as extract_text() returned them, or None."""
+        with self._lock:
+            row = self._conn().execute(
+                "SELECT pages, used_ocr FROM extractions WHERE hash = ? AND settings = ?", (digest, self.settings)
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            CACHE_LOOKUPS.inc(cache="extraction", result="miss")
+            return None
+
+        self.hits += 1
+        CACHE_LOOKUPS.inc(cache="extraction", result="hit")
+        pages = json.loads(zlib.decompress(row[0]))
+        return "\n".join(p["text"] for p in pages).strip(), pages, bool(row[1])
+
+    def put(self, digest, pages, used_ocr):
+        blob = zlib.compress(json.dumps(pages).encode("utf-8"))
+        with self._lock:
+            db = self._conn()
+            db.execute(
+                "INSERT OR REPLACE INTO extractions VALUES (?, ?, ?, ?, ?)",
+                (digest, self.settings, blob, int(used_ocr), time.time())
+            )
+            db.commit()
+
+    def prune(self):
+        """Forget files that are gone, and extractions no file or setting uses any more."""
+        with self._lock:
+            db = self._conn()
+            gone = [(p,) for (p,) in db.execute("SELECT path FROM files") if not os.path.exists(p)]
+            db.executemany("DELETE FROM files WHERE path = ?", gone)
+            db.execute(
+                "DELETE FROM extractions WHERE settings != ? OR hash NOT IN (SELECT hash FROM files)",
+                (self.settings,)
+            )
+            db.commit()
+            return len(gone)
@@ -1,157 +1,131 @@
 import os
 import json
-import uuid
-from tenacity import retry, wait_random_exponential, stop_after_attempt
-from qdrant_client import QdrantClient
-from openai import OpenAI
-import numpy
-from scripts.chunk_text import chunk_text, truncate_guard
-from scripts.upload_embeddings import load_saved_embeddings, upload_to_qdrant
-
-from dotenv import load_dotenv
-load_dotenv()
-
-# OpenAI config
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-clientopenai = OpenAI(api_key=OPENAI_API_KEY)
-
-# Qdrant config
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-QDRANT_URL = os.getenv("QDRANT_URL")
-
-# File config
-BATCH_FILE = "embeddings.jsonl" # VARIABLE
-COLLECTION_NAME = "mfs_collection" # VARIABLE
-
-def batch_iterate(seq, batch_size=64):
-    for i in range(0, len(seq), batch_size):
-        yield seq[i:i+batch_size]
-
-@retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(8))
-def embed_batch(batch):
-    response = clientopenai.embeddings.create(
-        model="text-embedding-3-large",
-        input=batch
-    )
-    return [d.embedding for d in response.data]
+from scripts.env import load_env
+from scripts.chunk_text import chunk_text, truncate_guard, CHUNK_MAX_TOKENS, CHUNK_OVERLAP
+from scripts.upload_embeddings import upload_to_qdrant, delete_points
+from scripts.embedding_store import EmbeddingStore
+from scripts.collection_manifest import CollectionManifest, chunk_id
+from scripts.embed_scheduler import EmbedScheduler, pack_batches
+from scripts.embedding_cache import get_query_embedding
+from scripts.clients import get_qdrant, get_openai
 
+COLLECTION_NAME = "mfs_collection" # VARIABLE
 
+def save_embeddings_to_disk(texts, embeddings, metadata_list, store=None):
+    """Append to the embedding store under deterministic point ids; returns the records actually added."""
+    store = store if store is not None else EmbeddingStore()
+    ids = [chunk_id(meta.get("source"), meta.get("chunk_index"), text) for text, meta in zip(texts, metadata_list)]
+    return store.append(texts, embeddings, metadata_list, ids=ids)
 
-def save_embeddings_to_disk(texts, embeddings, metadata_list, path="embeddings.jsonl"):
-    with open(path, "a", encoding="utf-8") as f:
-        for i in range(len(texts)):
-            entry = {
-                "id": str(uuid.uuid4()),
-                "text": texts[i],
-                "embedding": embeddings[i],
-                "metadata": metadata_list[i],
-            }
-            f.write(json.dumps(entry) + "\n")
 
+def chunk_doc(doc):
+    """(chunk text, metadata) pairs for one document, dict or LangChain."""
+    # Accept dict and LangChain doc
+    if isinstance(doc, dict):
+        content = doc.get("page_content") or doc.get("content")
+        meta = doc.get("metadata", {})
+    else:
+        # LangChain doc
+        content = getattr(doc, "page_content", None)
+        meta = getattr(doc, "metadata", {})
+    if not (isinstance(content, str) and content.strip()):
+        print(f"Doc no content: {doc}")
+        return []
 
-def get_embedding(docs):
-    qdrant = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+    chunks = chunk_text(content, max_tokens=CHUNK_MAX_TOKENS, overlap=CHUNK_OVERLAP)
+    return [
+        (chunk, {**meta, "chunk_index": i, "chunk_count": len(chunks)})
+        for i, chunk in enumerate(chunks)
+    ]
+
+
+def get_embedding(docs, pdf_dir=None):
+    """
+    Bring mfs_collection in line with `docs`: embed chunks the store lacks,
+    upsert the ones the collection lacks and delete the documents' chunks
+    that are no longer produced. With pdf_dir, chunks of PDFs that are gone
+    from it are deleted as well.
+    """
+    qdrant = get_qdrant(bulk=True)
+    store = EmbeddingStore()
+    manifest = CollectionManifest()
+    manifest.bootstrap(qdrant, COLLECTION_NAME)
+    manifest.begin()
 
     print("Preparing documents:")
 
-    texts, metadatas = [], []
+    chunks = {}
     for doc in docs:
-        # Accept dict and LangChain doc
-        if isinstance(doc, dict):
-            content = doc.get("page_content") or doc.get("content")
-            meta = doc.get("metadata", {})
-        else:
-            # LangChain doc
-            content = getattr(doc, "page_content", None)
-            meta = getattr(doc, "metadata", {})
-        if isinstance(content, str) and content.strip():
-            chunks = chunk_text(content, max_tokens=400, overlap=100)
-            for i, chunk in enumerate(chunks):
-                texts.append(chunk)
-                metadatas.append({
-                    **meta,
-                    "chunk_index": i,
-                    "chunk_count": len(chunks),
-                })
-        else:
-            print(f"Doc no content: {doc}")
-
-    print(f"Found {len(texts)} text chunks")
-
-    # Load previously saved embeddings
-    saved = load_saved_embeddings()
-    saved_texts = {s["text"] for s in saved}
-
-    # Filter out already-embedded chunks
-    remaining = [(t, m) for t, m in zip(texts, metadatas) if t not in saved_texts]
-
-    if not remaining:
-        print("All chunks already embedded, uploading")
-        upload_to_qdrant(saved, qdrant)
-        return
-
-    print(f"{len(remaining)} new chunks to embed")
-
-    # Separate texts and metadata for processing
-    new_texts, new_metadata = zip(*remaining)
-    batches = list(batch_iterate(new_texts, batch_size=64))
-
-    print(f"Created {len(batches)} safe batches")
-
-    meta_index = 0
-    new_embeddings_added = False
-
-    for i, batch in enumerate(batches, start=1):
-        print(f"Embedding batch: {i}/{len(batches)}")
-
-        safe_batch = []
-        safe_meta = []
-
-        for text, meta in zip(batch, new_metadata[meta_index: meta_index + len(batch)]):
+        for chunk, meta in chunk_doc(doc):
             try:
-                cleaned = truncate_guard(text)
-                safe_batch.append(cleaned)
-                safe_meta.append(meta)
+                cleaned = truncate_guard(chunk)
             except Exception as e:
                 print(f"Skipped problematic chunk: {e}")
-
-        meta_index += len(batch)
-
-        if not safe_batch:
-            print(f"All chunks in batch {i} failed, skipping...")
-            continue
-
-        try:
-            response = embed_batch(safe_batch)
-            embeddings = response.tolist() if isinstance(response, numpy.ndarray) else response
-
-            save_embeddings_to_disk(safe_batch, embeddings, safe_meta)
-            new_embeddings_added = True
-            print(f"Saved {len(safe_batch)} embeddings")
-        except Exception as e:
-            print(f"Batch {i} failed again: {e}")
-            with open("failed_batches.jsonl", "a", encoding="utf-8") as f:
-                for text, meta in zip(safe_batch, safe_meta):
-                    f.write(json.dumps({"text": text, "metadata": meta}) + "\n")
-            continue
-
-    print("Uploading all saved embeddings to Qdrant")
-    if new_embeddings_added:
-        saved = load_saved_embeddings()
-    upload_to_qdrant(saved, qdrant)
+                continue
+            chunks[chunk_id(meta.get("source"), meta["chunk_index"], cleaned)] = (cleaned, meta)
+
+    print(f"Found {len(chunks)} text chunks")
+
+    new_ids = manifest.mark(chunks)
+    stale = manifest.stale({meta.get("source") for _, meta in chunks.values()}, pdf_dir)
+    print(f"{len(new_ids)} new or changed, {len(chunks) - len(new_ids)} unchanged, {len(stale)} stale")
+
+    # Only chunks the store has never seen need an embedding request
+    remaining = [pid for pid in new_ids if not store.contains(chunks[pid][0])]
+    if remaining:
+        print(f"{len(remaining)} new chunks to embed")
+        scheduler = EmbedScheduler()
+        failed = 0
+        for batch, vectors, error in scheduler.embed(pack_batches((chunks[pid][0], pid) for pid in remaining)):
+            ids = [pid for _, pid in batch.items]
+            if error is not None:
+                print(f"Gave up on {len(batch)} chunks: {error}")
+                failed += len(batch)
+                continue
+            store.append(batch.texts, vectors, [chunks[pid][1] for pid in ids], ids=ids)
+            print(f"Saved {len(batch)} embeddings ({batch.tokens} tokens)")
+        print(f"{scheduler.requests} embedding requests, {scheduler.retried} retried"
+              + (f", {failed} chunks left for the next run" if failed else ""))
+
+    # Already embedded, possibly under another point id: record the point against that vector
+    embedded = set(remaining)
+    reused = [pid for pid in new_ids if pid not in embedded]
+    if reused:
+        store.add_points(reused, [chunks[pid][0] for pid in reused], [chunks[pid][1] for pid in reused])
+
+    # Upload the delta; chunks whose batch failed are picked up by the next run
+    vectors = store.lookup([chunks[pid][0] for pid in new_ids])
+    records = [
+        {"id": pid, "text": chunks[pid][0], "embedding": vec, "metadata": chunks[pid][1]}
+        for pid, vec in zip(new_ids, vectors) if vec is not None
+    ]
+    if records:
+        upload_to_qdrant(records, qdrant, manifest=manifest)
+    if stale:
+        delete_points(stale, qdrant, manifest=manifest)
 
     print("Embedding pipeline complete.")
 
 
 
 def embed_query(text: str):
-    response = clientopenai.embeddings.create(
-        input=[text],
-        model="text-embedding-3-large"
-    )
-    return response.data[0].embedding
-
-def load_cached_docs(path="./cache/pdf_cache.json"):
+    # Shares the query-embedding cache with retrievers.retrieve()
+    return get_query_embedding(text, get_openai(), model="text-embedding-3-large").tolist()
+
+def load_cached_docs(pdf_dir="data/", legacy_path="./cache/pdf_cache.json"):
+    """
+    Documents for the PDFs under pdf_dir that are already in the extraction
+    cache (scripts/extraction_cache.py); nothing is parsed. Falls back to the
+    old pdf_cache.json while the extraction cache is still empty.
+    """
+    from scripts.load_pdfs import load_pdfs
+
+    docs = load_pdfs(pdf_dir, extract=False) if os.path.isdir(pdf_dir) else []
+    if docs or not os.path.exists(legacy_path):
+        return docs
+    return load_json_docs(legacy_path)
+
+def load_json_docs(path="./cache/pdf_cache.json"):
     """Load documents from pdf_cache.json in either list or dict format."""
 
     if not os.path.exists(path):
@@ -197,47 +171,53 @@ def load_cached_docs(path="./cache/pdf_cache.json"):
     return docs
 
 def retry_failed_chunks(path="failed_batches.jsonl"):
+    """Embed and upload the chunks listed in a failed_batches.jsonl left by older versions."""
     if not os.path.exists(path):
         print("No failed batch file found.")
         return
 
-    qdrant = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+    qdrant = get_qdrant(bulk=True)
 
     with open(path, "r", encoding="utf-8") as f:
         data = [json.loads(line) for line in f]
 
-    texts = [truncate_guard(item["text"]) for item in data]
-    metas = [item["metadata"] for item in data]
+    items = [(truncate_guard(item["text"]), item["metadata"]) for item in data]
+    print(f"Retrying {len(items)} failed chunks")
 
-    batches = list(batch_iterate(texts, batch_size=64))
-    print(f"Retrying {len(data)} failed chunks in {len(batches)} batches")
-
-    for i, batch in enumerate(batches, start=1):
-        try:
-            response = embed_batch(batch)
-            embeddings = response.tolist() if isinstance(response, numpy.ndarray) else response
-            save_embeddings_to_disk(batch, embeddings, metas[(i-1)*64:i*64])
-            print(f"Saved batch {i}")
-        except Exception as e:
-            print(f"Retry failed for batch {i}: {e}")
+    entries, still_failed = [], []
+    for batch, vectors, error in EmbedScheduler().embed(pack_batches(items)):
+        if error is not None:
+            print(f"Retry failed for {len(batch)} chunks: {error}")
+            still_failed.extend(batch.items)
             continue
+        entries.extend(save_embeddings_to_disk(batch.texts, vectors, [meta for _, meta in batch.items]))
+        print(f"Saved {len(batch)} embeddings")
+
+    # Keep only what still fails
+    if still_failed:
+        with open(path, "w", encoding="utf-8") as f:
+            for text, meta in still_failed:
+                f.write(json.dumps({"text": text, "metadata": meta}) + "\n")
+    else:
+        os.remove(path)
 
-    print("Re-uploading all saved embeddings to Qdrant")
-    saved = load_saved_embeddings()
-    upload_to_qdrant(saved, qdrant)
+    print(f"Uploading {len(entries)} recovered embeddings to Qdrant")
+    upload_to_qdrant(entries, qdrant)
 
 
 def main():
     print("Loading documents")
-    docs = load_cached_docs() # VARIABLE
+    pdf_dir = "data/" # VARIABLE
+    docs = load_cached_docs(pdf_dir)
 
     if not docs:
         print("No valid documents")
         return
 
     print(f"{len(docs)} documents loaded, embedding")
-    get_embedding(docs)
+    get_embedding(docs, pdf_dir if os.path.isdir(pdf_dir) else None)
 
 
 if __name__ == "__main__":
+    load_env()
     main()
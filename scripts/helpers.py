@@ -1,6 +1,9 @@
 import re
+import json
 import calendar
 
+from scripts.metrics import timed
+
 MISSING_DATES_LOG = "missing_dates.txt"
 UNKNOWN_TOKENS_LOG = "unknown_tokens.txt"
 
@@ -268,6 +271,7 @@ def enrich_metadata_from_filename(docs):
         metadata.update(semantic_info)
         doc.metadata = metadata
 
+@timed("extract_filters")
 def extract_filters(query: str):
     """
     Parse a natural-language query and convert it into Qdrant metadata filters.
@@ -341,3 +345,8 @@ def extract_filters(query: str):
         filters["year"] = int(sem_year_match.group(2))
 
     return filters
+
+
+def filter_key(filters) -> str:
+    """Canonical string for an extract_filters() result, for grouping and caching."""
+    return json.dumps(filters or {}, sort_keys=True, default=str)
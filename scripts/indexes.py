@@ -1,21 +1,36 @@
-import os
-from dotenv import load_dotenv
-from qdrant_client import QdrantClient
+from scripts.env import load_env
+from scripts.clients import get_qdrant
 
-load_dotenv()
-
-QDRANT_URL = os.getenv("QDRANT_URL")
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 COLLECTION = "mfs_collection" # VARIABLE
 
-qdrant = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+# Payload field -> index schema
+PAYLOAD_INDEXES = {
+    # Main
+    "file_type": "keyword",
+    "year": "integer",
+    "committee_codes": "keyword",
+    "body_code": "keyword",
+    "source": "keyword", # full-document fetch in ann retrieval
+
+    # Date
+    "full_date": "keyword",
+    "semester": "keyword",
+    "month": "keyword",
+
+    # Extra
+    "stance": "keyword",
+    "topic": "keyword",
+    "meta": "keyword",
+    "status": "keyword",
+    "action_type": "keyword",
+}
 
 
 def ensure_index(field_name: str, schema_type: str):
     """If missing index, create. Skip if exit."""
     try:
         print(f"Creating index: {field_name}")
-        qdrant.create_payload_index(
+        get_qdrant().create_payload_index(
             collection_name=COLLECTION,
             field_name=field_name,
             field_schema=schema_type,   # STRING, NOT DICT
@@ -30,28 +45,13 @@ def ensure_index(field_name: str, schema_type: str):
 
 
 if __name__ == "__main__":
+    load_env()
     print(f"\nConnecting to collection: {COLLECTION}\n")
 
-    # Main
-    ensure_index("file_type", "keyword")
-    ensure_index("year", "integer")
-    ensure_index("committee_codes", "keyword")
-    ensure_index("body_code", "keyword")
-
-    # Date
-    ensure_index("full_date", "keyword")
-    ensure_index("year", "integer")
-    ensure_index("semester", "keyword")
-    ensure_index("month", "keyword")
-
-    # Extra
-    ensure_index("stance", "keyword")
-    ensure_index("topic", "keyword")
-    ensure_index("meta", "keyword")
-    ensure_index("status", "keyword")
-    ensure_index("action_type", "keyword")
+    for field_name, schema_type in PAYLOAD_INDEXES.items():
+        ensure_index(field_name, schema_type)
     print("\nDone.\n")
 
     print("Current payload schema:\n")
-    info = qdrant.get_collection(COLLECTION)
+    info = get_qdrant().get_collection(COLLECTION)
     print(info.payload_schema)
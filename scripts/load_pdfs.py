@@ -1,53 +1,124 @@
 from pathlib import Path
 from tqdm import tqdm
+import time
 import datetime
-from langchain_core.documents import Document
+from functools import lru_cache
 from scripts.helpers import enrich_metadata_from_filename
-from scripts.pdf_extraction import extract_text
+from scripts.extract_pool import extract_many, load_workers
+from scripts.extraction_cache import ExtractionCache
+from scripts.pdf_extraction import ocr_available, retry_ocr
 import json
 
 GDRIVE_MAP_PATH = "scripts/gdrive_map.json" # VARIABLE
 
-if Path(GDRIVE_MAP_PATH).exists():
-    with open(GDRIVE_MAP_PATH) as f:
-        gdrive_map = json.load(f)
-else:
-    gdrive_map = {}
+@lru_cache(maxsize=1)
+def load_gdrive_map():
+    if Path(GDRIVE_MAP_PATH).exists():
+        with open(GDRIVE_MAP_PATH) as f:
+            return json.load(f)
+    return {}
 
 def get_drive_link(filename):
-    file_id = gdrive_map.get(filename)
+    file_id = load_gdrive_map().get(filename)
     if file_id:
         return f"https://drive.google.com/file/d/{file_id}/view"
     return None
     
-def load_pdfs(pdf_dir="data/"):
+def extract_cached(pdf_paths, workers=None, cache=None, extract=True):
+    """
+    extract_many() with the extraction cache in front: yields (path, result,
+    error) for every path in order, reading unchanged PDFs from the cache and
+    extracting (and caching) only the rest. extract=False skips the rest.
+    Results with pages whose OCR failed are cached too; once Tesseract is
+    available, only those pages are OCR'd again and the entry updated.
+    """
+    cache = cache or ExtractionCache()
+    keys = []
+    for path in pdf_paths:
+        try:
+            keys.append(cache.content_key(path))
+        except OSError:
+            keys.append(None) # unreadable: let extract_text() report it
+    missing = [path for path, key in zip(pdf_paths, keys) if key is None or not cache.contains(key)]
+    print(f"{len(pdf_paths) - len(missing)} PDFs cached, {len(missing)} to extract")
+
+    extracted = extract_many(missing, workers) if extract and missing else iter(())
+    missing = set(missing)
+    can_ocr = None # checked on the first cached OCR failure
+    for path, key in zip(pdf_paths, keys):
+        if path not in missing:
+            result = cache.get(key)
+            if extract and result is not None and any(p.get("ocr_failed") for p in result[1]):
+                if can_ocr is None:
+                    can_ocr = ocr_available()
+                if can_ocr:
+                    result = retry_ocr(path, result[1])
+                    cache.put(key, result[1], result[2])
+            yield str(path), result, None
+            continue
+        if not extract:
+            continue
+        path, result, error = next(extracted)
+        if result is not None and key is not None:
+            cache.put(key, result[1], result[2])
+        yield path, result, error
+
+    if extract and missing:
+        cache.prune()
+
+def make_document(path, text):
+    """LangChain Document for one extracted PDF with source, link and filename metadata, or None if empty."""
+    from langchain_core.documents import Document
+
+    content = text.strip()
+    if not content:
+        return None
+    path = Path(path)
+    filename = path.name
+    mod_time = datetime.datetime.fromtimestamp(path.stat().st_mtime).isoformat()
+    metadata = {
+        "source": filename,
+        "link": get_drive_link(filename),
+        "modified": mod_time
+    }
+    doc = Document(
+        page_content=content,
+        metadata=metadata
+    )
+    enrich_metadata_from_filename([doc])
+    return doc
+
+def load_pdfs(pdf_dir="data/", workers=None, extract=True):
+    """Documents for every PDF under pdf_dir. extract=False returns only the ones already in the extraction cache."""
+    workers = workers or load_workers()
     pdf_dir = Path(pdf_dir)
     pdf_paths = sorted(pdf_dir.rglob("*.pdf"))
-    print(f"Scanning {len(pdf_paths)} PDFs in {pdf_dir.resolve()}")
+    print(f"Scanning {len(pdf_paths)} PDFs in {pdf_dir.resolve()} ({workers} workers)")
 
     docs = []
-    for path in tqdm(pdf_paths, desc="Loading PDFs", unit="file"):
+    page_count = 0
+    start = time.perf_counter()
+    progress = tqdm(extract_cached(pdf_paths, workers, extract=extract), total=len(pdf_paths), desc="Loading PDFs", unit="file")
+    for path, result, error in progress:
+        path = Path(path)
+        if error:
+            print(f"Skipped {path.name}: {error}")
+            continue
+
+        text, pages, used_ocr = result
+        page_count += len(pages)
+        progress.set_postfix(pages_per_s=f"{page_count / (time.perf_counter() - start):.1f}")
         try:
-            text, pages, used_ocr = extract_text(str(path))
-            content = text.strip()
-            if content:
-                filename = path.name
-                mod_time = datetime.datetime.fromtimestamp(path.stat().st_mtime).isoformat()
-                metadata = {
-                    "source": filename,
-                    "link": get_drive_link(filename),
-                    "modified": mod_time
-                }
-                doc = Document(
-                    page_content=content,
-                    metadata=metadata
-                )
+            doc = make_document(path, text)
+            if doc is not None:
                 docs.append(doc)
             else:
                 print(f"Skipped {path.name} (empty)")
         except Exception as e:
             print(f"Skipped {path.name}: {e}")
 
-    enrich_metadata_from_filename(docs)
+    elapsed = time.perf_counter() - start
+    print(f"Extracted {page_count} pages in {elapsed:.1f}s ({page_count / max(elapsed, 1e-9):.1f} pages/s)")
+
     print(f"Added 'year' metadata to {len(docs)} documents.")
     return docs
@@ -0,0 +1,149 @@
+"""
+Minimal in-process metrics with Prometheus text exposition. No dependency:
+a counter increment or histogram observation is one lock and a bisect.
+
+    from scripts.metrics import STAGE_SECONDS, timed, render
+
+    @timed("embed")
+    def embed_text(query): ...
+
+    @app.get("/metrics")
+    def metrics(): return PlainTextResponse(render(), media_type=CONTENT_TYPE)
+"""
+import time
+import bisect
+import inspect
+import threading
+import functools
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _fmt(v) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.label_names, key)} {_fmt(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {} # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for key, series in sorted(self._series.items()):
+            names = self.label_names + ("le",)
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                yield f"{self.name}_bucket{_labels(names, key + (bound,))} {cumulative}"
+            yield f"{self.name}_bucket{_labels(names, key + ('+Inf',))} {series[-1]}"
+            yield f"{self.name}_sum{_labels(self.label_names, key)} {_fmt(series[-2])}"
+            yield f"{self.name}_count{_labels(self.label_names, key)} {series[-1]}"
+
+
+def render() -> str:
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+
+def timed(stage: str):
+    """Decorator: observe the wrapped call's wall time in STAGE_SECONDS{stage=`stage`}."""
+    def wrap(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_inner(*args, **kwargs):
+                with STAGE_SECONDS.time(stage=stage):
+                    return await fn(*args, **kwargs)
+            return async_inner
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with STAGE_SECONDS.time(stage=stage):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+# Query pipeline
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Wall time per query pipeline stage", ["stage"])
+REQUEST_SECONDS = Histogram("rag_request_seconds", "End-to-end request latency", ["endpoint"])
+CANDIDATES_SCANNED = Counter("rag_candidates_scanned_total", "Chunks scored by the hybrid ranker")
+CHUNKS_RETURNED = Counter("rag_chunks_returned_total", "Chunks returned by retrieval")
+CONTEXT_TOKENS = Counter("rag_context_tokens_total", "Tokens placed in prompt context")
+LLM_TOKENS = Counter("rag_llm_tokens_total", "Tokens reported by the chat completion API", ["kind"])
+CACHE_LOOKUPS = Counter("rag_cache_lookups_total", "Cache lookups by cache and result", ["cache", "result"])
+COALESCED = Counter("rag_coalesced_requests_total", "Requests served by an identical in-flight request")
+DEGRADED = Counter("rag_degraded_total", "Retrievals answered in a degraded mode", ["reason"])
+
+# Admission control
+ADMISSION_QUEUE = Gauge("rag_admission_queue_depth", "Requests waiting for a slot", ["limiter"])
+ADMISSION_IN_FLIGHT = Gauge("rag_admission_in_flight", "Slots currently held", ["limiter"])
+ADMISSION_WAIT = Histogram("rag_admission_wait_seconds", "Time spent waiting for a slot", ["limiter"])
+ADMISSION_REJECTED = Counter("rag_admission_rejected_total", "Requests rejected by admission control", ["limiter", "reason"])
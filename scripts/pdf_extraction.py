@@ -1,58 +1,145 @@
-import fitz
 import logging
 from pathlib import Path
-
-import pytesseract
-from pdf2image import convert_from_path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from scripts.env import setting
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
 log = logging.getLogger("pdf_ocr_mvp")
 
+# OCR config: OCR_DPI and OCR_WORKERS can be set in the environment
+OCR_DPI = 300
+OCR_WORKERS = 2 # tesseract processes per PDF
+OCR_MIN_CHARS = 16 # pages with less embedded text than this (blank, or just a page number) are OCR'd
+EXTRACTOR_VERSION = 2 # bump when extract_text() output changes, to invalidate cached extractions
+
+
+def extractor_key():
+    """Everything that changes what extract_text() returns for the same file."""
+    return f"v{EXTRACTOR_VERSION}|dpi={setting('OCR_DPI', OCR_DPI)}|min_chars={OCR_MIN_CHARS}"
+
+
 def extract_pdf_pages(pdf_path):
-    """Return [{'page': n, 'text': str}] using PyMuPDF only."""
+    """Return [{'page': n, 'text': str, 'images': bool}] using PyMuPDF only (no OCR); images: the page has raster images."""
+    import fitz
+
     pages = []
-    doc = fitz.open(str(pdf_path))
-    for i, page in enumerate(doc):
-        text = page.get_text("text") or ""
-
-        if not text.strip():
-            blocks = page.get_text("blocks") or []
-            block_text = "\n".join(b[4] for b in blocks if b[4].strip())
-            if len(block_text) > len(text):
-                text = block_text
-
-        if len(text.strip()) < 32:
-            words = page.get_text("words") or []
-            word_text = " ".join(w[4] for w in words if w[4].strip())
-            if len(word_text) > len(text):
-                text = word_text
-
-        pages.append({"page": i + 1, "text": text})
-    doc.close()
+    with fitz.open(str(pdf_path)) as doc:
+        for i, page in enumerate(doc):
+            # Parse the page once; the fallbacks below re-read the same text page
+            textpage = page.get_textpage()
+            text = page.get_text("text", textpage=textpage) or ""
+
+            if not text.strip():
+                blocks = page.get_text("blocks", textpage=textpage) or []
+                block_text = "\n".join(b[4] for b in blocks if b[4].strip())
+                if len(block_text) > len(text):
+                    text = block_text
+
+            if len(text.strip()) < 32:
+                words = page.get_text("words", textpage=textpage) or []
+                word_text = " ".join(w[4] for w in words if w[4].strip())
+                if len(word_text) > len(text):
+                    text = word_text
+
+            pages.append({"page": i + 1, "text": text, "images": bool(page.get_images())})
     return pages
 
 
-def ocr_fallback(pdf_path, dpi=300):
-    """Use Tesseract OCR on scanned PDFs converted to images."""
-    try:
-        images = convert_from_path(pdf_path, dpi=dpi)
-    except Exception as e:
-        log.error(f"Image conversion failed: {e}")
-        return ""
+def ocr_pages(pdf_path, page_numbers, dpi=None, workers=None):
+    """
+    {page: OCR text, or None if OCR failed} for the given 1-based page numbers. Pages are rendered
+    one at a time and read by Tesseract in a thread pool; at most 2 * workers
+    rendered pages are held at once, however long the document is.
+    """
+    import fitz
+    import pytesseract
+    from PIL import Image
 
-    pages = []
-    for i, image in enumerate(images):
+    dpi = dpi or setting("OCR_DPI", OCR_DPI)
+    workers = workers or setting("OCR_WORKERS", OCR_WORKERS)
+
+    def read(number, image):
         try:
-            text = pytesseract.image_to_string(image)
+            return pytesseract.image_to_string(image)
         except Exception as e:
-            log.warning(f"OCR failed on page {i+1}: {e}")
-            text = ""
-        pages.append({"page": i + 1, "text": text})
-    return pages
+            log.warning(f"OCR failed on page {number}: {e}")
+            return None
+
+    texts = {}
+    pending = deque()
+    with fitz.open(str(pdf_path)) as doc, ThreadPoolExecutor(workers) as pool:
+        for number in page_numbers:
+            if len(pending) >= 2 * workers:
+                done, future = pending.popleft()
+                texts[done] = future.result()
+            try:
+                # Grayscale is all Tesseract needs and a third of the memory of RGB
+                pix = doc[number - 1].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+                image = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+            except Exception as e:
+                log.warning(f"Rendering failed on page {number}: {e}")
+                texts[number] = None
+                continue
+            pending.append((number, pool.submit(read, number, image)))
+        for number, future in pending:
+            texts[number] = future.result()
+    return texts
 
 
-def extract_text(pdf_path, min_chars_for_ocr=200):
-    """Extract text, fallback to OCR."""
+def ocr_available():
+    """Whether Tesseract can run here (pytesseract installed and its binary found)."""
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def apply_ocr(pdf_path, pages, page_numbers, needs_ocr=()):
+    """
+    OCR the given pages in place, keeping OCR text where it is longer than
+    the embedded text. A page whose OCR fails is marked ocr_failed only if
+    its number is in `needs_ocr`; any other keeps its embedded text.
+    """
+    try:
+        texts = ocr_pages(pdf_path, page_numbers)
+    except Exception as e:
+        log.error(f"OCR failed: {pdf_path} : {e}")
+        texts = dict.fromkeys(page_numbers)
+    for p in pages:
+        if p["page"] not in texts:
+            continue
+        text = texts[p["page"]]
+        if text is None:
+            if p["page"] in needs_ocr:
+                p["ocr_failed"] = True # e.g. tesseract missing; see retry_ocr()
+            continue
+        p.pop("ocr_failed", None)
+        if len(text.strip()) > len(p["text"].strip()):
+            p["text"] = text
+            p["ocr"] = True
+
+
+def retry_ocr(pdf_path, pages):
+    """OCR again just the pages marked ocr_failed; returns (text, pages, used_ocr) like extract_text()."""
+    failed = [p["page"] for p in pages if p.get("ocr_failed")]
+    if failed:
+        log.info(f"Retrying OCR on {len(failed)} pages: {pdf_path}")
+        apply_ocr(pdf_path, pages, failed, set(failed))
+    return _result(pages)
+
+
+def _result(pages):
+    for p in pages:
+        p.setdefault("ocr", False)
+    all_text = "\n".join(p["text"] for p in pages).strip()
+    return all_text, pages, any(p["ocr"] for p in pages)
+
+
+def extract_text(pdf_path, min_chars_for_ocr=OCR_MIN_CHARS):
+    """Extract text per page; OCR only the pages without embedded text."""
     pdf_file = Path(pdf_path)
     if not pdf_file.is_file() or pdf_file.stat().st_size == 0:
         log.warning(f"Skipping empty or invalid file: {pdf_path}")
@@ -64,12 +151,13 @@ def extract_text(pdf_path, min_chars_for_ocr=200):
         log.warning(f"Failed to extract text : {pdf_path} : {e}")
         return "", [], False
 
-    all_text = "\n".join(p["text"] for p in pages).strip()
-
-    if len(all_text) >= min_chars_for_ocr:
-        return all_text, pages, False
+    scanned = [p["page"] for p in pages if len(p["text"].strip()) < min_chars_for_ocr]
+    if scanned:
+        log.info(f"OCR {len(scanned)}/{len(pages)} pages: {pdf_path}")
+        # Only a page with images and no text needed OCR; blank ones keep their result if it fails
+        needs_ocr = {p["page"] for p in pages if p["images"] and not p["text"].strip()}
+        apply_ocr(pdf_path, pages, scanned, needs_ocr)
 
-    log.info(f"OCR fallback: {pdf_path} (had {len(all_text)} chars)")
-    pages = ocr_fallback(pdf_path)
-    all_text = "\n".join(p["text"] for p in pages).strip()
-    return all_text, pages, True if all_text else False
+    for p in pages:
+        del p["images"]
+    return _result(pages)
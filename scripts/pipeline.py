@@ -1,9 +1,23 @@
+import argparse
+from scripts.env import load_env
 from scripts.load_pdfs import load_pdfs
 from scripts.get_embedding import get_embedding
 
-docs = load_pdfs("data/") # VARIABLE
-print(f"Loaded {len(docs)} documents")
-for doc in docs[:100]:
-    print(f"{doc.metadata.get('source')} > {doc.metadata}")
-get_embedding(docs)
-print("Pipeline complete")
+# Guarded: extraction workers re-import this module on spawn platforms
+if __name__ == "__main__":
+    load_env()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf-dir", default="data/") # VARIABLE
+    parser.add_argument("--stream", action="store_true", help="extract, chunk, embed and upsert concurrently")
+    args = parser.parse_args()
+
+    if args.stream:
+        from scripts.stream_pipeline import StreamPipeline
+        StreamPipeline(args.pdf_dir).run()
+    else:
+        docs = load_pdfs(args.pdf_dir)
+        print(f"Loaded {len(docs)} documents")
+        for doc in docs[:100]:
+            print(f"{doc.metadata.get('source')} > {doc.metadata}")
+        get_embedding(docs, args.pdf_dir)
+    print("Pipeline complete")
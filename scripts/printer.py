@@ -1,6 +1,6 @@
 import json
 
-def format_answer_with_sources_json(answer: str, docs, preview=150):
+def format_sources(docs, preview=150):
     seen = set()
     sources = []
 
@@ -43,6 +43,11 @@ def format_answer_with_sources_json(answer: str, docs, preview=150):
 
         sources.append(source_entry)
 
+    return sources
+
+def format_answer_with_sources_json(answer: str, docs, preview=150):
+    sources = format_sources(docs, preview)
+
     result = {
         "answer": answer.strip(),
         "sources": sources
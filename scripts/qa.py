@@ -1,11 +1,9 @@
-import os
-from dotenv import load_dotenv
-from openai import OpenAI
+from scripts.env import setting
+from scripts.clients import get_openai, get_async_openai
+from scripts.metrics import timed, STAGE_SECONDS, LLM_TOKENS
+from scripts.admission import llm_limiter
 
-load_dotenv()
-
-MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini") # default
-client = OpenAI()
+MODEL = "gpt-4o-mini" # default; OPENAI_MODEL in the environment overrides it
 
 RAG_PROMPT_TEMPLATE = """You are an expert assistant analyzing documents from the Mānoa Faculty Senate.
 
@@ -23,7 +21,13 @@ Question: {question}
 Answer:
 """
 
-def answer_question(context: str, question: str, model: str = MODEL, verbose: bool = False) -> str:
+def record_usage(usage):
+    if usage is not None:
+        LLM_TOKENS.inc(usage.prompt_tokens, kind="prompt")
+        LLM_TOKENS.inc(usage.completion_tokens, kind="completion")
+
+
+def build_messages(context: str, question: str, verbose: bool = False):
     prompt = RAG_PROMPT_TEMPLATE.format(
         context=context.strip(),
         question=question.strip()
@@ -32,12 +36,49 @@ def answer_question(context: str, question: str, model: str = MODEL, verbose: bo
     if verbose:
         print("Prompt:\n", prompt)
 
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": "You answer only using the provided context."},
-            {"role": "user", "content": prompt}
-        ]
+    return [
+        {"role": "system", "content": "You answer only using the provided context."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+@timed("llm")
+def answer_question(context: str, question: str, model: str = None, verbose: bool = False) -> str:
+    response = get_openai().chat.completions.create(
+        model=model or setting("OPENAI_MODEL", MODEL),
+        messages=build_messages(context, question, verbose)
     )
 
+    record_usage(response.usage)
+    return response.choices[0].message.content.strip()
+
+
+@timed("llm")
+async def aanswer_question(context: str, question: str, model: str = None, verbose: bool = False) -> str:
+    async with llm_limiter.slot():
+        response = await get_async_openai().chat.completions.create(
+            model=model or setting("OPENAI_MODEL", MODEL),
+            messages=build_messages(context, question, verbose)
+        )
+
+    record_usage(response.usage)
     return response.choices[0].message.content.strip()
+
+
+async def astream_answer(context: str, question: str, model: str = None, verbose: bool = False):
+    """Yield answer text deltas as the streaming completion produces them."""
+    # The slot is held until the last token
+    async with llm_limiter.slot():
+        with STAGE_SECONDS.time(stage="llm_stream"):
+            stream = await get_async_openai().chat.completions.create(
+                model=model or setting("OPENAI_MODEL", MODEL),
+                messages=build_messages(context, question, verbose),
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+
+            async for chunk in stream:
+                # The final chunk carries usage and no choices
+                record_usage(getattr(chunk, "usage", None))
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
@@ -1,107 +1,96 @@
-import os
-import re
+from __future__ import annotations
+
+import time
+import asyncio
 import numpy as np
-from typing import List, Dict, Optional, Union
+from typing import TYPE_CHECKING, List, Dict, Optional, Union
 from collections import defaultdict
-from dotenv import load_dotenv
-
-from qdrant_client import QdrantClient
-from qdrant_client.models import (
-    Filter, FieldCondition, MatchValue, ScoredPoint
-)
-
-from openai import OpenAI
 
-
-load_dotenv()
-
-# Qdrant config
+if TYPE_CHECKING:
+    # qdrant_client.models costs ~1s to import; it is pulled in on first Qdrant query
+    from qdrant_client.models import Filter, ScoredPoint
+
+from scripts.bm25_index import load_index, bm25_text, toks, payload_doc_key
+from scripts.embedding_cache import get_query_embedding, get_query_embeddings, aget_query_embedding, cache as embedding_cache
+from scripts.vector_ops import minmax, pack_vectors, top_k, unit, unit_rows
+from scripts.chunk_text import count_tokens, CHUNK_OVERLAP
+from scripts.helpers import filter_key
+from scripts.metrics import timed, CANDIDATES_SCANNED, CHUNKS_RETURNED, CONTEXT_TOKENS, DEGRADED
+from scripts.admission import time_left
+from scripts.env import setting
+from scripts.clients import get_qdrant, get_async_qdrant, get_openai, get_async_openai
+
+# Qdrant config (clients come from scripts/clients.py)
 COLLECTION_NAME = "mfs_collection" # VARIABLE
-QDRANT_URL = os.getenv("QDRANT_URL")
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-qdrant = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
 
 # OpenAI config
-client = OpenAI()
 EMBED_MODEL = "text-embedding-3-large"
 
-_rx_tok = re.compile(r"[A-Za-z0-9_]+")
+# Retrieval config: defaults for arguments left as None; each name can be set in the environment
+RETRIEVE_MODE = "ann" # "ann" (server-side top-N) or "scroll" (full filtered scan)
+RETRIEVE_BACKEND = "qdrant" # "qdrant" or "snapshot" (local memory-mapped export)
+CANDIDATE_LIMIT = 200 # chunks fetched per query in "ann" mode
+SCROLL_PAGE_SIZE = 256
+CONTEXT_TOKEN_BUDGET = 6000 # prompt context cap for build_context()
+RETRIEVE_BUDGET = 3.0 # seconds for embedding + candidate fetch
+EMBED_BUDGET_SHARE = 0.6 # part of the budget the embedding may use before falling back
 
 
 # Helper functions
-def toks(s: str):
-    return [t.lower() for t in _rx_tok.findall(s or "")]
 
+def retrieve_config(mode=None, backend=None, limit=None):
+    """(mode, backend, candidate limit): the arguments given, else RETRIEVE_MODE & co. from the environment."""
+    return (
+        mode or setting("RETRIEVE_MODE", RETRIEVE_MODE),
+        backend or setting("RETRIEVE_BACKEND", RETRIEVE_BACKEND),
+        limit or setting("CANDIDATE_LIMIT", CANDIDATE_LIMIT),
+    )
+
+
+def get_store():
+    """Shared local snapshot; scripts.snapshot loads on the first snapshot-backend query."""
+    from scripts.snapshot import get_store as snapshot_store
+
+    return snapshot_store()
 
-def minmax(xs):
-    xs = np.asarray(xs, dtype=float)
-    lo, hi = xs.min() if len(xs) else 0.0, xs.max() if len(xs) else 1.0
-    return (xs - lo) / (hi - lo + 1e-9)
+
+def doc_key(r) -> str:
+    return payload_doc_key(r.id, r.payload)
 
 
 def group_by_doc(chunks: List[ScoredPoint]) -> Dict[str, List[ScoredPoint]]:
     groups = defaultdict(list)
     for r in chunks:
-        fam = (
-            r.payload.get("family_id") or
-            r.payload.get("doc_id") or
-            r.payload.get("url") or
-            r.payload.get("source") or
-            str(r.id)
-        )
-        groups[fam].append(r)
+        groups[doc_key(r)].append(r)
     return groups
 
 # Calculate BM25 scores
-def compute_bm25_scores(query, docs):
-    from rank_bm25 import BM25Okapi
+def bm25_scorer(docs, index=None):
+    """query -> BM25 scores over `docs`; built once so many queries can share it."""
+    # Prebuilt index: no tokenizing at query time
+    index = index if index is not None else load_index()
+    if index is not None:
+        ids = [str(d.id) for d in docs]
+        if all(i in index.rows for i in ids):
+            return lambda query: index.get_scores(query, ids)
 
-    corpus = []
-
-    for d in docs:
-        p = d.payload or {}
-
-        committees = p.get("committee_codes", [])
-        if isinstance(committees, list):
-            committees = " ".join(committees)
-
-        stances = p.get("stance", [])
-        if isinstance(stances, list):
-            stances = " ".join(stances)
-
-        topics = p.get("topic", [])
-        if isinstance(topics, list):
-            topics = " ".join(topics)
-
-        metas = p.get("meta", [])
-        if isinstance(metas, list):
-            metas = " ".join(metas)
-
-        s = " ".join(filter(None, [
-            p.get("source", ""),
-            str(p.get("year", "")),
-            p.get("month", ""),
-            p.get("full_date", ""),
-            committees,
-            p.get("file_type", ""),
-            p.get("body_code", ""),
-            stances,
-            topics,
-            metas,
-            p.get("text", "")
-        ]))
+    from rank_bm25 import BM25Okapi
 
-        corpus.append(toks(s))
+    bm25 = BM25Okapi([toks(bm25_text(d.payload)) for d in docs])
+    return lambda query: bm25.get_scores(toks(query))
 
-    bm25 = BM25Okapi(corpus)
-    return bm25.get_scores(toks(query))
 
+@timed("bm25")
+def compute_bm25_scores(query, docs, index=None):
+    return bm25_scorer(docs, index)(query)
 
 
 def build_filter(metadata):
     if not metadata:
         return None
 
+    from qdrant_client.models import Filter, FieldCondition, MatchValue
+
     return Filter(
         must=[
             FieldCondition(
@@ -112,13 +101,205 @@ def build_filter(metadata):
     )
 
 
+@timed("embed")
+def embed_text(query: str):
+    return get_query_embedding(query, get_openai(), model=EMBED_MODEL)
+
+
+def embed_many(queries: List[str]):
+    return get_query_embeddings(queries, get_openai(), model=EMBED_MODEL)
+
+
+@timed("search")
+def fetch_candidates(query_vec, metadata=None, limit: Optional[int] = None, backend: Optional[str] = None, store=None) -> List[ScoredPoint]:
+    """Top-N chunks by vector similarity, ranked server-side under the metadata filter."""
+    _, backend, limit = retrieve_config(backend=backend, limit=limit)
+    if store is not None or backend == "snapshot":
+        return (store or get_store()).search(query_vec, metadata, limit=limit)
+
+    return get_qdrant().search(
+        collection_name=COLLECTION_NAME,
+        query_vector=list(map(float, query_vec)),
+        query_filter=build_filter(metadata),
+        limit=limit,
+        with_payload=True,
+        with_vectors=False
+    )
+
+
+def source_filter(metadata, sources: List[str]) -> Filter:
+    from qdrant_client.models import Filter, FieldCondition, MatchAny
+
+    filt = build_filter(metadata)
+    must = list(filt.must) if filt and filt.must else []
+    must.append(FieldCondition(key="source", match=MatchAny(any=sources)))
+    return Filter(must=must)
+
+
+@timed("fetch_docs")
+def fetch_doc_chunks(metadata, sources: List[str], backend: Optional[str] = None, store=None):
+    """Every chunk of the given sources (payload only), paging through the scroll."""
+    _, backend, _ = retrieve_config(backend=backend)
+    if store is not None or backend == "snapshot":
+        return (store or get_store()).scroll(metadata, sources=sources)
+
+    scroll_filter = source_filter(metadata, sources)
+    chunks, offset = [], None
+    while True:
+        page, offset = get_qdrant().scroll(
+            collection_name=COLLECTION_NAME,
+            scroll_filter=scroll_filter,
+            limit=SCROLL_PAGE_SIZE,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False
+        )
+        chunks.extend(page)
+        if offset is None:
+            return chunks
+
+
+@timed("scroll")
+def fetch_scroll(metadata):
+    """Every chunk matching the filter, with vectors (scroll mode)."""
+    chunks, _ = get_qdrant().scroll(
+        collection_name=COLLECTION_NAME,
+        scroll_filter=build_filter(metadata),
+        limit=10_000,
+        with_payload=True,
+        with_vectors=True
+    )
+    return chunks
+
+
+def rank_docs(query: str, doc_reps, vec_scores, k: int, alpha: float, bm25_scores=None, index=None):
+    # BM25
+    if bm25_scores is None:
+        bm25_scores = compute_bm25_scores(query, doc_reps, index)
+
+    # Normalize and do hybrid
+    bm25_n = minmax(bm25_scores)
+    vec_n = minmax(vec_scores)
+    rel = alpha * bm25_n + (1 - alpha) * vec_n
+
+    # Rank docs
+    return [doc_reps[i] for i in top_k(rel, k)]
+
+
+def rank_hits(query: str, hits, k: int, alpha: float, index=None):
+    """
+    ANN candidates -> (top docs, chunks by doc). Doc vector score = best
+    chunk score. BM25 scores each doc's first chunk, as in scroll mode, taken
+    from the index since the hits may not include it; without one, the
+    lowest-chunk_index hit stands in.
+    """
+    CANDIDATES_SCANNED.inc(len(hits))
+    grouped = group_by_doc(hits)
+
+    doc_reps = [min(lst, key=lambda r: r.payload.get("chunk_index", 0)) for lst in grouped.values()]
+    vec_scores = np.fromiter(
+        (max(r.score for r in lst) for lst in grouped.values()),
+        dtype=np.float32, count=len(grouped)
+    )
+
+    bm25_scores = None
+    index = index if index is not None else load_index()
+    first_ids = index.first_chunk_ids(grouped) if index is not None else None
+    if first_ids is not None:
+        bm25_scores = index.get_scores(query, first_ids)
+    return rank_docs(query, doc_reps, vec_scores, k, alpha, bm25_scores, index), grouped
+
+
+def scroll_reps(chunks):
+    # Group chunks, get unique docs
+    CANDIDATES_SCANNED.inc(len(chunks))
+    grouped = group_by_doc(chunks)
+
+    doc_reps = []
+    for lst in grouped.values():
+        # pick the first chunk of the document as representative
+        rep = min(lst, key=lambda r: r.payload.get("chunk_index", 0))
+        doc_reps.append(rep)
+    return doc_reps, grouped
+
+
+def rank_scroll(query: str, query_vec, chunks, k: int, alpha: float):
+    """Scrolled chunks with vectors -> (top docs, chunks by doc)."""
+    doc_reps, grouped = scroll_reps(chunks)
+
+    # Calculate vector similarity by doc: stored vectors are unit length
+    # (Qdrant normalizes cosine collections), so one mat-vec is the cosine
+    q = unit(query_vec)
+    vec_scores = pack_vectors(doc_reps, dim=len(q)) @ q
+
+    return rank_docs(query, doc_reps, vec_scores, k, alpha), grouped
+
+
+def doc_sources(top_docs) -> List[str]:
+    return [rep.payload["source"] for rep in top_docs if rep.payload.get("source")]
+
+
+def collect_chunks(top_docs, grouped, hits=(), full_docs=None):
+    """Chunks of each top doc in rank order, each doc in chunk_index order."""
+    # Keep the scored hit where we have one so build_context() can rank chunks
+    hit_by_id = {h.id: h for h in hits}
+    by_doc = group_by_doc(full_docs) if full_docs else {}
+
+    final = []
+    for rep in top_docs:
+        chunks = by_doc.get(doc_key(rep)) or grouped[doc_key(rep)]
+        chunks = [hit_by_id.get(c.id, c) for c in chunks]
+        final.extend(sorted(chunks, key=lambda r: r.payload.get("chunk_index", 0)))
+    CHUNKS_RETURNED.inc(len(final))
+    return final
+
+
+def retrieve_ann(
+    query: str,
+    k: int,
+    alpha: float,
+    metadata: Optional[Dict[str, Union[str, int]]],
+    return_all_chunks: bool,
+    candidate_limit: Optional[int] = None,
+    backend: Optional[str] = None,
+    store=None
+):
+    """
+    Candidate-set hybrid retriever:
+      1. Embed query
+      2. Server-side vector search for the top-N chunks under the filter
+      3. Group candidates, doc vector score = best chunk score
+      4. BM25 / vector hybrid over the candidate docs
+      5. Return: all chunks (or matched chunks) for each top doc
+    """
+    query_vec = embed_text(query)
+    hits = fetch_candidates(query_vec, metadata, limit=candidate_limit, backend=backend, store=store)
+
+    if not hits:
+        return []
+
+    top_docs, grouped = rank_hits(query, hits, k, alpha, index=getattr(store, "bm25", None))
+
+    # Fetch the full documents for the winners only, without vectors
+    full_docs = None
+    sources = doc_sources(top_docs)
+    if return_all_chunks and sources:
+        full_docs = fetch_doc_chunks(metadata, sources, backend=backend, store=store)
+
+    return collect_chunks(top_docs, grouped, hits, full_docs)
+
+
 # Retriever logic
 def retrieve(
     query: str,
     k: int = 10,
     alpha: float = 0.3,
     metadata: Optional[Dict[str, Union[str, int]]] = None,
-    return_all_chunks: bool = False
+    return_all_chunks: bool = False,
+    mode: Optional[str] = None,
+    candidate_limit: Optional[int] = None,
+    backend: Optional[str] = None,
+    store=None
 ):
     """
     Hybrid retriever:
@@ -126,65 +307,396 @@ def retrieve(
       2. Group chunks
       3. Score docs
       4. Return: all chunks for each document
+
+    mode="ann" ranks only the top `candidate_limit` chunks returned by Qdrant,
+    so cost no longer grows with the collection. mode="scroll" scans every
+    chunk matching the filter (exact, but capped at 10,000 chunks).
+    backend="snapshot" answers from the local export (see scripts/snapshot.py)
+    with no Qdrant round-trips; its candidate search is exact. Passing a
+    `store` (e.g. Artifact.store) searches that snapshot instead of SNAPSHOT_DIR
+    and uses its own BM25 postings.
     """
+    mode, backend, _ = retrieve_config(mode, backend)
+
+    if mode == "ann" or backend == "snapshot" or store is not None:
+        return retrieve_ann(query, k, alpha, metadata, return_all_chunks, candidate_limit, backend, store)
+
+    chunks = fetch_scroll(metadata)
+
+    if not chunks:
+        return []
+
+    top_docs, grouped = rank_scroll(query, embed_text(query), chunks, k, alpha)
+    return collect_chunks(top_docs, grouped)
+
+
+@timed("search")
+def search_many(query_vecs, metadata, limit: Optional[int] = None, backend: Optional[str] = None):
+    """fetch_candidates() for several vectors under one filter, in one round-trip."""
+    _, backend, limit = retrieve_config(backend=backend, limit=limit)
+    if backend == "snapshot":
+        return [get_store().search(v, metadata, limit=limit) for v in query_vecs]
+
+    from qdrant_client.models import SearchRequest
 
-    # Filter with metadata
     filt = build_filter(metadata)
+    return get_qdrant().search_batch(
+        collection_name=COLLECTION_NAME,
+        requests=[
+            SearchRequest(vector=list(map(float, v)), filter=filt, limit=limit, with_payload=True, with_vector=False)
+            for v in query_vecs
+        ]
+    )
+
+
+def retrieve_many(
+    queries: List[str],
+    k: int = 10,
+    alpha: float = 0.3,
+    metadatas: Optional[List[Optional[Dict[str, Union[str, int]]]]] = None,
+    return_all_chunks: bool = False,
+    mode: Optional[str] = None,
+    candidate_limit: Optional[int] = None,
+    backend: Optional[str] = None,
+    query_vecs=None
+):
+    """
+    retrieve() for a list of queries, with shared work:
+      1. One embeddings request for every query not already cached (skipped
+         when the caller passes query_vecs from embed_many())
+      2. Queries grouped by identical metadata filter
+      3. Per group: one candidate fetch (search_batch / scroll), one BM25
+         structure, one full-document fetch
+    Returns one result list per query, equal to calling retrieve() on each.
+    """
+    mode, backend, _ = retrieve_config(mode, backend)
+    metadatas = metadatas or [None] * len(queries)
+    if query_vecs is None:
+        query_vecs = embed_many(queries)
+
+    groups = defaultdict(list)
+    for i, metadata in enumerate(metadatas):
+        groups[filter_key(metadata)].append(i)
 
-    chunks, _ = qdrant.scroll(
+    results = [[] for _ in queries]
+    for idxs in groups.values():
+        metadata = metadatas[idxs[0]]
+
+        if mode == "ann" or backend == "snapshot":
+            hit_lists = search_many([query_vecs[i] for i in idxs], metadata, candidate_limit, backend)
+            ranked = {
+                i: rank_hits(queries[i], hits, k, alpha) + (hits,)
+                for i, hits in zip(idxs, hit_lists) if hits
+            }
+
+            full_docs = None
+            sources = sorted({src for top_docs, _, _ in ranked.values() for src in doc_sources(top_docs)})
+            if return_all_chunks and sources:
+                full_docs = group_by_doc(fetch_doc_chunks(metadata, sources, backend=backend))
+
+            for i, (top_docs, grouped, hits) in ranked.items():
+                wanted = {doc_key(rep) for rep in top_docs}
+                docs = [c for key in wanted for c in full_docs.get(key, [])] if full_docs else None
+                results[i] = collect_chunks(top_docs, grouped, hits, docs)
+            continue
+
+        chunks = fetch_scroll(metadata)
+        if not chunks:
+            continue
+
+        doc_reps, grouped = scroll_reps(chunks)
+        scorer = bm25_scorer(doc_reps)
+        q = unit_rows([query_vecs[i] for i in idxs])
+        vec_scores = pack_vectors(doc_reps, dim=q.shape[1]) @ q.T
+
+        for col, i in enumerate(idxs):
+            top_docs = rank_docs(queries[i], doc_reps, vec_scores[:, col], k, alpha, bm25_scores=scorer(queries[i]))
+            results[i] = collect_chunks(top_docs, grouped)
+
+    return results
+
+
+# Async variants for the API: network waits yield the event loop and
+# CPU-bound ranking runs in the default executor
+@timed("embed")
+async def aembed_text(query: str):
+    return await aget_query_embedding(query, get_async_openai(), model=EMBED_MODEL)
+
+
+@timed("search")
+async def afetch_candidates(query_vec, metadata=None, limit: Optional[int] = None, backend: Optional[str] = None, store=None):
+    _, backend, limit = retrieve_config(backend=backend, limit=limit)
+    if store is not None or backend == "snapshot":
+        return await asyncio.to_thread((store or get_store()).search, query_vec, metadata, limit)
+
+    return await get_async_qdrant().search(
         collection_name=COLLECTION_NAME,
-        scroll_filter=filt,
+        query_vector=list(map(float, query_vec)),
+        query_filter=build_filter(metadata),
+        limit=limit,
+        with_payload=True,
+        with_vectors=False
+    )
+
+
+@timed("fetch_docs")
+async def afetch_doc_chunks(metadata, sources: List[str], backend: Optional[str] = None, store=None):
+    _, backend, _ = retrieve_config(backend=backend)
+    if store is not None or backend == "snapshot":
+        return await asyncio.to_thread((store or get_store()).scroll, metadata, sources)
+
+    scroll_filter = source_filter(metadata, sources)
+    chunks, offset = [], None
+    while True:
+        page, offset = await get_async_qdrant().scroll(
+            collection_name=COLLECTION_NAME,
+            scroll_filter=scroll_filter,
+            limit=SCROLL_PAGE_SIZE,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False
+        )
+        chunks.extend(page)
+        if offset is None:
+            return chunks
+
+
+@timed("scroll")
+async def afetch_scroll(metadata):
+    chunks, _ = await get_async_qdrant().scroll(
+        collection_name=COLLECTION_NAME,
+        scroll_filter=build_filter(metadata),
         limit=10_000,
         with_payload=True,
         with_vectors=True
     )
+    return chunks
 
+
+async def aretrieve(
+    query: str,
+    k: int = 10,
+    alpha: float = 0.3,
+    metadata: Optional[Dict[str, Union[str, int]]] = None,
+    return_all_chunks: bool = False,
+    mode: Optional[str] = None,
+    candidate_limit: Optional[int] = None,
+    backend: Optional[str] = None,
+    store=None,
+    query_vec=None
+):
+    """
+    Async retrieve(): same results. In scroll mode the query embedding and
+    the filtered fetch run concurrently; in ann mode the search needs the
+    embedding first, so the two awaits are sequential. Pass `query_vec` to
+    skip the embedding step.
+    """
+    mode, backend, _ = retrieve_config(mode, backend)
+    if mode == "ann" or backend == "snapshot" or store is not None:
+        if query_vec is None:
+            query_vec = await aembed_text(query)
+        hits = await afetch_candidates(query_vec, metadata, limit=candidate_limit, backend=backend, store=store)
+        if not hits:
+            return []
+
+        top_docs, grouped = await asyncio.to_thread(rank_hits, query, hits, k, alpha, getattr(store, "bm25", None))
+
+        full_docs = None
+        sources = doc_sources(top_docs)
+        if return_all_chunks and sources:
+            full_docs = await afetch_doc_chunks(metadata, sources, backend=backend, store=store)
+        return collect_chunks(top_docs, grouped, hits, full_docs)
+
+    if query_vec is None:
+        query_vec, chunks = await asyncio.gather(aembed_text(query), afetch_scroll(metadata))
+    else:
+        chunks = await afetch_scroll(metadata)
     if not chunks:
         return []
 
-    # Group chunks, get unique docs
-    grouped = group_by_doc(chunks)
+    top_docs, grouped = await asyncio.to_thread(rank_scroll, query, query_vec, chunks, k, alpha)
+    return collect_chunks(top_docs, grouped)
 
-    doc_reps = []
-    for lst in grouped.values():
-        # pick the first chunk of the document as representative
-        rep = min(lst, key=lambda r: r.payload.get("chunk_index", 0))
-        doc_reps.append(rep)
 
-    # Embed query
-    query_vec = client.embeddings.create(
-        model=EMBED_MODEL,
-        input=query
-    ).data[0].embedding
-    q = np.array(query_vec)
-
-    # Calculate vector similarity by doc
-    vec_scores = []
-    for rep in doc_reps:
-        if rep.vector is None:
-            vec_scores.append(0)
-        else:
-            v = np.array(rep.vector)
-            sim = np.dot(v, q) / (np.linalg.norm(v) * np.linalg.norm(q) + 1e-9)
-            vec_scores.append(float(sim))
+# Degraded retrieval under a latency budget
+def retrieval_deadline(budget: Optional[float] = None) -> float:
+    """time.monotonic() deadline for embedding + fetch, capped by the request deadline."""
+    budget = budget if budget is not None else setting("RETRIEVE_BUDGET", RETRIEVE_BUDGET)
+    left = time_left()
+    return time.monotonic() + (budget if left is None else max(0.0, min(budget, left)))
 
-    # BM25
-    bm25_scores = compute_bm25_scores(query, doc_reps)
 
-    # Normalize and do hybrid 
-    bm25_n = minmax(bm25_scores)
-    vec_n = minmax(vec_scores)
-    rel = alpha * bm25_n + (1 - alpha) * vec_n
+async def aembed_within(query: str, deadline: float):
+    """
+    (query vector, degraded reason). The embedding gets EMBED_BUDGET_SHARE of
+    the time left; if it is late or fails, a cached embedding of a similar
+    query is used ("cached_vector"), else none ("lexical"). A late request
+    keeps running so its vector lands in the cache for next time.
+    """
+    task = asyncio.ensure_future(aembed_text(query))
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    try:
+        timeout = max(0.0, deadline - time.monotonic()) * EMBED_BUDGET_SHARE
+        return await asyncio.wait_for(asyncio.shield(task), timeout), None
+    except Exception as e:
+        print(f"Query embedding unavailable ({type(e).__name__}), degrading")
+
+    query_vec = await asyncio.to_thread(embedding_cache.nearest, query, EMBED_MODEL)
+    return (query_vec, "cached_vector") if query_vec is not None else (None, "lexical")
+
+
+@timed("scroll")
+async def afetch_lexical(metadata, backend: Optional[str] = None, store=None):
+    """Every chunk matching the filter, payload only (the BM25-only path)."""
+    _, backend, _ = retrieve_config(backend=backend)
+    if store is not None or backend == "snapshot":
+        return await asyncio.to_thread((store or get_store()).scroll, metadata)
+
+    chunks, _ = await get_async_qdrant().scroll(
+        collection_name=COLLECTION_NAME,
+        scroll_filter=build_filter(metadata),
+        limit=10_000,
+        with_payload=True,
+        with_vectors=False
+    )
+    return chunks
 
-    # Rank docs
-    order = np.argsort(-rel)
-    top_docs = [doc_reps[i] for i in order[:k]]
 
-    final = []
-    for rep in top_docs:
-        key = rep.payload.get("source") or rep.payload.get("doc_id")
-        final.extend(grouped[key])
-    return final
+def rank_lexical(query: str, chunks, k: int, index=None):
+    """Scrolled chunks -> (top docs, chunks by doc) on BM25 alone (alpha=1)."""
+    doc_reps, grouped = scroll_reps(chunks)
+    vec_scores = np.zeros(len(doc_reps), dtype=np.float32)
+    return rank_docs(query, doc_reps, vec_scores, k, alpha=1.0, index=index), grouped
+
+
+async def aretrieve_within(
+    query: str,
+    deadline: float,
+    query_vec=None,
+    degraded: Optional[str] = None,
+    k: int = 10,
+    alpha: float = 0.3,
+    metadata: Optional[Dict[str, Union[str, int]]] = None,
+    return_all_chunks: bool = False,
+    mode: Optional[str] = None,
+    candidate_limit: Optional[int] = None,
+    backend: Optional[str] = None,
+    store=None
+):
+    """
+    aretrieve() that finishes by `deadline` (see retrieval_deadline()).
+    Returns (results, degraded): degraded is None for a normal answer,
+    "cached_vector" or "lexical" when the query embedding was late, and
+    "timeout" (no results) when the candidate fetch itself ran out of time.
+    Pass the output of aembed_within() as query_vec/degraded if the caller
+    already waited for the embedding.
+    """
+    if query_vec is None and degraded is None:
+        query_vec, degraded = await aembed_within(query, deadline)
+
+    try:
+        timeout = max(0.0, deadline - time.monotonic())
+        if query_vec is None:
+            chunks = await asyncio.wait_for(afetch_lexical(metadata, backend, store), timeout)
+            top_docs, grouped = await asyncio.to_thread(rank_lexical, query, chunks, k, getattr(store, "bm25", None))
+            results = collect_chunks(top_docs, grouped)
+        else:
+            results = await asyncio.wait_for(
+                aretrieve(query, k, alpha, metadata, return_all_chunks, mode, candidate_limit, backend, store, query_vec),
+                timeout
+            )
+    except asyncio.TimeoutError:
+        results, degraded = [], "timeout"
+
+    if degraded:
+        DEGRADED.inc(reason=degraded)
+    return results, degraded
+
+def strip_overlap(prev: str, nxt: str) -> str:
+    """Drop the head of `nxt` that repeats the tail of `prev` (chunk overlap)."""
+    probe = nxt[:32]
+    if not probe:
+        return nxt
+    idx = prev.find(probe, max(0, len(prev) - CHUNK_OVERLAP * 10))
+    while idx != -1:
+        tail = prev[idx:]
+        if nxt.startswith(tail):
+            return nxt[len(tail):]
+        idx = prev.find(probe, idx + 1)
+    return nxt
+
+
+@timed("context")
+def build_context(results: List[ScoredPoint], token_budget: Optional[int] = None):
+    """
+    Budgeted prompt context:
+      1. Order chunks by relevance (doc rank, then chunk score)
+      2. Take chunks until `token_budget` is reached
+      3. Stitch consecutive chunks of a source back together without the overlap
+    Returns (context, stats) where stats reports the tokens saved.
+    """
+    if token_budget is None:
+        token_budget = setting("CONTEXT_TOKEN_BUDGET", CONTEXT_TOKEN_BUDGET)
+
+    def pos(r):
+        return r.payload.get("chunk_index", 0)
+
+    doc_rank = {}
+    for r in results:
+        doc_rank.setdefault(doc_key(r), len(doc_rank))
+
+    ordered = sorted(
+        results,
+        key=lambda r: (doc_rank[doc_key(r)], -(getattr(r, "score", None) or 0.0), pos(r))
+    )
 
-def format_context(results: List[ScoredPoint]) -> str:
-    return "\n\n".join(r.payload.get("text", "") for r in results)
+    tokens = {}
+    for r in results:
+        tokens.setdefault(r.id, count_tokens(r.payload.get("text", "")))
+
+    picked = defaultdict(dict)
+    used = 0
+    for r in ordered:
+        key, idx = doc_key(r), pos(r)
+        if idx in picked[key]:
+            continue
+        neighbours = (idx - 1 in picked[key]) + (idx + 1 in picked[key])
+        cost = max(tokens[r.id] - neighbours * CHUNK_OVERLAP, 0)
+        if used + cost > token_budget:
+            break
+        picked[key][idx] = r.payload.get("text", "")
+        used += cost
+
+    parts = []
+    for key in sorted(picked, key=doc_rank.get):
+        run_text, last = None, None
+        for idx in sorted(picked[key]):
+            text = picked[key][idx]
+            if run_text is not None and idx == last + 1:
+                run_text += strip_overlap(run_text, text)
+            else:
+                if run_text is not None:
+                    parts.append(run_text)
+                run_text = text
+            last = idx
+        if run_text is not None:
+            parts.append(run_text)
+
+    context = "\n\n".join(parts)
+    tokens_in = sum(tokens.values())
+    tokens_out = count_tokens(context)
+    stats = {
+        "chunks_in": len(results),
+        "chunks_used": sum(len(v) for v in picked.values()),
+        "tokens_in": tokens_in,
+        "tokens_out": tokens_out,
+        "tokens_saved": max(tokens_in - tokens_out, 0),
+    }
+    CONTEXT_TOKENS.inc(stats["tokens_out"])
+    return context, stats
+
+
+def format_context(results: List[ScoredPoint], token_budget: Optional[int] = None) -> str:
+    if token_budget is None:
+        return "\n\n".join(r.payload.get("text", "") for r in results)
+    return build_context(results, token_budget)[0]
@@ -0,0 +1,37 @@
+import asyncio
+
+from scripts.metrics import COALESCED
+
+
+class SingleFlight:
+    """
+    In-flight request coalescing: while a call for `key` is running, later
+    callers with the same key await the same task instead of starting their
+    own. The task is shielded, so one caller disconnecting does not cancel
+    the work for the others. Results (and exceptions) are shared, not cached:
+    the key is released as soon as the task finishes.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+            COALESCED.inc()
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+        }
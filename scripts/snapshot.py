@@ -0,0 +1,356 @@
+import os
+import json
+import mmap
+import time
+import shutil
+import argparse
+import numpy as np
+from pathlib import Path
+from scripts.env import load_env, setting
+from scripts.indexes import PAYLOAD_INDEXES
+from scripts.vector_ops import unit_rows, top_k
+from scripts.answer_cache import write_collection_version
+
+# Snapshot config
+SNAPSHOT_DIR = "snapshot" # VARIABLE; SNAPSHOT_DIR in the environment overrides it
+COLLECTION_NAME = "mfs_collection" # VARIABLE
+EMBEDDINGS_PATH = "embeddings.jsonl" # VARIABLE
+SCORE_BLOCK = 16_384 # rows scored per block (bounds float16 -> float32 temporaries)
+
+
+class SnapshotPoint:
+    """Duck-types the qdrant ScoredPoint/Record fields the retriever reads."""
+    __slots__ = ("id", "payload", "score", "vector")
+
+    def __init__(self, id, payload, score=0.0, vector=None):
+        self.id = id
+        self.payload = payload
+        self.score = score
+        self.vector = vector
+
+
+def _value_key(v):
+    return json.dumps(v, sort_keys=True)
+
+
+def _matches(value, wanted):
+    # Same semantics as MatchValue: list payloads match if any element does
+    if isinstance(value, list):
+        return wanted in value
+    return value == wanted
+
+
+def _write_blobs(out, name, items):
+    """Byte strings as <name>.bin plus <name>_offsets.npy (row i is bin[offsets[i]:offsets[i + 1]])."""
+    offsets = [0]
+    with open(out / f"{name}.bin", "wb") as f:
+        for item in items:
+            f.write(item)
+            offsets.append(offsets[-1] + len(item))
+    np.save(out / f"{name}_offsets.npy", np.asarray(offsets, dtype=np.int64))
+
+
+class Blobs:
+    """Memory-mapped byte strings written by _write_blobs()."""
+
+    def __init__(self, path, name):
+        # mmap.mmap rather than np.memmap: slicing it returns bytes without building an array
+        self.data = b""
+        with open(path / f"{name}.bin", "rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.offsets = np.load(path / f"{name}_offsets.npy", mmap_mode="r")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.data[int(self.offsets[i]):int(self.offsets[i + 1])]
+
+
+class Column:
+    """
+    One payload field, dictionary-encoded: an int32 code per row (-1 where
+    the field is absent) and the field's distinct values as JSON.
+    """
+
+    def __init__(self, path, n):
+        self.codes = np.load(path / f"{n}.codes.npy", mmap_mode="r")
+        self.values = Blobs(path, str(n))
+
+    def value(self, code):
+        return json.loads(self.values[code])
+
+    def get(self, row):
+        code = int(self.codes[row])
+        return None if code < 0 else self.value(code)
+
+    def rows_where(self, predicate, rows=None):
+        """
+        Sorted rows (out of `rows`, default all) whose value satisfies
+        `predicate`. Each distinct value among them is decoded once.
+        """
+        if rows is None:
+            codes, present = self.codes, range(len(self.values))
+        else:
+            codes = np.asarray(self.codes[rows])
+            present = np.unique(codes[codes >= 0])
+        hit = np.isin(codes, [c for c in present if predicate(self.value(int(c)))])
+        return np.flatnonzero(hit) if rows is None else rows[hit]
+
+
+def snapshot_dir():
+    return setting("SNAPSHOT_DIR", SNAPSHOT_DIR)
+
+
+def write_snapshot(records, out_dir=None, dtype="float32", source=""):
+    """
+    Write an iterable of (id, vector, payload) as a snapshot directory:
+      vectors.bin        unit-normalized rows, memory-mapped at query time
+      text.bin/.npy      chunk texts as one UTF-8 blob + offsets
+      ids.npy            point ids, fixed-width ASCII
+      columns/           every other payload field: codes per row + distinct values
+      postings.*         row lists per value for the PAYLOAD_INDEXES fields
+    Everything but meta.json and postings.json is memory-mapped when read.
+    The new snapshot is written beside the old one and swapped in at the end.
+    """
+    out = Path(out_dir or snapshot_dir())
+    tmp = out.with_name(out.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    ids, columns, postings = [], {}, {f: {} for f in PAYLOAD_INDEXES} # columns: field -> (codes, {value: code})
+    text_offsets = [0]
+    dim = None
+
+    with open(tmp / "vectors.bin", "wb") as vf, open(tmp / "text.bin", "wb") as tf:
+        batch_vecs = []
+
+        def flush():
+            if batch_vecs:
+                vf.write(unit_rows(batch_vecs).astype(dtype).tobytes())
+                batch_vecs.clear()
+
+        for row, (pid, vector, payload) in enumerate(records):
+            if dim is None:
+                dim = len(vector)
+            elif len(vector) != dim:
+                raise ValueError(f"Point {pid} has {len(vector)} dims, expected {dim}")
+
+            payload = dict(payload or {})
+            text = (payload.pop("text", "") or "").encode("utf-8")
+            tf.write(text)
+            text_offsets.append(text_offsets[-1] + len(text))
+
+            for field in set(columns) | set(payload):
+                codes, values = columns.setdefault(field, ([-1] * row, {}))
+                value = payload.get(field)
+                codes.append(-1 if value is None else values.setdefault(_value_key(value), len(values)))
+
+            for field, index in postings.items():
+                value = payload.get(field)
+                values = value if isinstance(value, list) else [value]
+                for key in {_value_key(v) for v in values if v is not None}:
+                    index.setdefault(key, []).append(row)
+
+            ids.append(str(pid))
+            batch_vecs.append(vector)
+            if len(batch_vecs) >= 1024:
+                flush()
+        flush()
+
+    np.save(tmp / "text_offsets.npy", np.asarray(text_offsets, dtype=np.int64))
+
+    # Postings: one int32 array, (start, end) slices per field value
+    rows, slices, start = [], {}, 0
+    for field, index in postings.items():
+        slices[field] = {}
+        for key, lst in index.items():
+            rows.append(np.asarray(lst, dtype=np.int32))
+            slices[field][key] = [start, start + len(lst)]
+            start += len(lst)
+    np.save(tmp / "postings.npy", np.concatenate(rows) if rows else np.zeros(0, dtype=np.int32))
+
+    with open(tmp / "postings.json", "w", encoding="utf-8") as f:
+        json.dump(slices, f)
+    (tmp / "columns").mkdir()
+    for n, (codes, values) in enumerate(columns.values()):
+        np.save(tmp / "columns" / f"{n}.codes.npy", np.asarray(codes, dtype=np.int32))
+        _write_blobs(tmp / "columns", str(n), (key.encode("utf-8") for key in values))
+    width = max((len(pid) for pid in ids), default=1)
+    np.save(tmp / "ids.npy", np.asarray(ids, dtype=f"S{width}"))
+    with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "count": len(ids),
+            "columns": list(columns),
+            "dim": dim or 0,
+            "dtype": dtype,
+            "created": time.time(),
+            "source": source,
+        }, f)
+
+    old = out.with_name(out.name + ".old")
+    shutil.rmtree(old, ignore_errors=True)
+    if out.exists():
+        out.rename(old)
+    tmp.rename(out)
+    shutil.rmtree(old, ignore_errors=True)
+    write_collection_version()
+    print(f"Snapshot written: {out} ({len(ids)} points, dim {dim}, {dtype})")
+
+
+class SnapshotStore:
+    """
+    Read-only, in-process view of an exported collection. Vectors, texts,
+    ids and payload columns are np.memmap'd, so opening one costs the same at
+    any size and every worker process shares them via the page cache.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path or snapshot_dir())
+        with open(self.path / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(self.path / "postings.json", "r", encoding="utf-8") as f:
+            self.slices = json.load(f)
+
+        n, dim = self.meta["count"], self.meta["dim"]
+        self.vectors = np.memmap(self.path / "vectors.bin", dtype=self.meta["dtype"], mode="r", shape=(n, dim)) if n else np.zeros((0, dim), dtype=np.float32)
+        self.text = Blobs(self.path, "text")
+        self.ids = np.load(self.path / "ids.npy", mmap_mode="r")
+        self.columns = {field: Column(self.path / "columns", i) for i, field in enumerate(self.meta["columns"])}
+        self.postings = np.load(self.path / "postings.npy", mmap_mode="r")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def point_id(self, row: int) -> str:
+        return self.ids[row].decode("ascii")
+
+    def payload(self, row: int) -> dict:
+        payload = {"text": self.text[row].decode("utf-8")}
+        for field, column in self.columns.items():
+            value = column.get(row)
+            if value is not None:
+                payload[field] = value
+        return payload
+
+    def point(self, row: int, score=0.0) -> SnapshotPoint:
+        return SnapshotPoint(self.point_id(row), self.payload(row), float(score))
+
+    def filter_rows(self, metadata=None):
+        """Sorted rows matching every key/value in `metadata` (None = all rows)."""
+        rows = None
+        for field, wanted in (metadata or {}).items():
+            if field in self.slices:
+                lo, hi = self.slices[field].get(_value_key(wanted), (0, 0))
+                match = np.asarray(self.postings[lo:hi], dtype=np.int64)
+            elif field in self.columns:
+                match = self.columns[field].rows_where(lambda v: _matches(v, wanted), rows)
+            else:
+                match = np.zeros(0, dtype=np.int64)
+            rows = match if rows is None else np.intersect1d(rows, match, assume_unique=True)
+            if not len(rows):
+                break
+        return np.arange(len(self.ids)) if rows is None else rows
+
+    def search(self, query_vec, metadata=None, limit=10):
+        """Exact top-`limit` cosine search over the filtered rows."""
+        rows = self.filter_rows(metadata)
+        if not len(rows):
+            return []
+
+        q = np.asarray(query_vec, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        scores = np.empty(len(rows), dtype=np.float32)
+        full = len(rows) == len(self.ids)
+        for start in range(0, len(rows), SCORE_BLOCK):
+            block = slice(start, start + SCORE_BLOCK)
+            mat = self.vectors[block] if full else self.vectors[rows[block]]
+            scores[block] = np.asarray(mat, dtype=np.float32) @ q
+
+        best = top_k(scores, limit)
+        return [self.point(int(rows[i]), scores[i]) for i in best]
+
+    def scroll(self, metadata=None, sources=None):
+        """Every point matching `metadata`, optionally restricted to some sources."""
+        rows = self.filter_rows(metadata)
+        if sources is not None:
+            wanted = set(sources)
+            column = self.columns.get("source")
+            rows = column.rows_where(lambda v: v in wanted, rows) if column else []
+        return [self.point(int(r)) for r in rows]
+
+
+_store = {}
+
+
+def get_store(path=None):
+    """Shared store, reopened when a new snapshot is swapped in."""
+    path = path or snapshot_dir()
+    meta = Path(path) / "meta.json"
+    if not meta.exists():
+        raise FileNotFoundError(f"No snapshot at {path}; export one with `python -m scripts.snapshot`")
+    stamp = meta.stat().st_mtime_ns
+    cached = _store.get(str(path))
+    if cached and cached[0] == stamp:
+        return cached[1]
+    store = SnapshotStore(path)
+    _store[str(path)] = (stamp, store)
+    return store
+
+
+def iter_qdrant(qdrant, collection=COLLECTION_NAME, page_size=512):
+    offset = None
+    while True:
+        page, offset = qdrant.scroll(
+            collection_name=collection,
+            limit=page_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True
+        )
+        for p in page:
+            yield str(p.id), p.vector, p.payload
+        if offset is None:
+            return
+
+
+def iter_jsonl(path=EMBEDDINGS_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            item = json.loads(line)
+            yield item["id"], item["embedding"], {"text": item["text"], **item.get("metadata", {})}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export mfs_collection to a local memory-mapped snapshot")
+    parser.add_argument("--from", dest="source", choices=["qdrant", "store", "jsonl"], default="qdrant")
+    parser.add_argument("--path", default=EMBEDDINGS_PATH, help="embeddings.jsonl when --from jsonl")
+    parser.add_argument("--out", default=snapshot_dir())
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    args = parser.parse_args()
+
+    if args.source == "qdrant":
+        from scripts.clients import get_qdrant
+        records = iter_qdrant(get_qdrant(bulk=True))
+        source = f"qdrant:{COLLECTION_NAME}"
+    elif args.source == "store":
+        from scripts.embedding_store import EmbeddingStore
+        from scripts.collection_manifest import current_ids
+        store = EmbeddingStore()
+        only = current_ids()
+        missing = store.count_missing(only) if only is not None else 0
+        if missing:
+            # A store written before points were keyed by id kept one point per distinct text
+            parser.error(f"{store.path} lacks {missing} of the {len(only)} points in the collection; use --from qdrant")
+        records, source = store.iter_points(only), f"store:{store.path}"
+    else:
+        records = iter_jsonl(args.path)
+        source = f"jsonl:{args.path}"
+
+    write_snapshot(records, args.out, dtype=args.dtype, source=source)
+
+
+if __name__ == "__main__":
+    load_env()
+    main()
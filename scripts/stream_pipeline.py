@@ -0,0 +1,266 @@
+"""
+Streaming ingest: PDFs -> text -> chunks -> embeddings -> Qdrant as
+concurrent stages joined by bounded queues, so memory stays flat with corpus
+size and the first documents are searchable while the rest are still being
+read. Each stage reports throughput and the backlog waiting in front of it.
+
+    python -m scripts.pipeline --stream
+"""
+import time
+import queue
+import threading
+from pathlib import Path
+from scripts.env import setting
+from scripts.load_pdfs import extract_cached, make_document
+from scripts.get_embedding import chunk_doc
+from scripts.embed_scheduler import EmbedScheduler, pack_batches
+from scripts.embedding_store import EmbeddingStore
+from scripts.collection_manifest import CollectionManifest, chunk_id
+from scripts.chunk_text import truncate_guard, CHUNK_MAX_TOKENS
+from scripts.upload_embeddings import ensure_collection, to_points, safe_upsert, delete_points, COLLECTION_NAME
+from scripts.bm25_index import BM25Writer
+from scripts.answer_cache import write_collection_version
+from scripts.clients import get_qdrant
+
+# Stream config
+STREAM_QUEUE = 16 # items waiting between two stages; STREAM_QUEUE in the environment overrides it
+STREAM_BATCH_TOKENS = 64 * CHUNK_MAX_TOKENS # smaller requests than the API allows, so points land early
+UPSERT_BATCH = 256 # points per Qdrant upsert
+VERSION_FLUSH_SECONDS = 30 # how often the collection version (answer cache) catches up with Qdrant
+REPORT_SECONDS = 5
+
+DONE = object()
+
+
+class Aborted(Exception):
+    pass
+
+
+class Stage:
+    """Counts what one stage has finished; `inbox` is the queue feeding it."""
+
+    def __init__(self, name, unit, inbox=None):
+        self.name = name
+        self.unit = unit
+        self.inbox = inbox
+        self.count = 0
+        self.start = time.perf_counter()
+
+    def add(self, n=1):
+        self.count += n
+
+    def report(self):
+        rate = self.count / max(time.perf_counter() - self.start, 1e-9)
+        backlog = f" q={self.inbox.qsize()}" if self.inbox is not None else ""
+        return f"{self.name} {self.count} {self.unit} ({rate:.1f}/s){backlog}"
+
+
+class StreamPipeline:
+    def __init__(self, pdf_dir="data/", load_workers=None, embed_workers=None,
+                 queue_size=None, store=None, manifest=None):
+        self.pdf_dir = Path(pdf_dir)
+        self.load_workers = load_workers
+        self.embed_workers = embed_workers
+        self.store = store if store is not None else EmbeddingStore()
+        self.manifest = manifest if manifest is not None else CollectionManifest()
+        queue_size = queue_size or setting("STREAM_QUEUE", STREAM_QUEUE)
+        self.docs = queue.Queue(queue_size)
+        self.chunks = queue.Queue(queue_size)
+        self.points = queue.Queue(queue_size)
+        self.stages = [
+            Stage("extract", "docs"),
+            Stage("chunk", "chunks", self.docs),
+            Stage("embed", "chunks", self.chunks),
+            Stage("upsert", "points", self.points),
+        ]
+        self.abort = threading.Event()
+        self.error = None
+        self.first_upsert = None
+        self.sources = set() # sources that reached the chunk stage
+
+    # Queue helpers that give up when another stage has failed
+    def put(self, q, item):
+        while not self.abort.is_set():
+            try:
+                return q.put(item, timeout=0.5)
+            except queue.Full:
+                pass
+        raise Aborted()
+
+    def get(self, q, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.abort.is_set():
+            wait = 0.5 if deadline is None else min(0.5, deadline - time.monotonic())
+            if wait <= 0:
+                raise queue.Empty()
+            try:
+                return q.get(timeout=wait)
+            except queue.Empty:
+                pass
+        raise Aborted()
+
+    # Stages
+    def extract(self, stage):
+        paths = sorted(self.pdf_dir.rglob("*.pdf"))
+        for path, result, error in extract_cached(paths, self.load_workers):
+            if self.abort.is_set():
+                raise Aborted()
+            if error:
+                print(f"Skipped {Path(path).name}: {error}")
+                continue
+            doc = make_document(path, result[0])
+            if doc is None:
+                continue
+            self.put(self.docs, doc)
+            stage.add()
+        self.put(self.docs, DONE)
+
+    def chunk(self, stage):
+        while (doc := self.get(self.docs)) is not DONE:
+            chunks = {}
+            for text, meta in chunk_doc(doc):
+                text = truncate_guard(text)
+                chunks[chunk_id(meta.get("source"), meta["chunk_index"], text)] = (text, meta)
+            self.sources.add(doc.metadata.get("source"))
+
+            # Unchanged chunks are already in the collection; embedded ones skip the API
+            new_ids = self.manifest.mark(chunks)
+            vectors = self.store.lookup([chunks[pid][0] for pid in new_ids])
+            stored, todo = [], []
+            for pid, vec in zip(new_ids, vectors):
+                text, meta = chunks[pid]
+                if vec is not None:
+                    stored.append({"id": pid, "text": text, "embedding": vec, "metadata": meta})
+                else:
+                    todo.append((text, (pid, meta)))
+            if stored:
+                # Already embedded, possibly under another point id: record the point against that vector
+                self.store.add_points(
+                    [r["id"] for r in stored], [r["text"] for r in stored], [r["metadata"] for r in stored]
+                )
+                self.put(self.points, stored)
+            if todo:
+                self.put(self.chunks, todo)
+                stage.add(len(todo))
+        self.put(self.chunks, DONE)
+
+    def pending_chunks(self):
+        while (items := self.get(self.chunks)) is not DONE:
+            yield from items
+
+    def embed(self, stage):
+        scheduler = EmbedScheduler(self.embed_workers)
+        batches = pack_batches(self.pending_chunks(), max_tokens=STREAM_BATCH_TOKENS)
+        failed = 0
+        for batch, vectors, error in scheduler.embed(batches):
+            if error is not None:
+                print(f"Gave up on {len(batch)} chunks: {error}")
+                failed += len(batch)
+                continue
+            texts = batch.texts
+            ids = [pid for _, (pid, _) in batch.items]
+            metas = [meta for _, (_, meta) in batch.items]
+            self.store.append(texts, vectors, metas, ids=ids)
+            self.put(self.points, [
+                {"id": pid, "text": text, "embedding": vec, "metadata": meta}
+                for pid, text, vec, meta in zip(ids, texts, vectors, metas)
+            ])
+            stage.add(len(texts))
+        if failed:
+            print(f"{failed} chunks left for the next run")
+        self.put(self.points, DONE)
+
+    def upsert(self, stage):
+        qdrant = get_qdrant(bulk=True)
+        ensure_collection(qdrant)
+        # Upserted points reach BM25 as bounded delta segments: the writer
+        # flushes every BM25_FLUSH_DOCS points, and again with each version stamp
+        pending = []
+        last_flush, upserted, versioned = time.monotonic(), 0, 0
+
+        def send():
+            nonlocal upserted
+            points = to_points(pending)
+            if points:
+                safe_upsert(qdrant, COLLECTION_NAME, points)
+                self.manifest.add((p.id, p.payload.get("source")) for p in points)
+                bm25.add((p.id, p.payload) for p in points)
+                upserted += len(points)
+                stage.add(len(points))
+                if self.first_upsert is None:
+                    self.first_upsert = time.perf_counter()
+            pending.clear()
+
+        def flush_version():
+            nonlocal last_flush, versioned
+            bm25.flush()
+            write_collection_version()
+            last_flush, versioned = time.monotonic(), upserted
+
+        # Leaving the block, even on abort, indexes whatever was upserted
+        with BM25Writer() as bm25:
+            while True:
+                try:
+                    entries = self.get(self.points, timeout=1.0)
+                except queue.Empty:
+                    entries = None # idle: send what we have so it becomes searchable
+                if entries is DONE:
+                    break
+                if entries:
+                    pending.extend(entries)
+
+                if len(pending) >= UPSERT_BATCH or (entries is None and pending):
+                    send()
+                if upserted > versioned and time.monotonic() - last_flush >= VERSION_FLUSH_SECONDS:
+                    flush_version()
+            send()
+            if upserted > versioned:
+                flush_version()
+
+    def _run_stage(self, fn, stage):
+        try:
+            fn(stage)
+        except Aborted:
+            pass
+        except Exception as e:
+            if self.error is None:
+                self.error = e
+                print(f"Stage {stage.name} failed: {e}")
+            self.abort.set()
+
+    def report(self):
+        return " | ".join(stage.report() for stage in self.stages)
+
+    def run(self, report_every=REPORT_SECONDS):
+        start = time.perf_counter()
+        qdrant = get_qdrant(bulk=True)
+        self.manifest.bootstrap(qdrant, COLLECTION_NAME)
+        self.manifest.begin()
+        extract, chunk, embed, upsert = self.stages
+        threads = [
+            threading.Thread(target=self._run_stage, args=(self.extract, extract), daemon=True),
+            threading.Thread(target=self._run_stage, args=(self.chunk, chunk), daemon=True),
+            threading.Thread(target=self._run_stage, args=(self.embed, embed), daemon=True),
+            threading.Thread(target=self._run_stage, args=(self.upsert, upsert), daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                threads[-1].join(report_every)
+                print(self.report())
+        except KeyboardInterrupt:
+            self.abort.set()
+            raise
+
+        if self.error is not None:
+            raise self.error
+
+        # Only after a complete run: chunks of changed or removed PDFs that were not re-produced
+        stale = self.manifest.stale(self.sources, self.pdf_dir)
+        if stale:
+            delete_points(stale, qdrant, manifest=self.manifest)
+        elapsed = time.perf_counter() - start
+        first = f", first points searchable after {self.first_upsert - start:.1f}s" if self.first_upsert else ""
+        print(f"Stream pipeline done in {elapsed:.1f}s{first}")
+        return self.stages
@@ -0,0 +1,189 @@
+"""
+Local stand-in for the OpenAI API, for testing and load runs without real calls.
+
+    uvicorn scripts.stub_openai:app --port 8001
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=stub uvicorn scripts.app:app
+
+Chat completions (streaming or not) echo a fixed answer word by word; embeddings
+are deterministic pseudo-random unit vectors seeded from the input text.
+STUB_CONCURRENCY caps requests served at once (queued beyond that), which
+stands in for upstream rate limits in load tests.
+
+Embeddings enforce OpenAI-style limits: STUB_RPM / STUB_TPM per minute
+(token buckets; over the limit is a 429 with Retry-After), the per-request
+input limits (a 400), and x-ratelimit-* headers on every response.
+STUB_ERROR_RATE makes that share of requests fail with a 500. Counts are at
+GET /stub/stats.
+"""
+import os
+import json
+import time
+import asyncio
+import random
+import hashlib
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse, JSONResponse
+
+STUB_LATENCY = float(os.getenv("STUB_LATENCY", "0.05")) # seconds before the first byte
+STUB_TOKEN_DELAY = float(os.getenv("STUB_TOKEN_DELAY", "0.02")) # seconds between streamed tokens
+STUB_ANSWER = os.getenv("STUB_ANSWER", "This is a stub answer generated from the provided context.")
+STUB_EMBED_DIM = int(os.getenv("STUB_EMBED_DIM", "3072"))
+STUB_CONCURRENCY = int(os.getenv("STUB_CONCURRENCY", "0")) # 0 = unlimited
+STUB_RPM = int(os.getenv("STUB_RPM", "0")) # embedding requests per minute, 0 = unlimited
+STUB_TPM = int(os.getenv("STUB_TPM", "0")) # embedding tokens per minute, 0 = unlimited
+STUB_ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0")) # share of embedding requests answered with a 500
+STUB_REQUEST_TOKENS = 300000 # per-request limits of the real API
+STUB_REQUEST_INPUTS = 2048
+
+app = FastAPI()
+capacity = asyncio.Semaphore(STUB_CONCURRENCY) if STUB_CONCURRENCY else None
+stats = {"requests": 0, "inputs": 0, "tokens": 0, "rate_limited": 0, "errors": 0, "rejected": 0}
+
+
+class Bucket:
+    """Per-minute allowance refilled continuously, like the API's rate limiter."""
+
+    def __init__(self, per_minute):
+        self.limit = per_minute
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.level = min(self.limit, self.level + (now - self.updated) * self.limit / 60)
+        self.updated = now
+
+    def wait_for(self, n):
+        """Seconds until n fits, 0 if it does now."""
+        self.refill()
+        return max(0.0, (min(n, self.limit) - self.level) * 60 / self.limit)
+
+
+buckets = {kind: Bucket(limit) for kind, limit in (("requests", STUB_RPM), ("tokens", STUB_TPM)) if limit}
+
+
+def ratelimit_headers():
+    headers = {}
+    for kind, bucket in buckets.items():
+        bucket.refill()
+        headers[f"x-ratelimit-limit-{kind}"] = str(bucket.limit)
+        headers[f"x-ratelimit-remaining-{kind}"] = str(int(max(bucket.level, 0)))
+        headers[f"x-ratelimit-reset-{kind}"] = f"{(bucket.limit - bucket.level) * 60 / bucket.limit:.3f}s"
+    return headers
+
+
+def api_error(status, message, code, headers=None):
+    return JSONResponse(
+        {"error": {"message": message, "type": "stub", "code": code}}, status_code=status, headers=headers
+    )
+
+
+async def upstream_wait(seconds):
+    """Sleep for `seconds` while holding one unit of stub capacity."""
+    if capacity is None:
+        await asyncio.sleep(seconds)
+        return
+    async with capacity:
+        await asyncio.sleep(seconds)
+
+
+def fake_embedding(text: str, dim: int = STUB_EMBED_DIM):
+    seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little")
+    v = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (v / np.linalg.norm(v)).tolist()
+
+
+def approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+@app.get("/stub/stats")
+async def stub_stats():
+    return stats
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    dim = body.get("dimensions") or STUB_EMBED_DIM
+    tokens = sum(approx_tokens(t) for t in inputs)
+
+    if len(inputs) > STUB_REQUEST_INPUTS or tokens > STUB_REQUEST_TOKENS:
+        stats["rejected"] += 1
+        return api_error(400, f"{len(inputs)} inputs / {tokens} tokens is over the per-request limit", "invalid_request")
+    want = {"requests": 1, "tokens": tokens}
+    wait = max([bucket.wait_for(want[kind]) for kind, bucket in buckets.items()], default=0)
+    if wait > 0:
+        stats["rate_limited"] += 1
+        return api_error(429, "Rate limit reached", "rate_limit_exceeded", {
+            **ratelimit_headers(), "retry-after-ms": str(int(wait * 1000) + 1)
+        })
+    for kind, bucket in buckets.items():
+        bucket.level -= want[kind]
+
+    await upstream_wait(STUB_LATENCY)
+    if random.random() < STUB_ERROR_RATE:
+        stats["errors"] += 1
+        return api_error(500, "The server had an error while processing your request", "server_error")
+
+    stats["requests"] += 1
+    stats["inputs"] += len(inputs)
+    stats["tokens"] += tokens
+    return JSONResponse({
+        "object": "list",
+        "data": [
+            {"object": "embedding", "index": i, "embedding": fake_embedding(t, dim)}
+            for i, t in enumerate(inputs)
+        ],
+        "model": body.get("model"),
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }, headers=ratelimit_headers())
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "stub")
+    prompt_tokens = sum(approx_tokens(m.get("content") or "") for m in body.get("messages", []))
+    words = STUB_ANSWER.split(" ")
+    created = int(time.time())
+    await upstream_wait(STUB_LATENCY)
+
+    if not body.get("stream"):
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": STUB_ANSWER},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(words),
+                "total_tokens": prompt_tokens + len(words),
+            },
+        }
+
+    def chunk(delta, finish_reason=None):
+        return "data: " + json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }) + "\n\n"
+
+    async def stream():
+        yield chunk({"role": "assistant", "content": ""})
+        for i, word in enumerate(words):
+            yield chunk({"content": word if i == 0 else " " + word})
+            await asyncio.sleep(STUB_TOKEN_DELAY)
+        yield chunk({}, "stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
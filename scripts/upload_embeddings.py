@@ -1,43 +1,44 @@
-import os
-import json
 import time
-from dotenv import load_dotenv
-from qdrant_client import QdrantClient
-from qdrant_client.http.exceptions import UnexpectedResponse
-from qdrant_client.http.models import PointStruct, VectorParams, Distance
+import random
+from itertools import islice
+from typing import TYPE_CHECKING
 from tenacity import retry, wait_random_exponential, stop_after_attempt
-from pathlib import Path
+from scripts.env import load_env, setting
+from scripts.bm25_index import update_index, BM25Writer
+from scripts.vector_ops import unit_rows
+from scripts.answer_cache import write_collection_version
+from scripts.clients import get_qdrant, qdrant_path
+from scripts.embedding_store import EmbeddingStore, EMBEDDING_SIZE
+from scripts.collection_manifest import CollectionManifest, current_ids
 
-load_dotenv()
+if TYPE_CHECKING:
+    from qdrant_client import QdrantClient
 
 # Qdrant config
-QDRANT_URL = os.getenv("QDRANT_URL")
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 COLLECTION_NAME = "mfs_collection" # Variable
-qdrant = QdrantClient(
-    url=QDRANT_URL,
-    api_key=QDRANT_API_KEY,
-)
-
-# Embeddings info
-EMBEDDINGS_PATH = "embeddings.jsonl" # VARIABLE
-EMBEDDING_SIZE = 3072  # text-embedding-3-large
-
-def load_saved_embeddings(path=EMBEDDINGS_PATH):
-    path = Path(path)
-    if not path.exists():
-        print(f"File not found: {path.resolve()}")
-        return []
-    
-    with open(path, "r", encoding="utf-8") as f:
-        return [json.loads(line) for line in f]
+
+# Bulk upload config
+UPLOAD_WORKERS = 4 # batches in flight (1 in local-path mode); UPLOAD_WORKERS in the environment overrides it
+UPLOAD_BATCH = 256 # starting points per batch; tuned from observed latency
+UPLOAD_BATCH_MIN, UPLOAD_BATCH_MAX = 32, 8192
+UPLOAD_TARGET_SECONDS = 1.0 # per-batch latency the tuner aims for
+UPLOAD_CHECK_SECONDS = 60 # how long the final read-back waits for wait=False writes
+UPLOAD_VERIFY_SAMPLE = 4 # ids per batch read back to confirm it landed
+
+
+def batched(records, size):
+    records = iter(records)
+    while batch := list(islice(records, size)):
+        yield batch
 
 @retry(wait=wait_random_exponential(min=1, max=30), stop=stop_after_attempt(5))
 def safe_upsert(client, collection_name, points):
     client.upsert(collection_name=collection_name, points=points)
 
 # Check that `mfs_collection` exists
-def collection_exists(client: QdrantClient, name: str) -> bool:
+def collection_exists(client: "QdrantClient", name: str) -> bool:
+    from qdrant_client.http.exceptions import UnexpectedResponse
+
     try:
         client.get_collection(name)
         return True
@@ -46,45 +47,204 @@ def collection_exists(client: QdrantClient, name: str) -> bool:
     except Exception:
         return False
     
-def upload_to_qdrant(data, qdrant, batch_size=100):
-    print(f"Prepping to upload {len(data)} embeddings")
+def ensure_collection(qdrant, dim=EMBEDDING_SIZE):
+    from qdrant_client.http.models import VectorParams, Distance
 
     if not collection_exists(qdrant, COLLECTION_NAME):
         print(f"Collection '{COLLECTION_NAME}' not found \nCreating '{COLLECTION_NAME}'")
         qdrant.create_collection(
             collection_name=COLLECTION_NAME,
             vectors_config=VectorParams(
-                size=EMBEDDING_SIZE,
+                size=dim,
                 distance=Distance.COSINE
             )
         )
     else:
         print(f"Collection '{COLLECTION_NAME}' already exists")
 
-    # Upload in batches
-    for i in range(0, len(data), batch_size):
-        batch = data[i:i+batch_size]
+def to_points(batch):
+    from qdrant_client.http.models import PointStruct
+
+    batch = [item for item in batch if len(item["embedding"]) == EMBEDDING_SIZE]
+    if not batch:
+        return []
+
+    # Store unit vectors so retrieval scores with a plain dot product
+    vectors = unit_rows([item["embedding"] for item in batch])
+
+    return [
+        PointStruct(
+            id=item["id"],
+            vector=vec.tolist(),
+            payload={"text": item["text"], **item.get("metadata", {})}
+        )
+        for item, vec in zip(batch, vectors)
+    ]
+
+class BatchTuner:
+    """
+    Points per upload batch, steered toward UPLOAD_TARGET_SECONDS a request:
+    doubled while batches come back in under half the target, scaled down
+    when one takes longer.
+    """
+
+    def __init__(self, size=UPLOAD_BATCH, target=UPLOAD_TARGET_SECONDS, low=UPLOAD_BATCH_MIN, high=UPLOAD_BATCH_MAX):
+        self.size = size
+        self.target = target
+        self.low = low
+        self.high = high
+
+    def observe(self, seconds):
+        if seconds < self.target / 2:
+            self.size = min(self.high, self.size * 2)
+        elif seconds > self.target:
+            self.size = max(self.low, int(self.size * self.target / seconds))
+
+def read_batches(data, tuner, only=None):
+    """
+    (ids, unit vectors, payloads) of the tuner's current size, read lazily
+    from records or a store; store rows whose ids are not in `only` are skipped.
+    """
+    if isinstance(data, EmbeddingStore):
+        start, rows = 0, len(data)
+        while start < rows:
+            ids, vectors, payloads = data.read(start, tuner.size, only)
+            start += tuner.size
+            if ids:
+                yield ids, unit_rows(vectors), payloads
+        return
 
-        points = [
-            PointStruct(
-                id=item["id"],
-                vector=item["embedding"],
-                payload={"text": item["text"], **item.get("metadata", {})}
+    records = iter(data)
+    while batch := list(islice(records, tuner.size)):
+        batch = [item for item in batch if len(item["embedding"]) == EMBEDDING_SIZE]
+        if batch:
+            yield (
+                [item["id"] for item in batch],
+                unit_rows([item["embedding"] for item in batch]),
+                [{"text": item["text"], **item.get("metadata", {})} for item in batch],
             )
-            for item in batch
-            if len(item["embedding"]) == EMBEDDING_SIZE
-        ]
 
+def verify_batches(qdrant, batches, timeout=UPLOAD_CHECK_SECONDS, sample=UPLOAD_VERIFY_SAMPLE):
+    """
+    Read back a few ids of each uploaded batch (sent with wait=False) until
+    all are found or `timeout` passes. Returns the batches (lists of ids)
+    with a sampled id still missing.
+    """
+    pending = {}
+    for n, ids in enumerate(batches):
+        for pid in random.sample(ids, min(sample, len(ids))):
+            pending[str(pid)] = n
+
+    deadline = time.monotonic() + timeout
+    while pending:
+        for part in batched(list(pending), 1000):
+            for point in qdrant.retrieve(COLLECTION_NAME, ids=part, with_payload=False, with_vectors=False):
+                pending.pop(str(point.id), None)
+        if not pending or time.monotonic() >= deadline:
+            break
+        time.sleep(0.5)
+    return [batches[n] for n in sorted(set(pending.values()))]
+
+def upload_to_qdrant(data, qdrant, batch_size=UPLOAD_BATCH, manifest=None, workers=None):
+    """
+    Upsert records or an EmbeddingStore, streamed in numpy batches through
+    upload_collection() with `workers` batches in flight and wait=False,
+    then read a sample of every batch's ids back (verify_batches()). Uploaded
+    ids are recorded in the collection manifest and each uploaded batch is
+    handed to a BM25Writer; batches that never show up are taken out of
+    both again. Only ids are kept across batches. From a store, only the points the
+    manifest lists are uploaded; the store still holds deleted chunks.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    manifest = manifest if manifest is not None else CollectionManifest()
+    only = None
+    if isinstance(data, EmbeddingStore):
+        manifest.bootstrap(qdrant, COLLECTION_NAME)
+        only = current_ids(manifest)
+    total = len(only) if only is not None else len(data)
+    print(f"Prepping to upload {total} embeddings")
+    ensure_collection(qdrant, data.dim if isinstance(data, EmbeddingStore) else EMBEDDING_SIZE)
+    # Local-path mode applies writes in this process and cannot take them concurrently
+    workers = 1 if qdrant_path() else workers or setting("UPLOAD_WORKERS", UPLOAD_WORKERS)
+    tuner = BatchTuner(batch_size)
+
+    def send(ids, vectors, payloads):
+        start = time.perf_counter()
+        qdrant.upload_collection(
+            COLLECTION_NAME, vectors=vectors, payload=payloads, ids=ids, batch_size=len(ids), wait=False
+        )
+        return time.perf_counter() - start
+
+    uploaded, sent, running = 0, [], {}
+    start = last_report = time.perf_counter()
+
+    def collect(done):
+        nonlocal uploaded, last_report
+        for future in done:
+            ids, payloads = running.pop(future)
+            try:
+                tuner.observe(future.result())
+            except Exception as e:
+                print(f"Failed batch of {len(ids)} points: {e}")
+                continue
+            manifest.add((pid, payload.get("source")) for pid, payload in zip(ids, payloads))
+            bm25.add(zip(ids, payloads))
+            uploaded += len(ids)
+            sent.append(ids)
+        if time.perf_counter() - last_report >= 10:
+            last_report = time.perf_counter()
+            print(f"Uploaded {uploaded}/{total} points (batch size {tuner.size})")
+
+    # Keep the BM25 index in step with what is in the collection, one bounded batch at a time
+    with BM25Writer() as bm25:
+        with ThreadPoolExecutor(workers) as pool:
+            for ids, vectors, payloads in read_batches(data, tuner, only):
+                if len(running) >= workers:
+                    collect(wait(running, return_when=FIRST_COMPLETED).done)
+                running[pool.submit(send, ids, vectors, payloads)] = (ids, payloads)
+            collect(wait(running).done)
+
+        elapsed = time.perf_counter() - start
+        print(f"Uploaded {uploaded} points in {elapsed:.1f}s ({uploaded / max(elapsed, 1e-9):.0f} points/s)")
+
+        missing = verify_batches(qdrant, sent) if sent else []
+        if missing:
+            # Unlisted and unindexed, so the next sync uploads them again
+            lost = {str(pid) for ids in missing for pid in ids}
+            manifest.remove(lost)
+            bm25.remove(lost)
+            uploaded -= len(lost)
+            print(f"{len(missing)} batches ({len(lost)} points) not found after {UPLOAD_CHECK_SECONDS}s")
+
+    if uploaded:
+        write_collection_version()
+    return uploaded
+
+def delete_points(ids, qdrant, batch_size=1000, manifest=None):
+    """Delete point ids from the collection, the BM25 index and the manifest."""
+    from qdrant_client.http.models import PointIdsList
+
+    manifest = manifest if manifest is not None else CollectionManifest()
+    deleted = []
+    for batch in batched(ids, batch_size):
         try:
-            safe_upsert(qdrant, COLLECTION_NAME, points)
-            print(f"Uploaded batch: {i // batch_size + 1}")
-            time.sleep(0.5)
+            qdrant.delete(collection_name=COLLECTION_NAME, points_selector=PointIdsList(points=batch))
+            manifest.remove(batch)
+            deleted.extend(batch)
         except Exception as e:
-            print(f"Failed batch : {i // batch_size + 1} : {e}")
+            print(f"Failed to delete {len(batch)} points: {e}")
+
+    if deleted:
+        update_index(removed=deleted)
+        write_collection_version()
+        print(f"Deleted {len(deleted)} stale points")
+    return len(deleted)
 
 if __name__ == "__main__":
+    load_env()
     print("Loading saved embeddings:")
-    data = load_saved_embeddings()
+    data = EmbeddingStore()
 
     print(f"Found {len(data)} embeddings")
 
@@ -93,4 +253,4 @@ if __name__ == "__main__":
         exit()
 
     print("Uploading")
-    upload_to_qdrant(data, qdrant)
+    upload_to_qdrant(data, get_qdrant(bulk=True))
@@ -1,15 +1,13 @@
-from qdrant_client import QdrantClient
-from scripts.upload_embeddings import load_saved_embeddings, upload_to_qdrant
-import os
-from dotenv import load_dotenv
+from scripts.env import load_env
 
-load_dotenv()
+load_env()
 
-QDRANT_URL = os.getenv("QDRANT_URL")
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+from scripts.upload_embeddings import upload_to_qdrant
+from scripts.embedding_store import EmbeddingStore
+from scripts.clients import get_qdrant
 
-qdrant = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
-data = load_saved_embeddings()
+qdrant = get_qdrant(bulk=True)
+data = EmbeddingStore()
 
 print(f"Loaded {len(data)} saved embeddings")
-upload_to_qdrant(data, qdrant, batch_size=100)
+upload_to_qdrant(data, qdrant)
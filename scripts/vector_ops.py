@@ -0,0 +1,51 @@
+import numpy as np
+
+
+def unit(vec):
+    """float32 copy of `vec` scaled to length 1 (zero vectors stay zero)."""
+    v = np.asarray(vec, dtype=np.float32)
+    n = np.linalg.norm(v)
+    return v / n if n > 0 else v
+
+
+def unit_rows(vectors):
+    """Contiguous float32 matrix with every row scaled to length 1."""
+    mat = np.ascontiguousarray(vectors, dtype=np.float32)
+    if mat.ndim != 2 or not len(mat):
+        return mat.reshape(len(mat), -1)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def pack_vectors(points, dim=None):
+    """Stack point vectors into one float32 matrix; missing vectors become zero rows."""
+    present = [p.vector for p in points if p.vector is not None]
+    if dim is None:
+        dim = len(present[0]) if present else 0
+    if len(present) == len(points):
+        return np.asarray(present, dtype=np.float32).reshape(len(points), dim)
+
+    mat = np.zeros((len(points), dim), dtype=np.float32)
+    for i, p in enumerate(points):
+        if p.vector is not None:
+            mat[i] = p.vector
+    return mat
+
+
+def minmax(xs):
+    xs = np.asarray(xs, dtype=np.float32)
+    if not len(xs):
+        return xs
+    lo, hi = xs.min(), xs.max()
+    return (xs - lo) / (hi - lo + 1e-9)
+
+
+def top_k(scores, k):
+    """Indices of the k highest scores, best first, without a full sort."""
+    scores = np.asarray(scores)
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx], kind="stable")]